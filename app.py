@@ -1,10 +1,10 @@
+import os
+import time
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from datetime import datetime
-import streamlit_authenticator as stauth
-import yaml
-from yaml import SafeLoader
+
+from warehouse.auth import auth_setup_latency, is_admin, login_latency, session_authenticator
 
 # ページ設定
 st.set_page_config(
@@ -16,43 +16,221 @@ st.set_page_config(
 
 st.title("📦 小さな倉庫分析アプリ")
 
-# 認証設定
-if "authenticator" not in st.session_state:
-    credentials = {
-        "usernames": {
-            "zen": {
-                "email": "zen@example.com",
-                "name": "Zen",
-                "password": stauth.Hasher.hash("password"),
-            },
-            "testuser": {
-                "email": "test@example.com",
-                "name": "テストユーザー",
-                "password": stauth.Hasher.hash("testpass"),
-            }
-        }
-    }
-    st.session_state.authenticator = stauth.Authenticate(
-        credentials,
-        cookie_name="warehouse_app",
-        key="abcd",
-        cookie_expiry_days=1,
+
+# 表示用の共通部品（通常・ストリーミング・共有DBの各モードで使用）
+def show_kpis(total_products, total_stock, low_stock_items):
+    col1, col2, col3 = st.columns(3)
+    col1.metric("総商品数", total_products)
+    col2.metric("総在庫数", total_stock)
+    col3.metric("在庫不足品目", low_stock_items)
+
+
+def show_chart(fig):
+    """図を描画し、ブラウザに送るデータ量を表示"""
+    with profiler.span("グラフ描画（Plotly）"):
+        st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"📦 送信データ: {figure_payload_bytes(fig) / 1024:,.1f} KB")
+
+
+def show_profile_panel():
+    """管理者向け: 今回と直近の実行の段階別計測（サイドバー）"""
+    if not profiler.enabled:
+        return
+    profile_runs.add(profiler)
+    with st.sidebar.expander("⏱️ プロファイル", expanded=True):
+        latest = profile_runs.runs[-1]
+        st.write(f"**合計:** {latest['total_sec'] * 1000:,.0f} ms")
+        spans = pd.DataFrame(latest["spans"])
+        if not spans.empty:
+            spans["ms"] = (spans["seconds"] * 1000).round(1)
+            columns = ["name", "ms", "rows", "rows_per_sec"]
+            if spans["peak_bytes"].notna().any():
+                spans["peak_MB"] = (spans["peak_bytes"] / 1024**2).round(2)
+                columns.append("peak_MB")
+            st.dataframe(spans[columns], hide_index=True)
+        if len(profile_runs.runs) > 1:
+            st.caption("直近の実行の合計時間（ms）")
+            st.bar_chart([run["total_sec"] * 1000 for run in profile_runs.runs])
+        st.download_button(
+            "JSONで保存",
+            runs_to_json(profile_runs.runs),
+            file_name="profile.json",
+            mime="application/json",
+        )
+        st.download_button(
+            "Chromeトレースで保存",
+            runs_to_chrome_trace(profile_runs.runs),
+            file_name="profile_trace.json",
+            mime="application/json",
+            help="chrome://tracing または Perfetto で開けます",
+        )
+        if st.button("計測履歴をクリア"):
+            profile_runs.clear()
+
+
+def location_bar_chart(location_totals):
+    import plotly.express as px
+
+    # 上位N件以外は「その他」にまとめて本数を抑える
+    return px.bar(
+        top_n_with_other(location_totals, "ロケーション", "在庫数", chart_top_n),
+        x="ロケーション",
+        y="在庫数",
+        title="ロケーション別 在庫総数",
+        color="在庫数",
+        color_continuous_scale="viridis",
+    )
+
+
+def daily_line_chart(daily):
+    import plotly.express as px
+
+    # 点数が上限を超える場合は LTTB で間引いてから描画
+    return px.line(
+        downsample(daily, "更新日", "在庫数", chart_max_points),
+        x="更新日",
+        y="在庫数",
+        markers=True,
+        title="日別 在庫推移",
     )
 
-authenticator = st.session_state.authenticator
+
+def show_rollup_trend(store, locations, default_range=None):
+    """ロールアップから日別在庫推移を描画（期間に応じて粒度を自動選択）"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    first, last = rollup_range(store)
+    start, end = default_range or (first, last)
+    start, end = max(start, first), min(end, last)
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        period = st.date_input(
+            "期間",
+            value=(start.date(), end.date()),
+            min_value=first.date(),
+            max_value=last.date(),
+        )
+    with col2:
+        resolution = st.selectbox("粒度", ["自動"] + list(GRAINS.values()))
+    if len(period) != 2:
+        st.info("期間の終了日を選択してください")
+        return
+
+    start, end = period
+    if resolution == "自動":
+        grain = choose_grain(start, end)
+    else:
+        grain = {label: key for key, label in GRAINS.items()}[resolution]
+    trend = downsample(
+        query_rollup(store, grain, start, end, locations), "更新日", "在庫数", chart_max_points
+    )
+
+    fig = px.line(
+        trend,
+        x="更新日",
+        y="在庫数",
+        markers=True,
+        title=f"日別 在庫推移（{GRAINS[grain]}）",
+    )
+    if grain != "day":
+        # バケット内の最小〜最大を帯で表示（線は平均）
+        fig.add_trace(go.Scatter(
+            x=trend["更新日"], y=trend["最大"], mode="lines",
+            line={"width": 0}, showlegend=False, name="最大",
+        ))
+        fig.add_trace(go.Scatter(
+            x=trend["更新日"], y=trend["最小"], mode="lines",
+            line={"width": 0}, fill="tonexty", fillcolor="rgba(99,110,250,0.2)",
+            showlegend=False, name="最小",
+        ))
+    show_chart(fig)
+
+
+def table_controls(columns):
+    """検索・並べ替え・表示件数の入力欄（戻り値: 検索語, 並べ替え列, 昇順か, 表示件数）"""
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        query = st.text_input("🔎 商品ID・商品名で検索", "")
+    with col2:
+        sort_by = st.selectbox("並べ替え", ["（なし）"] + list(columns))
+    with col3:
+        descending = st.checkbox("降順")
+    with col4:
+        page_size = st.selectbox("表示件数", [50, 100, 500, 1000], index=1)
+    return query, None if sort_by == "（なし）" else sort_by, not descending, page_size
+
+
+def page_selector(total, page_size):
+    pages = page_count(total, page_size)
+    return st.number_input(
+        f"ページ（全{pages}ページ・{total:,}件）",
+        min_value=1,
+        max_value=pages,
+        value=1,
+    )
+
+
+def qr_scanner(label):
+    """カメラでバーコード/QRを読み取り、読み取ったコードを返す（なければ None）
+
+    streamlit-qrcode-scanner があればブラウザ側で読み取る。
+    無ければ撮影した画像をサーバーのデコード用ワーカーで読み取る。
+    """
+    try:
+        from streamlit_qrcode_scanner import qrcode_scanner
+    except ModuleNotFoundError:
+        image = st.camera_input(label)
+        if image is None:
+            return None
+        # 撮影した画像は再実行のたびに同じものが返るため、画像ごとに一度だけ読み取る
+        image_key = content_hash(image.getvalue())
+        if image_key == st.session_state.get("last_camera_image"):
+            return None
+        st.session_state.last_camera_image = image_key
+        codes = submit_decode(image.getvalue()).result(timeout=30)
+        if not codes:
+            st.warning("⚠️ コードを読み取れませんでした")
+        return codes[0] if codes else None
+
+    st.caption(label)
+    code = qrcode_scanner(key="qr_scanner")
+    # コンポーネントは次に読み取るまで同じ値を返し続けるため、新しい値だけを返す
+    if not code or code == st.session_state.get("last_camera_code"):
+        return None
+    st.session_state.last_camera_code = code
+    return code
+
+
+def queue_scanner_input():
+    """ハンディスキャナー入力（Enter 確定）を処理待ちに積んで入力欄を空にする"""
+    code = st.session_state.scanner_input.strip()
+    if code:
+        st.session_state.scan_queue.append(code)
+    st.session_state.scanner_input = ""
+
+
+# 認証設定（ユーザー設定の読み込み・ハッシュ化はプロセスで一度だけ、認証オブジェクトはセッションごと）
+auth_start = time.perf_counter()
+authenticator = session_authenticator(st.session_state)
+if "auth_setup_recorded" not in st.session_state:
+    auth_setup_latency.record(time.perf_counter() - auth_start)
+    st.session_state.auth_setup_recorded = True
+
+login_start = time.perf_counter()
 authenticator.login(
     location="sidebar",
     fields={"Form name": "ログイン"}
 )
+if st.session_state.get("authentication_status") and "login_recorded" not in st.session_state:
+    login_latency.record(time.perf_counter() - login_start)
+    st.session_state.login_recorded = True
 # 認証状態を取得
 authentication_status = st.session_state.get("authentication_status")
 username = st.session_state.get("username")
 name = st.session_state.get("name")
 
-# 操作履歴の初期化
-if "ops" not in st.session_state:
-    st.session_state.ops = []
-name = st.session_state.get("name")
 
 if authentication_status is None:
     st.warning("👈 サイドバーからログインしてください")
@@ -61,6 +239,82 @@ elif authentication_status is False:
     st.error("ユーザー名またはパスワードが正しくありません")
     st.stop()
 
+# データ処理のモジュールはログイン後に読み込む（ログイン画面の表示を pandas 等の読み込みで待たせない）
+import pandas as pd
+
+from warehouse.batch import (
+    DATA_ROOT,
+    SOURCE_COLUMN,
+    expand_pattern,
+    load_batch_cached,
+    resolve_data_path,
+)
+from warehouse.columns import METHOD_LABELS, forget_mapping, remember_mapping
+from warehouse.delta import (
+    current_location_totals,
+    last_applied,
+    sync_inventory,
+    top_changes,
+)
+from warehouse.chart_data import (
+    DEFAULT_MAX_POINTS,
+    DEFAULT_TOP_N,
+    downsample,
+    figure_payload_bytes,
+    top_n_with_other,
+)
+from warehouse.journal import get_journal
+from warehouse.loader import (
+    REQUIRED_COLUMNS,
+    cache_stats,
+    content_hash,
+    forget,
+    get_or_load,
+    load_inventory,
+    prepare_inventory,
+    result_from_snapshot,
+)
+from warehouse.location_index import LocationIndex, location_index_for
+from warehouse.nlquery import answer_messages, describe_spec, parse_question, run_query
+from warehouse.table_view import (
+    TableView,
+    low_stock_mask,
+    page_count,
+    page_slice,
+    style_low_stock,
+    table_view_for,
+)
+from warehouse.pipeline import compute_kpis
+from warehouse.profiling import (
+    ProfileStore,
+    Profiler,
+    runs_to_chrome_trace,
+    runs_to_json,
+    stop_memory_tracing,
+)
+from warehouse.reorder import (
+    DEFAULT_THRESHOLD_DAYS,
+    DEFAULT_WINDOW_DAYS,
+    STATUS_LABELS,
+    ReorderModel,
+    Thresholds,
+    reorder_model_for,
+    status_counts,
+)
+from warehouse.rollups import GRAINS, choose_grain, query_rollup, rollup_range, update_rollups
+from warehouse.scanning import (
+    SkuIndex,
+    current_stock,
+    decode_many,
+    get_adjustment_buffer,
+    normalize_code,
+    sku_index_for,
+    submit_decode,
+)
+from warehouse.snapshots import discard_snapshot, list_snapshots, save_snapshot
+from warehouse.store import STORE_COLUMNS, get_store
+from warehouse.streaming import stream_csv_summary_cached
+
 # ログアウトボタン
 st.sidebar.write(f"👤 {name}")
 if st.sidebar.button("ログアウト"):
@@ -70,104 +324,244 @@ if st.sidebar.button("ログアウト"):
     )
     st.experimental_rerun()
 
-# ファイルアップロード
-uploaded = st.file_uploader(
+# プロファイル（管理者のみ。段階ごとの処理時間・ピークメモリ・スループットを記録）
+profiling = False
+profile_memory = False
+if is_admin(username):
+    profiling = st.sidebar.toggle("⏱️ プロファイルを記録")
+    if profiling:
+        profile_memory = st.sidebar.checkbox(
+            "メモリも計測（tracemalloc）",
+            help="プロセス全体の処理が遅くなるため、調査時のみ有効にしてください",
+        )
+# tracemalloc はプロセス全体で共有のため、このセッションで開始したものだけを止める
+if profile_memory:
+    st.session_state.profile_tracing = True
+elif st.session_state.pop("profile_tracing", False):
+    stop_memory_tracing()
+if "profile_runs" not in st.session_state:
+    st.session_state.profile_runs = ProfileStore()
+profile_runs = st.session_state.profile_runs
+profiler = Profiler(enabled=profiling, trace_memory=profile_memory)
+
+# ファイルアップロード（拠点ごとのファイルを複数まとめて指定可能）
+uploaded_files = st.file_uploader(
     "在庫データ (CSV または Excel)",
     type=["csv", "xlsx", "xls"],
+    accept_multiple_files=True,
 )
+uploaded = uploaded_files[0] if len(uploaded_files) == 1 else None
+
+# サーバー上のフォルダ / glob パターンからの一括取り込み（管理者のみ。データフォルダ内に限る）
+batch_pattern = ""
+if is_admin(username):
+    batch_pattern = st.sidebar.text_input(
+        "📁 サーバー上のフォルダ / globパターン",
+        help=f"データフォルダ（{DATA_ROOT}）からの相対パス",
+    ).strip()
+
+# サイドバー設定
+low_stock_threshold = st.sidebar.number_input(
+    "在庫不足判定しきい値", min_value=0, value=10
+)
+
+# グラフ設定（ブラウザに送る点数の上限）
+with st.sidebar.expander("📈 グラフ設定"):
+    chart_max_points = st.number_input(
+        "推移グラフの最大点数", min_value=100, max_value=50_000, value=DEFAULT_MAX_POINTS, step=100
+    )
+    chart_top_n = st.number_input(
+        "ロケーション別グラフの表示件数（超過分は「その他」）",
+        min_value=1, max_value=500, value=DEFAULT_TOP_N,
+    )
+
+# ストリーミングモード（数GB規模のCSVをチャンク単位で集計する）
+streaming_mode = st.sidebar.checkbox("🌊 ストリーミングモード（大容量CSV）")
+if streaming_mode:
+    # サーバー上のパス指定は管理者のみ（データフォルダ内の CSV に限る）
+    stream_path = ""
+    if is_admin(username):
+        stream_path = st.sidebar.text_input(
+            "サーバー上のCSVパス（任意）",
+            help=f"データフォルダ（{DATA_ROOT}）からの相対パス",
+        ).strip()
+    if stream_path:
+        try:
+            stream_path = resolve_data_path(stream_path)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        if not stream_path.lower().endswith(".csv"):
+            st.error("❌ ストリーミングモードで読み込めるのはCSVファイルのみです")
+            st.stop()
+        if not os.path.isfile(stream_path):
+            st.error(f"❌ ファイルが見つかりません: {stream_path}")
+            st.stop()
+        stat = os.stat(stream_path)
+        stream_key = f"{stream_path}:{stat.st_mtime_ns}:{stat.st_size}"
+        stream_source = open(stream_path, "rb")
+        stream_size = stat.st_size
+        stream_name = os.path.basename(stream_path)
+    elif uploaded and uploaded.name.endswith(".csv"):
+        stream_key = content_hash(uploaded.getvalue())
+        stream_source = uploaded
+        stream_size = uploaded.size
+        stream_name = uploaded.name
+    else:
+        st.info("📋 ストリーミングモードではCSVをアップロードするか、サーバー上のパスを指定してください")
+        st.stop()
+
+    progress_bar = st.progress(0.0, text="📥 読み込み準備中...")
+
+    def show_stream_progress(rows, elapsed):
+        fraction = min(stream_source.tell() / stream_size, 1.0) if stream_size else 0.0
+        rate = rows / elapsed if elapsed else 0
+        progress_bar.progress(fraction, text=f"📥 {rows:,}行 処理済み（{rate:,.0f}行/秒）")
 
-# データ読み込み
-if uploaded:
     try:
-        if uploaded.name.endswith(".csv"):
-            df = pd.read_csv(uploaded)
-        else:
-            df = pd.read_excel(uploaded, engine="openpyxl")
+        with stream_source:
+            summary, stream_hit = stream_csv_summary_cached(
+                stream_key, stream_source, progress=show_stream_progress
+            )
+    except Exception as e:
+        st.error(f"❌ ストリーミング読み込みエラー: {e}")
+        st.stop()
+    progress_bar.progress(
+        1.0,
+        text=f"✅ {summary.total_rows:,}行（{summary.rows_per_sec:,.0f}行/秒）"
+        + (" | キャッシュ済み" if stream_hit else ""),
+    )
+    st.success(f"✅ ファイル '{stream_name}' をストリーミング集計しました")
+    if summary.renamed:
+        st.info(f"🔄 列名を変換しました: {summary.renamed}")
+    if summary.na_count:
+        st.warning(f"⚠️ 在庫数に数値以外のデータが{summary.na_count}件ありました。0として集計しました。")
+
+    show_kpis(
+        summary.total_rows,
+        int(summary.total_stock),
+        summary.low_stock_items(low_stock_threshold),
+    )
+
+    stream_locations = st.multiselect(
+        "ロケーションを選択",
+        options=sorted(summary.by_location.index),
+        default=sorted(summary.by_location.index),
+    )
+    inv_tab, trend_tab = st.tabs(["ロケーション別在庫", "日別在庫推移"])
+    with inv_tab:
+        show_chart(location_bar_chart(summary.location_totals(stream_locations)))
+    with trend_tab:
+        show_chart(daily_line_chart(summary.daily_totals(stream_locations)))
+    show_profile_panel()
+    st.stop()
+
+# 過去のスナップショット選択（再アップロード不要で開き直せる）
+snapshot_options = {}
+try:
+    for snap in list_snapshots():
+        label = f"{snap.get('saved_at', '')} | {snap.get('source', '')} ({snap.get('rows', '?')}行)"
+        snapshot_options[label] = snap["path"]
+except ModuleNotFoundError:
+    pass
+selected_snapshot = st.sidebar.selectbox(
+    "📂 過去のスナップショット",
+    ["（選択なし）"] + list(snapshot_options),
+)
+
+# データ読み込み（内容ハッシュをキーにキャッシュ済みの結果を再利用）
+cache_hit = None
+source_label = None
+dataset_label = None
+load_start = time.perf_counter()
+if len(uploaded_files) > 1 or batch_pattern:
+    if batch_pattern:
+        batch_sources = expand_pattern(batch_pattern, root=DATA_ROOT)
+        if not batch_sources:
+            st.error(f"❌ 対象ファイルが見つかりません: {batch_pattern}")
+            st.stop()
+    else:
+        batch_sources = [(f.name, f.getvalue()) for f in uploaded_files]
+    source_label = dataset_label = f"{len(batch_sources)}ファイル一括"
+    try:
+        with st.spinner(f"📥 {len(batch_sources)}ファイルを並列で読み込み中..."):
+            load_result, cache_hit = load_batch_cached(batch_sources)
+        df = load_result.df
+        st.success(f"✅ {len(batch_sources)}ファイルを正常に読み込みました")
+        st.info(f"📊 データ形状: {df.shape[0]}行 × {df.shape[1]}列")
+    except Exception as e:
+        st.error(f"❌ ファイル読み込みエラー: {e}")
+        st.stop()
+elif uploaded:
+    source_label = dataset_label = uploaded.name
+    try:
+        load_result, cache_hit = load_inventory(uploaded.getvalue(), uploaded.name)
+        df = load_result.df
         st.success(f"✅ ファイル '{uploaded.name}' を正常に読み込みました")
         st.info(f"📊 データ形状: {df.shape[0]}行 × {df.shape[1]}列")
     except Exception as e:
         st.error(f"❌ ファイル読み込みエラー: {e}")
         st.stop()
+elif selected_snapshot in snapshot_options:
+    try:
+        snapshot_path = snapshot_options[selected_snapshot]
+        dataset_label = selected_snapshot
+        load_result, cache_hit = get_or_load(
+            f"snapshot:{snapshot_path}",
+            # 集計・一覧に使う列（と一括取り込みのソース列）だけを読む
+            lambda: result_from_snapshot(snapshot_path, columns=[*STORE_COLUMNS, SOURCE_COLUMN]),
+        )
+        df = load_result.df
+        st.success(f"✅ スナップショット '{selected_snapshot}' を読み込みました")
+        st.info(f"📊 データ形状: {df.shape[0]}行 × {df.shape[1]}列")
+    except Exception as e:
+        st.error(f"❌ スナップショット読み込みエラー: {e}")
+        st.stop()
 else:
     st.info("📋 サンプルデータを表示中...")
-    df = pd.DataFrame(
-        {
-            "商品ID": ["A01", "A02", "B01", "B02", "C01"],
-            "商品名": ["ペン", "ノート", "箱", "テープ", "クリップ"],
-            "在庫数": [23, 5, 12, 3, 15],
-            "ロケーション": ["東京", "大阪", "東京", "大阪", "名古屋"],
-            "更新日": [
-                "2025-06-01",
-                "2025-06-01",
-                "2025-06-02",
-                "2025-06-02",
-                "2025-06-03",
-            ],
-        }
+    load_result = prepare_inventory(
+        pd.DataFrame(
+            {
+                "商品ID": ["A01", "A02", "B01", "B02", "C01"],
+                "商品名": ["ペン", "ノート", "箱", "テープ", "クリップ"],
+                "在庫数": [23, 5, 12, 3, 15],
+                "ロケーション": ["東京", "大阪", "東京", "大阪", "名古屋"],
+                "更新日": [
+                    "2025-06-01",
+                    "2025-06-01",
+                    "2025-06-02",
+                    "2025-06-02",
+                    "2025-06-03",
+                ],
+            }
+        )
     )
+    df = load_result.df
 
-# 列名マッピング機能
-def normalize_column_names(df):
-    """列名を標準形式にマッピング"""
-    # 列名マッピング辞書
-    column_mapping = {
-        # 商品ID の別名
-        "部番": "商品ID",
-        "部品番号": "商品ID", 
-        "製品番号": "商品ID",
-        "品番": "商品ID",
-        "コード": "商品ID",
-        "ID": "商品ID",
-        "商品コード": "商品ID",
-        
-        # 商品名 の別名
-        "部品名": "商品名",
-        "製品名": "商品名",
-        "品名": "商品名",
-        "名称": "商品名",
-        "商品": "商品名",
-        "アイテム名": "商品名",
-        
-        # 在庫数 の別名
-        "数量": "在庫数",
-        "在庫": "在庫数",
-        "残数": "在庫数",
-        "保有数": "在庫数",
-        "現在庫": "在庫数",
-        "在庫量": "在庫数",
-        "QTY": "在庫数",
-        "qty": "在庫数",
-        
-        # ロケーション の別名
-        "所在地": "ロケーション",
-        "棚番号": "ロケーション",
-        "棚番": "ロケーション",
-        "倉庫": "ロケーション",
-        "場所": "ロケーション",
-        "保管場所": "ロケーション",
-        "位置": "ロケーション",
-        "エリア": "ロケーション",
-        "拠点": "ロケーション",
-        "ゾーン": "ロケーション",
-    }
-    
-    # 列名を正規化
-    df_normalized = df.copy()
-    renamed_columns = {}
-    
-    for old_col in df.columns:
-        if old_col in column_mapping:
-            new_col = column_mapping[old_col]
-            renamed_columns[old_col] = new_col
-    
-    if renamed_columns:
-        df_normalized = df_normalized.rename(columns=renamed_columns)
-        st.info(f"🔄 列名を変換しました: {renamed_columns}")
-    
-    return df_normalized, renamed_columns
+profiler.add("読み込み" + ("（キャッシュ）" if cache_hit else ""), time.perf_counter() - load_start, len(df))
+if not cache_hit:
+    # 取り込み処理の内訳（解析・列名正規化・型変換・型最適化）
+    for stage, seconds in load_result.notes.get("stage_seconds", {}).items():
+        profiler.add(f"  {stage}", seconds, len(df))
 
-# 列名の正規化を実行
-df, renamed_cols = normalize_column_names(df)
+renamed_cols = load_result.renamed
+if renamed_cols:
+    column_methods = load_result.notes.get("column_methods", {})
+    st.info("🔄 列名を変換しました: " + ", ".join(
+        f"{old} → {new}（{METHOD_LABELS.get(column_methods.get(old), '辞書')}）"
+        for old, new in renamed_cols.items()
+    ))
+    schema = load_result.notes.get("schema_fingerprint")
+    # 過去のスナップショットから開いた場合は読み直す元ファイルが無いため出さない
+    if schema and source_label and df is load_result.df and st.button(
+        "↩️ 列の対応をリセット",
+        help="記憶した列の対応を削除し、列名・値から判定し直します",
+    ):
+        # 対応付け済みのスナップショットとキャッシュも捨てて元ファイルから読み直す
+        forget_mapping(schema)
+        discard_snapshot(load_result.key)
+        forget(load_result.key)
+        st.rerun()
 
 # デバッグ情報表示
 with st.expander("🔍 デバッグ情報", expanded=False):
@@ -176,12 +570,26 @@ with st.expander("🔍 デバッグ情報", expanded=False):
     if renamed_cols:
         st.write("**変換された列名:**", renamed_cols)
     st.write("**データ型:**", df.dtypes.to_dict())
+    if cache_hit is not None:
+        st.write("**取り込みキャッシュ:**", "ヒット ⚡" if cache_hit else "ミス（新規読み込み）")
+        st.write("**キャッシュ統計:**", cache_stats())
+    if "memory_before" in load_result.notes:
+        mem_before = load_result.notes["memory_before"] / 1024**2
+        mem_after = load_result.notes["memory_after"] / 1024**2
+        st.write(
+            "**メモリ使用量:**",
+            f"{mem_before:,.1f} MB → {mem_after:,.1f} MB（型最適化後）",
+        )
+    if "timings" in load_result.notes:
+        st.write("**ファイル別の解析時間:**")
+        st.dataframe(pd.DataFrame(load_result.notes["timings"]), hide_index=True)
+    st.write("**認証準備時間（セッション初回）:**", auth_setup_latency.summary())
+    st.write("**ログイン処理時間:**", login_latency.summary())
     st.write("**最初の5行:**")
     st.dataframe(df.head())
 
 # データの列名チェックと修正
-required_columns = ["商品ID", "商品名", "在庫数", "ロケーション"]
-missing_columns = [col for col in required_columns if col not in df.columns]
+missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
 
 if missing_columns:
     st.error(f"❌ 必要な列が見つかりません: {missing_columns}")
@@ -229,60 +637,187 @@ if missing_columns:
                 stock_col: "在庫数",
                 location_col: "ロケーション"
             }
+            schema = load_result.notes.get("schema_fingerprint")
+            if schema and df is load_result.df:
+                # 元の列名に対する対応として記録し、同じ列構成のファイルは次回から自動で変換する
+                original = {new: old for old, new in renamed_cols.items()}
+                remember_mapping(schema, {
+                    original.get(col, col): manual_mapping.get(col, col)
+                    for col in df.columns
+                    if manual_mapping.get(col, col) != original.get(col, col)
+                })
+                forget(load_result.key)
+                st.rerun()
             df = df.rename(columns=manual_mapping)
             st.success(f"✅ 手動マッピングを適用しました: {manual_mapping}")
-            st.experimental_rerun()
         else:
             st.warning("すべての列を選択してください")
             st.stop()
     else:
         st.stop()
 
-# 日付型変換
-if "更新日" in df.columns:
+# アップロード・一括取り込みの初回読み込み時のみ、列の対応付けが済んだ状態でスナップショットを保存
+# （全列を保存するため、開き直したスナップショットでも手動マッピングやソース列を使える）
+if source_label and not cache_hit:
     try:
-        if pd.api.types.is_object_dtype(df["更新日"]):
-            df["更新日"] = pd.to_datetime(df["更新日"])
-        st.success("✅ 更新日を日付型に変換しました")
+        save_snapshot(
+            df, load_result.key, source_label, renamed=load_result.renamed, notes=load_result.notes
+        )
+    except ModuleNotFoundError:
+        st.warning("⚠️ pyarrow がインストールされていないためスナップショットを保存できません")
     except Exception as e:
-        st.warning(f"⚠️ 日付変換に失敗: {e}")
+        st.warning(f"⚠️ スナップショット保存に失敗: {e}")
+
+# 型変換の結果表示（変換自体は取り込み時に実施済み）
+load_notes = load_result.notes
+if load_notes.get("date_converted"):
+    st.success("✅ 更新日を日付型に変換しました")
+elif "date_error" in load_notes:
+    st.warning(f"⚠️ 日付変換に失敗: {load_notes['date_error']}")
 
-# 数値型変換（在庫数）
-if "在庫数" in df.columns:
+if load_notes.get("stock_na_count"):
+    st.warning(f"⚠️ 在庫数に数値以外のデータが{load_notes['stock_na_count']}件ありました。0に置換します。")
+if load_notes.get("stock_converted"):
+    st.success("✅ 在庫数を数値型に変換しました")
+elif "stock_error" in load_notes:
+    st.warning(f"⚠️ 在庫数の数値変換に失敗: {load_notes['stock_error']}")
+
+# 差分取り込み（前回の状態との追加・更新・削除だけを共有DBへ反映）
+incremental_mode = st.sidebar.checkbox(
+    "🔁 差分取り込み", help="前回取り込んだ状態と比べて、変わった行だけを反映します"
+)
+if incremental_mode and dataset_label and df is load_result.df:
+    store = get_store()
+    delta = load_result.extras.get("delta")
+    # 自動の反映は読み込んだデータごとに一度だけ（スキャンの調整後に毎回ファイルの値へ戻さない）
+    resync = st.sidebar.button(
+        "🔁 ファイルの内容で再反映",
+        help="スキャンの調整などで変わった現在庫を、読み込んだファイルの値に戻します",
+    )
+    if resync or (
+        not load_result.extras.get("delta_checked") and last_applied(store) != load_result.key
+    ):
+        try:
+            with st.spinner("🔁 前回との差分を反映中..."):
+                start = time.perf_counter()
+                # 他のセッションが同時に反映した場合は None（二重に反映しない）
+                applied = sync_inventory(store, df, load_result.key, dataset_label)
+                if applied is not None:
+                    delta = applied
+                    load_result.extras["delta"] = delta
+                    load_result.extras["delta_sec"] = time.perf_counter() - start
+            load_result.extras["rollup_recorded"] = True
+            load_result.extras["delta_checked"] = True
+        except Exception as e:
+            st.warning(f"⚠️ 差分取り込みに失敗: {e}")
+            delta = None
+
+    with st.expander("🔁 前回からの変更", expanded=delta is not None and delta.changed > 0):
+        if delta is None:
+            st.info("このデータは反映済みです")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("追加", f"{len(delta.inserted):,}")
+            col2.metric("更新", f"{len(delta.updated):,}")
+            col3.metric("削除", f"{len(delta.deleted):,}")
+            col4.metric("変更なし", f"{delta.unchanged:,}")
+            st.caption(f"⏱️ 反映時間: {load_result.extras.get('delta_sec', 0):.2f}秒")
+            if delta.duplicates:
+                st.warning(f"⚠️ 商品ID・ロケーションの重複が{delta.duplicates}件あり、後の行を採用しました")
+            if len(delta.updated):
+                st.markdown("**在庫数の増減が大きい品目**")
+                st.dataframe(top_changes(delta), hide_index=True)
+            if len(delta.inserted):
+                st.markdown("**追加された品目**")
+                st.dataframe(delta.inserted.drop(columns="row_hash").head(20), hide_index=True)
+            if len(delta.deleted):
+                st.markdown("**削除された品目**")
+                st.dataframe(delta.deleted.head(20), hide_index=True)
+        st.markdown("**ロケーション別の現在庫（差分反映後）**")
+        st.dataframe(current_location_totals(store), hide_index=True)
+
+# 日別推移のロールアップを更新（新しいデータセットの初回のみ）
+if dataset_label and df is load_result.df and not load_result.extras.get("rollup_recorded"):
     try:
-        df["在庫数"] = pd.to_numeric(df["在庫数"], errors="coerce")
-        # NaNの処理
-        if df["在庫数"].isna().any():
-            na_count = df["在庫数"].isna().sum()
-            st.warning(f"⚠️ 在庫数に数値以外のデータが{na_count}件ありました。0に置換します。")
-            df["在庫数"] = df["在庫数"].fillna(0)
-        st.success("✅ 在庫数を数値型に変換しました")
+        update_rollups(get_store(), location_index_for(load_result).daily)
+        load_result.extras["rollup_recorded"] = True
     except Exception as e:
-        st.warning(f"⚠️ 在庫数の数値変換に失敗: {e}")
+        st.warning(f"⚠️ 推移ロールアップの更新に失敗: {e}")
 
-# サイドバー設定
-low_stock_threshold = st.sidebar.number_input(
-    "在庫不足判定しきい値", min_value=0, value=10
-)
+# 共有DBモード（取り込みは一度だけ、集計・一覧はSQLで実行しセッションごとの複製を持たない）
+if st.sidebar.checkbox("🗄️ 共有DBモード"):
+    store = get_store()
+    if dataset_label:
+        with st.spinner("🗄️ 共有DBに取り込み中..."):
+            if store.ingest(df, load_result.key, dataset_label):
+                st.success(f"✅ '{dataset_label}' を共有DBに取り込みました")
+
+    db_datasets = {
+        f"{d['loaded_at']} | {d['source']} ({d['rows']:,}行)": d["key"]
+        for d in store.datasets()
+    }
+    if not db_datasets:
+        st.info("📋 共有DBにデータがありません。ファイルをアップロードしてください")
+        st.stop()
+    db_labels = list(db_datasets)
+    db_keys = list(db_datasets.values())
+    db_key = db_datasets[st.sidebar.selectbox(
+        "🗄️ DBのデータセット",
+        db_labels,
+        index=db_keys.index(load_result.key) if load_result.key in db_keys else 0,
+    )]
+
+    show_kpis(*store.kpis(db_key, low_stock_threshold))
+
+    db_all_locations = store.locations(db_key)
+    db_locations = st.multiselect(
+        "ロケーションを選択",
+        options=db_all_locations,
+        default=db_all_locations,
+    )
+
+    st.subheader("在庫一覧")
+    table_query, table_sort, table_ascending, table_page_size = table_controls(STORE_COLUMNS)
+    table_page = page_selector(
+        store.count_rows(db_key, db_locations, table_query), table_page_size
+    )
+    page_df = store.page(
+        db_key,
+        db_locations,
+        table_query,
+        sort_by=table_sort,
+        ascending=table_ascending,
+        limit=table_page_size,
+        offset=(table_page - 1) * table_page_size,
+    )
+    st.dataframe(
+        style_low_stock(page_df, low_stock_mask(page_df, low_stock_threshold)),
+        hide_index=True,
+        height=350,
+    )
+
+    inv_tab, trend_tab = st.tabs(["ロケーション別在庫", "日別在庫推移"])
+    with inv_tab:
+        show_chart(location_bar_chart(store.location_totals(db_key, db_locations)))
+    with trend_tab:
+        if rollup_range(store) is None:
+            show_chart(daily_line_chart(store.daily_totals(db_key, db_locations)))
+        else:
+            show_rollup_trend(store, db_locations)
+    show_profile_panel()
+    st.stop()
 
 # KPI計算 - エラーハンドリング強化
+kpi_start = time.perf_counter()
 try:
-    total_products = len(df)
-    
     # 在庫数列の存在確認
-    if "在庫数" in df.columns:
-        total_stock = int(df["在庫数"].sum())
-        low_stock_items = int((df["在庫数"] < low_stock_threshold).sum())
-    else:
+    if "在庫数" not in df.columns:
         st.error("❌ '在庫数'列が見つかりません")
-        total_stock = 0
-        low_stock_items = 0
-    
+    total_products, total_stock, low_stock_items = compute_kpis(df, low_stock_threshold)
+
     # KPI表示
-    col1, col2, col3 = st.columns(3)
-    col1.metric("総商品数", total_products)
-    col2.metric("総在庫数", total_stock)
-    col3.metric("在庫不足品目", low_stock_items)
+    profiler.add("KPI", time.perf_counter() - kpi_start, len(df))
+    show_kpis(total_products, total_stock, low_stock_items)
     
 except Exception as e:
     st.error(f"❌ KPI計算エラー: {e}")
@@ -290,93 +825,282 @@ except Exception as e:
     st.write(df.head())
     st.write("列名:", list(df.columns))
 
-# フィルター
+# フィルター（ロケーション別の行位置・部分集計を事前計算したインデックスを使用）
+with profiler.span("ロケーションインデックス", len(df)):
+    if df is load_result.df:
+        loc_index = location_index_for(load_result)
+    else:
+        loc_index = LocationIndex(df)
+
 locations = st.multiselect(
     "ロケーションを選択",
-    options=sorted(df["ロケーション"].unique()),
-    default=list(df["ロケーション"].unique()),
+    options=loc_index.locations,
+    default=loc_index.locations,
 )
 
-df_filtered = df[df["ロケーション"].isin(locations)]
-
 # 在庫一覧テーブル
 st.subheader("在庫一覧")
 
-st.dataframe(
-    df_filtered.style.apply(
-        lambda x: [
-            "background-color:#FFCDD2" if v < low_stock_threshold else ""
-            for v in x
-        ],
-        subset=["在庫数"],
-    ),
-    hide_index=True,
-    height=350,
-)
+# 表示ページ分だけをクライアントに送る（並べ替え・検索はサーバー側で実施）
+if df is load_result.df:
+    table_view = table_view_for(load_result)
+else:
+    table_view = TableView(df)
+
+table_query, table_sort, table_ascending, table_page_size = table_controls(df.columns)
+with profiler.span("並べ替え・検索", len(df)):
+    table_rows = table_view.rows(
+        row_mask=loc_index.mask(locations),
+        query=table_query,
+        sort_by=table_sort,
+        ascending=table_ascending,
+    )
+table_page = page_selector(len(table_rows), table_page_size)
+page_rows = page_slice(table_rows, table_page, table_page_size)
+
+# 在庫不足の判定と色付けは表示ページ分の行だけに対して行う
+with profiler.span("表の描画（Styler）", len(page_rows)):
+    page_df = df.iloc[page_rows]
+    st.dataframe(
+        style_low_stock(page_df, low_stock_mask(page_df, low_stock_threshold)),
+        hide_index=True,
+        height=350,
+    )
 
 # 可視化タブ
-barcode_tab, inv_tab, trend_tab = st.tabs(["📷 バーコードスキャン", "ロケーション別在庫", "日別在庫推移"])
+barcode_tab, inv_tab, trend_tab, reorder_tab, ask_tab = st.tabs(
+    ["📷 バーコードスキャン", "ロケーション別在庫", "日別在庫推移", "🔁 発注点", "💬 在庫に質問"]
+)
 
 with barcode_tab:
     st.subheader("バーコード/QR 読み取り")
+    # 商品ID の索引はデータセットごとに一度だけ作り、読み取ったコードを O(1) で照合する
+    sku_index = sku_index_for(load_result) if df is load_result.df else SkuIndex(df)
+    adjustments = get_adjustment_buffer(get_store())
+    if "scan_queue" not in st.session_state:
+        st.session_state.scan_queue = []
+        st.session_state.scan_log = []
+
+    col1, col2 = st.columns(2)
+    with col1:
+        scan_mode = st.radio("操作", ["照会", "入庫（＋）", "出庫（－）"], horizontal=True)
+    with col2:
+        scan_qty = st.number_input("数量", min_value=1, value=1)
+
+    # ハンディスキャナー（キーボード入力 + Enter）は連続で読み取れる
+    st.text_input(
+        "ハンディスキャナー入力",
+        key="scanner_input",
+        on_change=queue_scanner_input,
+        placeholder="ここにカーソルを置いてスキャン",
+    )
+    scanned = st.session_state.scan_queue
+    st.session_state.scan_queue = []
     try:
         code = qr_scanner("クリックしてカメラを起動")
         if code:
-            st.success(f"読み取り結果: {code}")
-            st.session_state.ops.append({
-                "time": datetime.now().isoformat(timespec="seconds"),
-                "action": "スキャン",
-                "code": code,
-            })
+            scanned.append(code)
+        scan_images = st.file_uploader(
+            "画像から読み取り（複数可）",
+            type=["png", "jpg", "jpeg", "bmp"],
+            accept_multiple_files=True,
+            key="scan_images",
+        )
+        if scan_images and st.button("画像を読み取る"):
+            with st.spinner(f"📷 {len(scan_images)}枚を読み取り中..."):
+                for codes in decode_many([img.getvalue() for img in scan_images]):
+                    scanned.extend(codes)
     except ModuleNotFoundError:
-        st.error("streamlit-qr-scanner がインストールされていません")
+        st.error("画像の読み取りには opencv-python-headless（または pyzbar）が必要です")
+
+    scan_sign = {"照会": 0, "入庫（＋）": 1, "出庫（－）": -1}[scan_mode]
+    for code in scanned:
+        hit = sku_index.lookup(code)
+        row = next((r for r in hit.rows if r.get("ロケーション") in locations), None)
+        row = row or (hit.rows[0] if hit.rows else None)
+        if row is None:
+            st.error(f"❌ 該当する商品がありません: {hit.code}")
+        else:
+            # 表の在庫は読み込んだファイルの値。スキャンの調整は共有DBの現在庫にだけ反映される
+            db_stock = current_stock(get_store(), hit.code).get(row.get("ロケーション"))
+            st.success(
+                f"✅ {hit.code} | {row.get('商品名', '')} @ {row.get('ロケーション', '')}"
+                f"（ファイルの在庫 {row.get('在庫数', '?')}"
+                + (f" / 共有DBの現在庫 {db_stock:g}" if db_stock is not None else "")
+                + "）"
+            )
+            if scan_sign:
+                adjustments.add(hit.code, row.get("ロケーション"), scan_sign * scan_qty, username)
+        st.session_state.scan_log.append({
+            "時刻": datetime.now().strftime("%H:%M:%S"),
+            "コード": hit.code,
+            "商品名": row.get("商品名") if row else None,
+            "ロケーション": row.get("ロケーション") if row else None,
+            "操作": scan_mode,
+            "数量": scan_sign * scan_qty if row and scan_sign else 0,
+        })
+        get_journal().append({
+            "action": "スキャン" if not scan_sign else scan_mode,
+            "code": hit.code,
+            "user": username,
+            "location": row.get("ロケーション") if row else None,
+            "qty": scan_sign * scan_qty if row and scan_sign else 0,
+        })
+    del st.session_state.scan_log[:-50]
+    if scanned:
+        with st.expander(f"🕘 {normalize_code(scanned[-1])} の操作履歴"):
+            # 今回のスキャンが書き込まれるのを待ってから索引で引く
+            get_journal().flush(timeout=1)
+            history = get_journal().find_code(normalize_code(scanned[-1]), limit=10)
+            if history:
+                st.dataframe(pd.DataFrame(history), hide_index=True)
+            else:
+                st.caption("記録はまだありません")
+
+    try:
+        adjustments.flush_if_due()
+    except Exception as e:
+        st.warning(f"⚠️ 在庫調整の書き込みに失敗（次回再試行）: {e}")
+    col1, col2 = st.columns([3, 1])
+    if col2.button("今すぐ反映", disabled=not adjustments.pending):
+        adjustments.flush()
+    col1.caption(
+        f"📦 索引 {len(sku_index):,}品目 / 未反映の調整 {len(adjustments.pending)}件"
+        f" / 反映済み {adjustments.flushed}件"
+    )
+    st.caption(
+        "ℹ️ 入庫・出庫は共有DBの現在庫（🔁 差分取り込みで反映した品目）に書き込まれます。"
+        "一覧・グラフは読み込んだファイルの値のままで、「🔁 ファイルの内容で再反映」でファイルの値に戻ります。"
+    )
+    if st.session_state.scan_log:
+        st.dataframe(pd.DataFrame(st.session_state.scan_log[::-1]), hide_index=True)
 
 with inv_tab:
     # ロケーション別在庫グラフを表示（以前の tab1 処理を移動）
-    fig_loc = px.bar(
-        df_filtered.groupby("ロケーション")["在庫数"].sum().reset_index(),
-        x="ロケーション",
-        y="在庫数",
-        title="ロケーション別 在庫総数",
-        color="在庫数",
-        color_continuous_scale="viridis",
-    )
-    st.plotly_chart(fig_loc, use_container_width=True)
+    with profiler.span("ロケーション別集計", len(df)):
+        fig_loc = location_bar_chart(loc_index.location_totals(locations))
+    show_chart(fig_loc)
 
 with trend_tab:
-    daily = (
-        df_filtered.groupby(["更新日"])["在庫数"].sum().reset_index().sort_values("更新日")
+    if load_result.extras.get("rollup_recorded") and loc_index.daily is not None:
+        # 履歴全体のロールアップから描画（初期表示は現在のデータの期間）
+        show_rollup_trend(
+            get_store(),
+            locations,
+            default_range=(loc_index.daily.index.min(), loc_index.daily.index.max()),
+        )
+    else:
+        with profiler.span("日別集計", len(df)):
+            daily = loc_index.daily_totals(locations)
+            fig_day = daily_line_chart(daily)
+        show_chart(fig_day)
+
+with reorder_tab:
+    # 消費ペースはデータセットごとに一度だけ計算し、しきい値の変更では判定だけをやり直す
+    st.subheader("発注点（在庫日数による判定）")
+    col1, col2 = st.columns(2)
+    reorder_window = col1.number_input(
+        "消費ペースの集計期間（日）", min_value=2, max_value=365, value=DEFAULT_WINDOW_DAYS
     )
-    fig_day = px.line(
-        daily,
-        x="更新日",
-        y="在庫数",
-        markers=True,
-        title="日別 在庫推移",
+    reorder_days = col2.number_input(
+        "発注しきい値（在庫日数）", min_value=0.0, value=float(DEFAULT_THRESHOLD_DAYS), step=1.0
+    )
+    with st.expander("ロケーション別・商品別のしきい値"):
+        location_days = st.data_editor(
+            pd.DataFrame({"ロケーション": loc_index.locations, "日数": [None] * len(loc_index.locations)}),
+            column_config={"日数": st.column_config.NumberColumn("日数", min_value=0)},
+            disabled=["ロケーション"],
+            hide_index=True,
+            key="reorder_location_days",
+        )
+        sku_days_file = st.file_uploader("商品別のしきい値（CSV: 商品ID, 日数）", type=["csv"], key="reorder_sku_days")
+    thresholds = Thresholds(
+        reorder_days,
+        by_location=location_days.dropna().set_index("ロケーション")["日数"].to_dict(),
     )
-    st.plotly_chart(fig_day, use_container_width=True)
+    if sku_days_file is not None:
+        try:
+            sku_days = pd.read_csv(sku_days_file, dtype={"商品ID": str}).dropna(subset=["商品ID", "日数"])
+            thresholds.by_sku = sku_days.set_index("商品ID")["日数"].astype(float).to_dict()
+        except Exception as e:
+            st.warning(f"⚠️ 商品別のしきい値を読み込めませんでした: {e}")
+
+    with profiler.span("発注点モデル", len(df)):
+        if df is load_result.df:
+            reorder_model = reorder_model_for(load_result, int(reorder_window))
+        else:
+            reorder_model = ReorderModel(df, int(reorder_window))
+    if not len(reorder_model):
+        st.info("💡 発注点の判定には 商品ID・ロケーション・在庫数・更新日 の列が必要です")
+    else:
+        with profiler.span("発注点判定", len(reorder_model)):
+            evaluated = reorder_model.evaluate(thresholds, locations)
+        counts = status_counts(evaluated)
+        for col, (label, count) in zip(st.columns(len(counts)), counts.items()):
+            col.metric(label, f"{count:,}")
+        shown_status = st.multiselect("表示する状態", STATUS_LABELS, default=STATUS_LABELS[:3])
+        shown = evaluated[evaluated["状態"].isin(shown_status).to_numpy()]
+        # 表示は上位の行だけ（全件は在庫日数の短い順に並んでいる）
+        max_rows = 1000
+        st.dataframe(shown.head(max_rows), hide_index=True)
+        if len(shown) > max_rows:
+            st.caption(f"在庫日数の短い順に {max_rows:,}件を表示（全{len(shown):,}件）")
 
-# 操作履歴ダウンロード
+with ask_tab:
+    # 質問を構造化クエリに変換してローカルで集計し、AI には集計結果だけを渡して文章化する
+    st.subheader("在庫データに質問")
+    use_ai = bool(os.getenv("OPENAI_API_KEY"))
+    if not use_ai:
+        st.caption("💡 OPENAI_API_KEY 未設定のため、定型の言い回しのみ解釈します")
+    question = st.text_input("質問", placeholder="例: 大阪で在庫10未満の品目は？")
+    if st.button("質問する", disabled=not question):
+        complete = None
+        if use_ai:
+            from zen_chat.client import complete_chat
+            complete = complete_chat
+        start = time.perf_counter()
+        spec, parsed_by = parse_question(question, df, complete, loc_index.locations)
+        result = run_query(df, spec, loc_index.mask)
+        query_ms = (time.perf_counter() - start) * 1000
+
+        st.caption(f"🔎 {describe_spec(spec)}（{'AI' if parsed_by == 'llm' else '定型'}で解釈 / {query_ms:.0f}ms）")
+        if use_ai:
+            try:
+                st.markdown(complete(answer_messages(question, result)))
+            except Exception as e:
+                st.warning(f"⚠️ 回答文の作成に失敗しました: {e}")
+        st.write(f"該当 {result.matched_rows:,}行 / 在庫合計 {result.matched_stock:,}")
+        st.dataframe(result.table, hide_index=True)
+
+# 操作履歴（全セッション共有のジャーナル）のエクスポート
 with st.sidebar:
     st.markdown("### 📝 操作履歴")
-    if st.button("履歴をJSONでダウンロード"):
-        import json, base64
-        hist = json.dumps(st.session_state.ops, ensure_ascii=False, indent=2)
-        b64 = base64.b64encode(hist.encode()).decode()
-        href = f'<a href="data:application/json;base64,{b64}" download="ops_history.json">📥 ダウンロード</a>'
-        st.markdown(href, unsafe_allow_html=True)
+    journal = get_journal()
+    journal_stats = journal.stats()
+    st.caption(f"記録 {journal_stats['records']:,}件 / {journal_stats['bytes'] / 1024:,.0f} KB")
+    if journal_stats["records"]:
+        today = datetime.now().date()
+        first_day = datetime.fromisoformat(journal_stats["first_time"]).date()
+        ops_range = st.date_input("期間", value=(max(first_day, today - pd.Timedelta(days=7)), today), key="ops_range")
+        if st.button("エクスポートを作成"):
+            # 期間内のセグメントだけを行単位で読みながら圧縮する（圧縮前の全件をメモリに載せない）
+            # ダウンロードボタンはこの実行でだけ表示し、再実行のたびに作り直さない
+            journal.flush(timeout=5)
+            # 期間の選択途中（開始日のみ）なら1日分
+            start_day, end_day = (ops_range[0], ops_range[-1]) if ops_range else (first_day, today)
+            export_data, export_count = journal.export_gzip(
+                start_day.isoformat(), f"{end_day.isoformat()}T23:59:59.999"
+            )
+            st.download_button(
+                f"📥 ダウンロード（{export_count:,}件）",
+                export_data,
+                file_name=f"ops_{start_day:%Y%m%d}_{end_day:%Y%m%d}.jsonl.gz",
+                mime="application/gzip",
+            )
+
+show_profile_panel()
 
 st.markdown("---")
 st.caption(
     f"最終更新: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Powered by Streamlit | ユーザー: {name}"
 )
-
-# QRスキャナー機能を一時的に無効化
-def qr_scanner(label):
-    st.info("QRスキャナー機能は現在開発中です")
-    return None
-
-if __name__ == "__main__":
-    # この行をコメントアウトまたは削除
-    # code = qr_scanner("クリックしてカメラを起動")
-    pass
\ No newline at end of file
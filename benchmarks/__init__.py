@@ -0,0 +1 @@
+# benchmarks - 合成データによる処理性能の計測
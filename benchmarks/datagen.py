@@ -0,0 +1,98 @@
+# datagen.py - ベンチマーク用の合成在庫データ生成
+#
+#   python -m benchmarks.datagen --rows 1000000 --skus 50000 --locations 40 --days 90 --format csv
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# 生成データの置き場所（ファイル名に条件を含めて再利用する）
+DATA_DIR = os.getenv("WAREHOUSE_BENCH_DATA", os.path.join("benchmarks", "data"))
+
+# Excel は行数の上限（1,048,576行）があり書き出しも遅いため、この件数までに限る
+XLSX_MAX_ROWS = 1_000_000
+
+_PRODUCT_WORDS = ["ボルト", "ナット", "ワッシャー", "ねじ", "パッキン", "ケーブル", "箱", "テープ", "ラベル", "フィルム"]
+
+
+def generate_inventory(rows, skus=10_000, locations=20, days=30, seed=0, start="2025-01-01"):
+    """在庫データを生成する（全列をベクトル演算で作る）
+
+    商品ID・ロケーション・更新日の種類数を指定できる。
+    """
+    rng = np.random.default_rng(seed)
+    skus = max(1, min(skus, rows))
+
+    sku_codes = rng.integers(0, skus, rows)
+    sku_ids = pd.Index([f"SKU{i:07d}" for i in range(skus)])
+    sku_names = pd.Index([
+        f"{_PRODUCT_WORDS[i % len(_PRODUCT_WORDS)]}-{i:05d}" for i in range(skus)
+    ])
+    loc_names = pd.Index([f"L{i:03d}" for i in range(locations)])
+    dates = pd.date_range(start, periods=days, freq="D")
+
+    # 在庫数は品目ごとに水準が違い、少数が 0 付近になる分布にする
+    base = rng.gamma(2.0, 20.0, skus)
+    stock = np.maximum(0, rng.normal(base[sku_codes], base[sku_codes] / 3)).round().astype("int64")
+
+    df = pd.DataFrame({
+        "商品ID": sku_ids.take(sku_codes),
+        "商品名": sku_names.take(sku_codes),
+        "在庫数": stock,
+        "ロケーション": loc_names.take(rng.integers(0, locations, rows)),
+        "更新日": dates.take(rng.integers(0, days, rows)).strftime("%Y-%m-%d"),
+    })
+    return df
+
+
+def dataset_path(rows, skus, locations, days, fmt, seed=0, data_dir=DATA_DIR):
+    name = f"inventory_r{rows}_s{skus}_l{locations}_d{days}_seed{seed}.{fmt}"
+    return os.path.join(data_dir, name)
+
+
+def write_dataset(rows, skus=10_000, locations=20, days=30, fmt="csv", seed=0,
+                  data_dir=DATA_DIR, overwrite=False):
+    """生成データをファイルに書き出し、パスを返す（同じ条件のファイルがあれば再利用）"""
+    if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+        raise ValueError(f"xlsx は {XLSX_MAX_ROWS:,} 行までです")
+    path = dataset_path(rows, skus, locations, days, fmt, seed, data_dir)
+    if os.path.exists(path) and not overwrite:
+        return path
+
+    os.makedirs(data_dir, exist_ok=True)
+    df = generate_inventory(rows, skus, locations, days, seed)
+    # 拡張子で書き出し形式が決まるため、一時ファイルも同じ拡張子にする
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{ext}"
+    if fmt == "csv":
+        df.to_csv(tmp, index=False)
+    elif fmt == "xlsx":
+        df.to_excel(tmp, index=False, engine="openpyxl")
+    else:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    os.replace(tmp, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成在庫データを生成する")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+
+    for rows in args.rows:
+        path = write_dataset(
+            rows, args.skus, args.locations, args.days, args.format, args.seed,
+            overwrite=args.overwrite,
+        )
+        print(f"{rows:>12,} 行 -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# run.py - 在庫データ処理のベンチマーク（Streamlit なしで実行）
+#
+#   python -m benchmarks.run --rows 10000 100000 1000000
+#   python -m benchmarks.run --rows 100000 --format xlsx --memory
+#   python -m benchmarks.run --save-baseline          # 現在の結果を基準として保存
+#   python -m benchmarks.run                          # 基準と比較し、遅くなった段階があれば終了コード 1
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datagen import write_dataset
+from warehouse.loader import convert_types, normalize_column_names, optimize_dtypes, read_inventory
+from warehouse.location_index import LocationIndex
+from warehouse.nlquery import parse_rule_based, run_query
+from warehouse.profiling import Profiler
+from warehouse.reorder import ReorderModel, Thresholds
+from warehouse.table_view import TableView, low_stock_mask
+
+BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+
+# 基準より何割遅くなったら劣化とみなすか（短い段階の揺れは MIN_DELTA 秒まで無視）
+TOLERANCE = 0.2
+MIN_DELTA = 0.005
+
+LOW_STOCK_THRESHOLD = 10
+
+
+def run_pipeline(path, trace_memory=False):
+    """app.py と同じ順序で1ファイル分の処理を実行し、段階ごとの計測結果を返す"""
+    profiler = Profiler(trace_memory=trace_memory, label=os.path.basename(path))
+
+    with profiler.span("解析") as span:
+        df = read_inventory(path, path)
+        span.rows = len(df)
+    rows = len(df)
+    with profiler.span("列名正規化", rows):
+        # 記録済みの対応を使うと2回目以降は判定を省略するため、毎回判定させる
+        df, _ = normalize_column_names(df, remember=False)
+    with profiler.span("型変換", rows):
+        convert_types(df)
+    with profiler.span("型最適化", rows):
+        optimize_dtypes(df)
+
+    with profiler.span("KPI", rows):
+        int(df["在庫数"].sum())
+        int(low_stock_mask(df, LOW_STOCK_THRESHOLD).sum())
+
+    with profiler.span("ロケーションインデックス", rows):
+        index = LocationIndex(df)
+    selected = index.locations[: max(1, len(index.locations) // 2)]
+    with profiler.span("フィルター", rows):
+        # app.py と同じく行を取り出さず、一覧・問い合わせに渡すマスクだけを作る
+        mask = index.mask(selected)
+    with profiler.span("ロケーション別集計", rows):
+        index.location_totals(selected)
+    with profiler.span("日別集計", rows):
+        index.daily_totals(selected)
+    with profiler.span("発注点", rows):
+        ReorderModel(df).evaluate(Thresholds(), selected)
+
+    with profiler.span("並べ替え", rows):
+        TableView(df).rows(row_mask=mask, sort_by="在庫数", ascending=True)
+    with profiler.span("問い合わせ", rows):
+        spec = parse_rule_based(
+            f"{selected[0]}で在庫{LOW_STOCK_THRESHOLD}未満の件数は", index.locations
+        )
+        run_query(df, spec, index.mask)
+    return profiler.to_dict()
+
+
+def summarize(runs):
+    """繰り返し実行の結果を段階ごとに集約（時間は最小値、メモリは最大値）"""
+    stages = {}
+    for run in runs:
+        for span in run["spans"]:
+            stage = stages.setdefault(span["name"], {"seconds": [], "peak_bytes": []})
+            stage["seconds"].append(span["seconds"])
+            if span["peak_bytes"] is not None:
+                stage["peak_bytes"].append(span["peak_bytes"])
+    return {
+        name: {
+            "seconds": round(min(values["seconds"]), 6),
+            "median_seconds": round(float(np.median(values["seconds"])), 6),
+            "peak_mb": round(max(values["peak_bytes"]) / 1024**2, 3) if values["peak_bytes"] else None,
+        }
+        for name, values in stages.items()
+    }
+
+
+def run_case(rows, fmt, skus, locations, days, repeat, trace_memory):
+    path = write_dataset(rows, min(skus, rows), locations, days, fmt)
+    runs = [run_pipeline(path, trace_memory) for _ in range(repeat)]
+    stages = summarize(runs)
+    total = sum(stage["seconds"] for stage in stages.values())
+    return {
+        "rows": rows,
+        "format": fmt,
+        "file_mb": round(os.path.getsize(path) / 1024**2, 2),
+        "total_seconds": round(total, 6),
+        "rows_per_sec": round(rows / total) if total else None,
+        "stages": stages,
+    }
+
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA):
+    """基準と比較して、遅くなった段階の一覧を返す"""
+    regressions = []
+    for case, result in results["cases"].items():
+        base_case = baseline.get("cases", {}).get(case)
+        if base_case is None:
+            continue
+        for name, stage in result["stages"].items():
+            base = base_case["stages"].get(name)
+            if base is None:
+                continue
+            delta = stage["seconds"] - base["seconds"]
+            if delta > min_delta and stage["seconds"] > base["seconds"] * (1 + tolerance):
+                regressions.append({
+                    "case": case,
+                    "stage": name,
+                    "baseline": base["seconds"],
+                    "current": stage["seconds"],
+                    "ratio": round(stage["seconds"] / base["seconds"], 2) if base["seconds"] else None,
+                })
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for case, result in results["cases"].items():
+        base_stages = (baseline or {}).get("cases", {}).get(case, {}).get("stages", {})
+        print(f"\n== {case}: {result['rows']:,} 行 / {result['file_mb']} MB "
+              f"/ 合計 {result['total_seconds']:.3f}秒 ({result['rows_per_sec'] or 0:,} 行/秒)")
+        for name, stage in result["stages"].items():
+            line = f"  {name:<16} {stage['seconds'] * 1000:10.1f} ms"
+            if stage["peak_mb"] is not None:
+                line += f"  peak {stage['peak_mb']:8.1f} MB"
+            base = base_stages.get(name)
+            if base and base["seconds"]:
+                line += f"  (基準比 x{stage['seconds'] / base['seconds']:.2f})"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在庫データ処理のベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--format", choices=["csv", "xlsx"], nargs="+", default=["csv"])
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory", action="store_true", help="tracemalloc でピークメモリも計測（遅くなる）")
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準として保存")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = {"environment": environment(), "memory": args.memory, "cases": {}}
+    for fmt in args.format:
+        for rows in args.rows:
+            case = f"{fmt}_{rows}"
+            print(f"▶ {case} ...", file=sys.stderr)
+            results["cases"][case] = run_case(
+                rows, fmt, args.skus, args.locations, args.days, args.repeat, args.memory
+            )
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基準を保存しました: {args.baseline}")
+        return 0
+    if baseline is None:
+        print("\n基準がありません（--save-baseline で保存できます）")
+        return 0
+
+    if baseline.get("memory", False) != args.memory:
+        # tracemalloc の有無で処理時間が大きく変わるため比較しない
+        print("\n⚠️ 基準とメモリ計測（--memory）の設定が違うため比較を省略しました")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"\n✅ 基準からの劣化はありません（許容 +{args.tolerance:.0%}）")
+        return 0
+    print(f"\n❌ 基準より遅くなった段階が {len(regressions)} 件あります")
+    for r in regressions:
+        print(f"  {r['case']} / {r['stage']}: {r['baseline'] * 1000:.1f} ms -> "
+              f"{r['current'] * 1000:.1f} ms (x{r['ratio']})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
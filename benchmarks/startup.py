@@ -0,0 +1,227 @@
+# startup.py - 起動時間（最初の画面を出すまでの import）の計測
+#
+# 各スクリプトを新しいプロセスで `python -X importtime` 付きで実行し、最初の画面
+# （app.py はログイン画面、チャットは入力待ち）までに読み込んだモジュールを集計する。
+#
+#   python -m benchmarks.startup                    # 全対象の内訳を表示し、基準と比較
+#   python -m benchmarks.startup app --top 30
+#   python -m benchmarks.startup --save-baseline
+#
+# 起動時に読み込んではいけないモジュール（plotly など）が読み込まれていた場合や、
+# import 時間が基準より遅くなった場合は終了コード 1。
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join("benchmarks", "startup_baseline.json")
+
+# 基準より何割遅くなったら劣化とみなすか（MIN_DELTA 秒までの揺れは無視）
+TOLERANCE = 0.3
+MIN_DELTA = 0.05
+
+# 計測対象: スクリプト、Streamlit アプリか、最初の画面までに読み込んではいけないモジュール
+# （pandas / pyarrow はログイン画面の Cookie 用コンポーネントで streamlit が読み込むため対象外）
+TARGETS = {
+    "app": {
+        "script": "app.py",
+        "streamlit": True,
+        "deferred": ["plotly.express", "plotly.graph_objects", "openpyxl", "openai", "warehouse.loader"],
+    },
+    "zen_ai_web": {
+        "script": os.path.join("web_version", "zen_ai_web.py"),
+        "streamlit": True,
+        "deferred": ["openai", "numpy", "tiktoken", "plotly.express", "openpyxl"],
+    },
+    "zen_ai": {
+        "script": "zen_ai.py",
+        "streamlit": False,
+        "deferred": ["openai", "numpy", "tiktoken"],
+    },
+}
+
+_MARKER = "@@startup@@"
+
+# 子プロセスで実行するコード。st.stop() と input() を最初の画面で止める例外に置き換える
+_CHILD = """
+import builtins, runpy, sys, time
+
+class _FirstPaint(BaseException):
+    pass
+
+def _stop(*args, **kwargs):
+    raise _FirstPaint
+
+start = time.perf_counter()
+if {streamlit!r}:
+    import streamlit as st
+    st.stop = _stop
+runtime = time.perf_counter() - start
+builtins.input = _stop
+sys.stderr.write("{marker} runtime %f\\n" % runtime)
+start = time.perf_counter()
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except (_FirstPaint, SystemExit):
+    pass
+sys.stderr.write("{marker} script %f\\n" % (time.perf_counter() - start))
+"""
+
+
+def parse_importtime(lines):
+    """`-X importtime` の出力を (モジュール名, 自身の秒, 累積の秒, 深さ) のリストに"""
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return entries
+
+
+def profile_target(name, target, python=sys.executable):
+    """1対象を新しいプロセスで実行し、計測結果を返す"""
+    code = _CHILD.format(streamlit=target["streamlit"], marker=_MARKER, script=target["script"])
+    env = dict(os.environ)
+    env.update({
+        # キーの確認より後の読み込みも計測するため、ダミーのキーを渡す（API は呼ばない）
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "startup-profile",
+        "ZEN_AI_CACHE_PATH": os.path.join(tempfile.gettempdir(), "startup_profile_cache.db"),
+    })
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True, encoding="utf-8", errors="replace", env=env,
+    )
+    wall = time.perf_counter() - start
+
+    lines = proc.stderr.splitlines()
+    seconds = {}
+    # 目印より後の行がスクリプト自身の読み込み（streamlit 本体はサーバー起動時に読み込み済み）
+    after = []
+    for line in lines:
+        if line.startswith(_MARKER):
+            _, stage, value = line.split()
+            seconds[stage] = float(value)
+            if stage == "runtime":
+                after = []
+        else:
+            after.append(line)
+    if "script" not in seconds:
+        raise RuntimeError(f"{name}: 計測に失敗しました\n" + "\n".join(lines[-20:]))
+
+    entries = parse_importtime(after)
+    packages = {}
+    for module, self_sec, _, _ in entries:
+        top = module.split(".")[0]
+        packages[top] = packages.get(top, 0.0) + self_sec
+    loaded = {module for module, _, _, _ in entries}
+    return {
+        "script": target["script"],
+        "wall_seconds": round(wall, 4),
+        "runtime_seconds": round(seconds.get("runtime", 0.0), 4),
+        "script_seconds": round(seconds["script"], 4),
+        "import_seconds": round(sum(self_sec for _, self_sec, _, _ in entries), 4),
+        "modules": len(entries),
+        "packages": {
+            top: round(sec, 4)
+            for top, sec in sorted(packages.items(), key=lambda item: -item[1])
+        },
+        "roots": [
+            {"module": module, "cumulative_seconds": round(cumulative, 4)}
+            for module, _, cumulative, depth in sorted(entries, key=lambda e: -e[2])
+            if depth == 0
+        ],
+        "deferred_loaded": sorted(
+            m for m in target["deferred"]
+            if any(module == m or module.startswith(m + ".") for module in loaded)
+        ),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA):
+    """基準と比較して、import 時間が遅くなった対象の一覧を返す"""
+    regressions = []
+    for name, result in results["targets"].items():
+        base = baseline.get("targets", {}).get(name)
+        if base is None:
+            continue
+        current, previous = result["import_seconds"], base["import_seconds"]
+        if current - previous > min_delta and current > previous * (1 + tolerance):
+            regressions.append({"target": name, "baseline": previous, "current": current})
+    return regressions
+
+
+def print_results(results, top, baseline=None):
+    for name, result in results["targets"].items():
+        base = (baseline or {}).get("targets", {}).get(name)
+        line = (f"\n== {name} ({result['script']}): 最初の画面まで {result['script_seconds'] * 1000:,.0f} ms"
+                f" / import {result['import_seconds'] * 1000:,.0f} ms ({result['modules']}モジュール)")
+        if base and base["import_seconds"]:
+            line += f"  (基準比 x{result['import_seconds'] / base['import_seconds']:.2f})"
+        print(line)
+        if result["runtime_seconds"]:
+            print(f"  streamlit 本体: {result['runtime_seconds'] * 1000:,.0f} ms（サーバー起動時に読み込み済み）")
+        print("  パッケージ別（自身の時間の合計）:")
+        for package, sec in list(result["packages"].items())[:top]:
+            print(f"    {package:<32} {sec * 1000:8.1f} ms")
+        print("  スクリプトが直接読み込んだモジュール（累積）:")
+        for root in result["roots"][:top]:
+            print(f"    {root['module']:<32} {root['cumulative_seconds'] * 1000:8.1f} ms")
+        if result["deferred_loaded"]:
+            print(f"  ❌ 起動時に読み込まれています: {', '.join(result['deferred_loaded'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="起動時の import 時間を計測する")
+    parser.add_argument("targets", nargs="*", help=f"計測対象（{', '.join(TARGETS)}。省略時は全て）")
+    parser.add_argument("--top", type=int, default=15, help="内訳の表示件数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（import 時間が最小の回を採用）")
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準として保存")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"不明な対象です: {', '.join(unknown)}")
+
+    from benchmarks.run import environment
+
+    results = {"environment": environment(), "targets": {}}
+    for name in args.targets or list(TARGETS):
+        print(f"▶ {name} ...", file=sys.stderr)
+        runs = [profile_target(name, TARGETS[name]) for _ in range(max(1, args.repeat))]
+        results["targets"][name] = min(runs, key=lambda run: run["import_seconds"])
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, args.top, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基準を保存しました: {args.baseline}")
+
+    failed = [name for name, result in results["targets"].items() if result["deferred_loaded"]]
+    regressions = compare(results, baseline, args.tolerance) if baseline else []
+    for r in regressions:
+        print(f"\n❌ {r['target']}: import {r['baseline'] * 1000:,.0f} ms -> {r['current'] * 1000:,.0f} ms")
+    if failed or regressions:
+        return 1
+    print("\n✅ 起動時の読み込みに問題はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
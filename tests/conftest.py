@@ -0,0 +1,14 @@
+# conftest.py - テストが作業ディレクトリに列名対応の記録を書かないようにする
+import pytest
+
+from warehouse import columns
+
+
+@pytest.fixture(autouse=True)
+def column_memory(tmp_path, monkeypatch):
+    path = str(tmp_path / "column_mappings.json")
+    # 一括取り込み・パイプラインのワーカープロセスは環境変数から読む
+    monkeypatch.setenv("WAREHOUSE_COLUMN_MEMORY", path)
+    monkeypatch.setattr(columns._memory, "path", path)
+    monkeypatch.setattr(columns._memory, "_data", None)
+    return columns._memory
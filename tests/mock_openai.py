@@ -0,0 +1,130 @@
+# mock_openai.py - テスト・動作確認用の OpenAI 互換モックサーバー
+#
+# /v1/chat/completions（通常・ストリーミング）と /v1/embeddings に応答する。
+# 単体でも起動でき、OPENAI_BASE_URL に指定すれば Web版・CLI版を API キーなしで試せる:
+#   python tests/mock_openai.py --port 8000
+#   OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=dummy streamlit run web_version/zen_ai_web.py
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ["こんにちは", "！", "zenさん", "専用AI", "です。"]
+
+
+class MockOpenAI:
+    """応答内容・チャンク間隔・失敗回数を設定できるモックサーバー"""
+
+    def __init__(self, reply=None, delay=0.0, failures=0, host="127.0.0.1", port=0):
+        self.reply = list(DEFAULT_REPLY if reply is None else reply)
+        self.delay = delay
+        # 最初の failures 回は 503 を返す（再試行の確認用）
+        self.failures = failures
+        self.requests = []
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock.requests.append({"path": self.path, "body": body})
+                if mock.failures > 0:
+                    mock.failures -= 1
+                    return self._json(503, {"error": {"message": "unavailable", "type": "server_error"}})
+                if self.path.endswith("/embeddings"):
+                    return self._json(200, {
+                        "object": "list",
+                        "model": body.get("model"),
+                        "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2, 0.3]}],
+                    })
+                if not self.path.endswith("/chat/completions"):
+                    return self._json(404, {"error": {"message": "not found"}})
+                if body.get("stream"):
+                    return self._stream(body)
+                return self._json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(mock.reply)},
+                        "finish_reason": "stop",
+                    }],
+                })
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+
+                def send(delta, finish=None):
+                    chunk = {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+                    self.wfile.flush()
+
+                send({"role": "assistant"})
+                for text in mock.reply:
+                    time.sleep(mock.delay)
+                    send({"content": text})
+                send({}, "stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 互換のモックサーバー")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.2, help="チャンクの間隔（秒）")
+    args = parser.parse_args(argv)
+    mock = MockOpenAI(delay=args.delay, port=args.port)
+    print(f"OPENAI_BASE_URL={mock.base_url}")
+    mock.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
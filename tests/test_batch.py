@@ -0,0 +1,57 @@
+# test_batch.py - フォルダ・glob パターンからの一括取り込み
+import pytest
+
+from warehouse.batch import SOURCE_COLUMN, expand_pattern, load_batch, resolve_data_path
+
+CSV = "品番,品名,数量,場所\n{id},ペン,3,東京\n"
+
+
+def write(path, item_id):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(CSV.format(id=item_id), encoding="utf-8")
+
+
+def test_recursive_glob_keeps_same_named_files_apart(tmp_path):
+    write(tmp_path / "ex" / "a" / "inv.csv", "A01")
+    write(tmp_path / "ex" / "b" / "inv.csv", "B01")
+
+    sources = expand_pattern(str(tmp_path / "ex" / "**" / "*.csv"))
+    assert [name for name, _ in sources] == ["a/inv.csv", "b/inv.csv"]
+
+    result = load_batch(sources, parallel=False)
+    by_source = result.df.groupby(SOURCE_COLUMN, observed=True)["商品ID"].first()
+    assert by_source.to_dict() == {"a/inv.csv": "A01", "b/inv.csv": "B01"}
+
+
+def test_folder_names_are_relative_to_folder(tmp_path):
+    write(tmp_path / "ex" / "inv.csv", "A01")
+    assert [name for name, _ in expand_pattern(str(tmp_path / "ex"))] == ["inv.csv"]
+
+
+def test_batch_carries_shared_schema_fingerprint(tmp_path):
+    write(tmp_path / "a.csv", "A01")
+    write(tmp_path / "b.csv", "B01")
+    result = load_batch(expand_pattern(str(tmp_path / "*.csv")), parallel=False)
+    assert result.notes["schema_fingerprint"]
+
+
+def test_patterns_stay_inside_data_root(tmp_path):
+    root = tmp_path / "data"
+    write(root / "inv.csv", "A01")
+    write(tmp_path / "secret.csv", "S01")
+    (root / "link").symlink_to(tmp_path)
+
+    assert [name for name, _ in expand_pattern("*.csv", root=str(root))] == ["inv.csv"]
+    assert expand_pattern("../*.csv", root=str(root)) == []
+    assert expand_pattern(str(tmp_path / "*.csv"), root=str(root)) == []
+    # シンボリックリンクでデータフォルダの外に出るファイルも除く
+    assert expand_pattern("link/*.csv", root=str(root)) == []
+
+
+def test_resolve_data_path_rejects_outside(tmp_path):
+    root = tmp_path / "data"
+    write(root / "inv.csv", "A01")
+    assert resolve_data_path("inv.csv", root=str(root)) == str((root / "inv.csv").resolve())
+    for path in ["../secret.csv", str(tmp_path / "secret.csv")]:
+        with pytest.raises(ValueError):
+            resolve_data_path(path, root=str(root))
@@ -0,0 +1,91 @@
+# test_cache.py - 応答キャッシュのヒット・ミス・期限切れ
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from zen_chat import cache as cache_module
+from zen_chat.cache import ResponseCache
+
+MODEL = "gpt-test"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ResponseCache(str(tmp_path / "cache.db"), ttl=60, max_entries=3)
+
+
+def test_hit_after_put_with_normalized_prompt(cache):
+    assert cache.get("在庫の確認方法は？", MODEL, 0.7) == (None, None)
+    cache.put("在庫の確認方法は？", "一覧を開きます", MODEL, 0.7, latency=1.5)
+
+    # 全角・大文字小文字・空白・末尾の記号の違いは同じ質問とみなす
+    assert cache.get("  在庫の確認方法は?", MODEL, 0.7) == ("一覧を開きます", "exact")
+    stats = cache.stats()
+    assert (stats["hits_exact"], stats["misses"]) == (1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["latency_saved_sec"] == 1.5
+
+
+def test_scope_separates_model_temperature_and_system(cache):
+    cache.put("質問", "応答", MODEL, 0.7, latency=1, system="A")
+    assert cache.get("質問", MODEL, 0.7, system="A")[0] == "応答"
+    assert cache.get("質問", MODEL, 0.7, system="B") == (None, None)
+    assert cache.get("質問", MODEL, 0.2, system="A") == (None, None)
+    assert cache.get("質問", "other", 0.7, system="A") == (None, None)
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put("質問", "応答", MODEL, 0.7, latency=1)
+    clock.value += 59
+    assert cache.get("質問", MODEL, 0.7)[0] == "応答"
+    clock.value += 2
+    assert cache.get("質問", MODEL, 0.7) == (None, None)
+
+    # 次の登録時に期限切れの行は削除される
+    cache.put("別の質問", "応答", MODEL, 0.7, latency=1)
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_hit_entries_are_evicted(cache, clock):
+    for i in range(3):
+        clock.value += 1
+        cache.put(f"質問{i}", f"応答{i}", MODEL, 0.7, latency=1)
+    clock.value += 1
+    cache.get("質問0", MODEL, 0.7)
+    clock.value += 1
+    cache.put("質問3", "応答3", MODEL, 0.7, latency=1)
+
+    assert cache.stats()["entries"] == 3
+    assert cache.get("質問1", MODEL, 0.7) == (None, None)
+    assert cache.get("質問0", MODEL, 0.7)[0] == "応答0"
+
+
+def test_semantic_hit_uses_embedding(tmp_path, clock):
+    pytest.importorskip("numpy")
+    vectors = {"在庫を見たい": [1.0, 0.0], "在庫を確認したい": [0.99, 0.05], "天気は": [0.0, 1.0]}
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60, embed=vectors.__getitem__, threshold=0.9)
+    cache.put("在庫を見たい", "一覧を開きます", MODEL, 0.7, latency=1)
+
+    assert cache.get("在庫を確認したい", MODEL, 0.7) == ("一覧を開きます", "semantic")
+    assert cache.get("天気は", MODEL, 0.7) == (None, None)
+
+
+def test_connection_is_reused_per_thread(cache):
+    conn = cache._connect()
+    cache.put("質問", "応答", MODEL, 0.7, latency=1)
+    cache.get("質問", MODEL, 0.7)
+    assert cache._connect() is conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(cache._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
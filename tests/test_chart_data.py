@@ -0,0 +1,73 @@
+# test_chart_data.py - グラフ送信前の間引き・上位N件の集約
+import numpy as np
+import pandas as pd
+
+from warehouse.chart_data import (
+    OTHER_LABEL,
+    downsample,
+    lttb_indices,
+    minmax_indices,
+    top_n_with_other,
+)
+
+
+SPIKE = 437
+
+
+def _series(n=1000):
+    days = pd.date_range("2025-01-01", periods=n, freq="D")
+    stock = np.sin(np.arange(n) / 20) * 100 + 500
+    if n > SPIKE:
+        stock[SPIKE] = 5000
+    return pd.DataFrame({"更新日": days, "在庫数": stock})
+
+
+def test_lttb_keeps_endpoints_and_size():
+    df = _series()
+    rows = lttb_indices(df["更新日"], df["在庫数"], 100)
+    assert len(rows) == 100
+    assert rows[0] == 0
+    assert rows[-1] == len(df) - 1
+    assert (np.diff(rows) > 0).all()
+    # 三角形の面積が最大の点を選ぶため、目立つスパイクは残る
+    assert SPIKE in rows
+
+
+def test_small_inputs_are_returned_unchanged():
+    df = _series(50)
+    assert list(lttb_indices(df["更新日"], df["在庫数"], 100)) == list(range(50))
+    assert downsample(df, "更新日", "在庫数", max_points=100) is df
+
+
+def test_minmax_keeps_spike():
+    df = _series()
+    rows = minmax_indices(df["在庫数"], 100)
+    assert len(rows) <= 100
+    assert SPIKE in rows
+
+
+def test_downsample_selects_rows_in_order():
+    df = _series()
+    sampled = downsample(df, "更新日", "在庫数", max_points=200)
+    assert len(sampled) == 200
+    assert sampled["更新日"].is_monotonic_increasing
+    assert sampled["在庫数"].max() == 5000
+
+
+def test_top_n_with_other():
+    totals = pd.DataFrame({"ロケーション": list("ABCDE"), "在庫数": [5, 50, 10, 40, 1]})
+    grouped = top_n_with_other(totals, "ロケーション", "在庫数", top_n=2)
+    assert grouped["ロケーション"].tolist() == ["B", "D", OTHER_LABEL]
+    assert grouped["在庫数"].tolist() == [50, 40, 16]
+    # 合計は変わらない
+    assert grouped["在庫数"].sum() == totals["在庫数"].sum()
+
+
+def test_top_n_accepts_categorical_labels():
+    totals = pd.DataFrame({
+        "ロケーション": pd.Categorical(list("ABC")),
+        "在庫数": [1, 2, 3],
+    })
+    grouped = top_n_with_other(totals, "ロケーション", "在庫数", top_n=1)
+    assert grouped["ロケーション"].tolist() == ["C", OTHER_LABEL]
+    assert top_n_with_other(totals, "ロケーション", "在庫数", top_n=3) is totals
@@ -0,0 +1,81 @@
+# test_chat_client.py - 共有クライアントの同時実行数の上限
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from zen_chat import client as chat_client  # noqa: E402
+
+
+class FakeCompletions:
+    """チャンクを少しずつ返すストリームを作り、同時に開いている数を数える"""
+
+    def __init__(self, chunks=5, delay=0.02):
+        self.chunks = chunks
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    async def create(self, stream=True, **request):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        return FakeStream(self)
+
+
+class FakeStream:
+    def __init__(self, owner):
+        self.owner = owner
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for i in range(self.owner.chunks):
+            await asyncio.sleep(self.owner.delay)
+            delta = SimpleNamespace(content=f"t{i}")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            with self.owner._lock:
+                self.owner.active -= 1
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(chat_client, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(chat_client, "RATE_PER_MINUTE", 6000)
+    client = chat_client.ChatClient()
+    completions = FakeCompletions()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(chat_client, "_client", client)
+    yield client, completions
+    client.loop.call_soon_threadsafe(client.loop.stop)
+
+
+def test_concurrent_streams_are_limited(fake_client):
+    client, completions = fake_client
+    messages = [{"role": "user", "content": "こんにちは"}]
+    results = [None] * 6
+
+    def run(i):
+        results[i] = "".join(chat_client.stream_chat(messages))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert results == ["t0t1t2t3t4"] * len(results)
+    # 読み終えるまで枠を持つため、同時に開いているストリームは上限を超えない
+    assert completions.peak == 2
+    assert completions.active == 0
@@ -0,0 +1,81 @@
+# test_columns.py - 列名の自動認識と対応の記録
+import pandas as pd
+import pytest
+
+from warehouse import columns
+from warehouse.columns import ALIAS_INDEX, MappingMemory, detect_columns
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return MappingMemory(str(tmp_path / "column_mappings.json"))
+
+
+@pytest.fixture
+def jan_frame():
+    n = 30
+    return pd.DataFrame({
+        "JANコード": [4901234567890 + i for i in range(n)],
+        "品名": [f"品目{i}" for i in range(n)],
+        "入数": [6, 12, 24] * (n // 3),
+        "場所": ["東京", "大阪"] * (n // 2),
+    })
+
+
+def test_barcode_column_is_not_taken_as_stock(jan_frame, memory):
+    mapping, methods, _ = detect_columns(jan_frame, memory)
+    assert mapping["入数"] == "在庫数"
+    assert methods["入数"] == "values"
+    assert "JANコード" not in mapping
+
+
+def test_id_like_text_columns_are_rejected(memory):
+    df = pd.DataFrame({"品番": ["A1", "A2"], "コードX": ["00123", "00456"], "残り": ["3", "5"]})
+    mapping, _, _ = detect_columns(df, memory)
+    assert mapping == {"品番": "商品ID", "残り": "在庫数"}
+
+
+def test_only_name_based_mappings_are_remembered(jan_frame, memory):
+    _, _, fingerprint = detect_columns(jan_frame, memory)
+    assert memory.get(fingerprint) == {"品名": "商品名", "場所": "ロケーション"}
+
+    # 記憶済みでも値からの推定はやり直す
+    mapping, methods, _ = detect_columns(jan_frame, memory)
+    assert methods == {"品名": "memory", "場所": "memory", "入数": "values"}
+    assert mapping["入数"] == "在庫数"
+
+
+def test_forget_clears_remembered_mapping(jan_frame, memory):
+    _, _, fingerprint = detect_columns(jan_frame, memory)
+    memory.put(fingerprint, {"JANコード": "在庫数"})
+    memory.forget(fingerprint)
+    assert memory.get(fingerprint) is None
+    assert MappingMemory(memory.path).get(fingerprint) is None
+
+
+@pytest.mark.parametrize("name", ["idx", "商品区分", "在庫区分", "IDカード"])
+def test_short_aliases_do_not_match_longer_words(name):
+    assert ALIAS_INDEX.match(name) == (None, None, 0.0)
+
+
+@pytest.mark.parametrize("name, target", [
+    ("在庫数量", "在庫数"),
+    ("商品コード番号", "商品ID"),
+    ("場所2", "ロケーション"),
+])
+def test_prefix_rules_still_match(name, target):
+    assert ALIAS_INDEX.match(name)[0] == target
+
+
+def test_remembered_mapping_skips_value_inference(memory, monkeypatch):
+    df = pd.DataFrame({"品番": ["A1"], "品名": ["ペン"], "数量": [3], "場所": ["東京"], "日付": ["2025-01-01"]})
+    detect_columns(df, memory)
+
+    def fail(series):
+        raise AssertionError("記憶済みの対応で決まる列構成なのに値を調べた")
+
+    monkeypatch.setattr(columns, "_infer_from_values", fail)
+    mapping, methods, _ = detect_columns(df, memory)
+    assert set(methods.values()) == {"memory"}
+    assert mapping["数量"] == "在庫数"
+    assert mapping["日付"] == "更新日"
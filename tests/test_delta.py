@@ -0,0 +1,82 @@
+# test_delta.py - 差分の分類（追加・更新・変更なし・削除）と反映後のロールアップ
+import pandas as pd
+import pytest
+
+from warehouse import delta
+from warehouse.rollups import query_rollup
+from warehouse.store import InventoryStore
+
+
+def _inventory(rows):
+    return pd.DataFrame(rows, columns=["商品ID", "商品名", "在庫数", "ロケーション", "更新日"])
+
+
+BEFORE = _inventory([
+    ("A01", "ペン", 10, "東京", "2025-06-01"),
+    ("A02", "ノート", 5, "大阪", "2025-06-01"),
+    ("A03", "箱", 7, "東京", "2025-06-01"),
+])
+
+AFTER = _inventory([
+    ("A01", "ペン", 10, "東京", "2025-06-01"),    # 変更なし
+    ("A02", "ノート", 8, "大阪", "2025-06-02"),   # 更新
+    ("A04", "テープ", 3, "名古屋", "2025-06-02"),  # 追加
+    # A03 は削除
+])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InventoryStore(str(tmp_path / "warehouse.db"))
+
+
+def _keys(frame):
+    return sorted(zip(frame["商品ID"], frame["ロケーション"]))
+
+
+def test_diff_classifies_rows(store):
+    delta.sync_inventory(store, BEFORE, "k1", "before")
+    result = delta.diff_inventory(delta.load_current(store), AFTER)
+
+    assert _keys(result.inserted) == [("A04", "名古屋")]
+    assert _keys(result.updated) == [("A02", "大阪")]
+    assert result.updated.loc[0, ["在庫数_前回", "在庫数"]].tolist() == [5, 8]
+    assert _keys(result.deleted) == [("A03", "東京")]
+    assert result.unchanged == 1
+    assert result.changed == 3
+
+
+def test_diff_keeps_last_duplicate(store):
+    doubled = pd.concat([BEFORE, BEFORE.assign(在庫数=99).head(1)], ignore_index=True)
+    result = delta.diff_inventory(delta.load_current(store), doubled)
+
+    assert result.duplicates == 1
+    assert result.inserted.set_index("商品ID").loc["A01", "在庫数"] == 99
+
+
+def test_sync_applies_delta_and_location_totals(store):
+    delta.sync_inventory(store, BEFORE, "k1", "before")
+    result = delta.sync_inventory(store, AFTER, "k2", "after")
+
+    assert result.changed == 3
+    current = delta.load_current(store).set_index("商品ID")["在庫数"].to_dict()
+    assert current == {"A01": 10, "A02": 8, "A04": 3}
+    totals = delta.current_location_totals(store).set_index("ロケーション")
+    assert totals["在庫数"].to_dict() == {"名古屋": 3, "大阪": 8, "東京": 10}
+    assert totals["件数"].to_dict() == {"名古屋": 1, "大阪": 1, "東京": 1}
+    # 反映済みのキーは二重に反映しない
+    assert delta.sync_inventory(store, AFTER, "k2", "after") is None
+    assert delta.last_applied(store) == "k2"
+
+
+def test_sync_refreshes_rollups_for_affected_days(store):
+    delta.sync_inventory(store, BEFORE, "k1", "before")
+    delta.sync_inventory(store, AFTER, "k2", "after")
+
+    daily = query_rollup(store, "day", "2025-06-01", "2025-06-02")
+    totals = dict(zip(daily["更新日"].dt.strftime("%Y-%m-%d"), daily["在庫数"]))
+    # 6/1 は A02・A03 が抜けて A01 だけ、6/2 は A02 と A04
+    assert totals == {"2025-06-01": 10, "2025-06-02": 11}
+    tokyo = query_rollup(store, "day", "2025-06-01", "2025-06-02", locations=["東京"])
+    # 差分に関係する日は、行が無くなったロケーションも 0 として記録する
+    assert tokyo["在庫数"].tolist() == [10, 0]
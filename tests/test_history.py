@@ -0,0 +1,102 @@
+# test_history.py - 履歴のトークン予算と要約への畳み込み
+import pytest
+
+from zen_chat import history
+from zen_chat.history import ChatHistory, count_tokens, window_start
+
+SYSTEM = "S"
+
+# 1メッセージ 50トークン（本文 46 + 書式 4）
+MESSAGE_TOKENS = 50
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    # tiktoken の有無で数え方が変わらないよう、概算の数え方に固定する
+    monkeypatch.setattr(history, "_enc", None)
+    monkeypatch.setattr(history, "_enc_loaded", True)
+
+
+def _messages(n):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": chr(ord("あ") + i) * 46}
+        for i in range(n)
+    ]
+
+
+class FakeComplete:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, messages, max_tokens):
+        self.calls.append(messages[-1]["content"])
+        return f"要約{len(self.calls)}"
+
+
+@pytest.fixture
+def chat():
+    # 履歴に使える予算 = 505 - システム 1 - 要約 300 - 書式 4 = 200（4メッセージ分）
+    return ChatHistory(SYSTEM, budget=505)
+
+
+def test_count_tokens_approximation():
+    assert count_tokens("abcd") == 1
+    assert count_tokens("在庫") == 2
+    assert history.message_tokens({"content": "あ" * 46}) == MESSAGE_TOKENS
+
+
+def test_window_start_keeps_latest_message():
+    messages = _messages(3)
+    assert window_start(messages, 100) == 1
+    # 予算を超えていても最新の1件は送る
+    assert window_start(messages, 10) == 2
+
+
+def test_within_budget_sends_everything(chat):
+    complete = FakeComplete()
+    request, sent, full = chat.prepare(_messages(4), complete)
+    assert complete.calls == []
+    assert len(request) == 5
+    assert sent == full
+
+
+def test_overflow_is_summarized_down_to_half_budget(chat):
+    complete = FakeComplete()
+    messages = _messages(5)
+    request, sent, full = chat.prepare(messages, complete)
+
+    # はみ出したら予算の半分（2メッセージ）まで空けて、古い3件を要約する
+    assert chat.summarized_upto == 3
+    assert len(complete.calls) == 1
+    assert messages[0]["content"] in complete.calls[0]
+    assert request[0]["content"].endswith("これまでの会話の要約:\n要約1")
+    assert [m["content"] for m in request[1:]] == [m["content"] for m in messages[3:]]
+    assert sent < full
+
+
+def test_summary_is_not_rebuilt_every_turn(chat):
+    complete = FakeComplete()
+    chat.prepare(_messages(5), complete)
+    # 予算に空きがあるうちは要約し直さない
+    chat.prepare(_messages(6), complete)
+    chat.prepare(_messages(7), complete)
+    assert len(complete.calls) == 1
+
+    request, _, _ = chat.prepare(_messages(8), complete)
+    assert len(complete.calls) == 2
+    assert chat.summarized_upto == 6
+    # 前回の要約も畳み込む
+    assert "要約1" in complete.calls[1]
+    assert "要約2" in request[0]["content"]
+    assert len(request) == 3
+
+
+def test_failed_summary_falls_back_to_excerpts(chat):
+    def fail(messages, max_tokens):
+        raise RuntimeError("unavailable")
+
+    request, _, _ = chat.prepare(_messages(5), fail)
+    # 要約に畳み込んだ3件の冒頭を並べる
+    lines = chat.summary.splitlines()
+    assert [line.split(":")[0] for line in lines] == ["- zen", "- AI", "- zen"]
+    assert chat.summary in request[0]["content"]
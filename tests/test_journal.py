@@ -0,0 +1,53 @@
+# test_journal.py - 操作履歴ジャーナルの索引とエクスポート
+import gzip
+import json
+import os
+
+from warehouse.journal import INDEX_SUFFIX, OpsJournal
+
+
+def fill(directory, count=40):
+    journal = OpsJournal(str(directory), segment_bytes=512, fsync_interval=0.01)
+    for i in range(count):
+        journal.append({"action": "入庫", "code": f"A{i % 3}", "qty": i})
+    assert journal.flush(timeout=5)
+    journal.close()
+    return journal
+
+
+def test_sealed_segments_get_sidecar_index(tmp_path):
+    journal = fill(tmp_path)
+    names = sorted(os.listdir(tmp_path))
+    segments = [n for n in names if n.endswith(".jsonl")]
+    assert len(segments) > 1
+    # 書き込み中の最後のセグメント以外には索引が保存されている
+    assert [n + INDEX_SUFFIX in names for n in segments] == [True] * (len(segments) - 1) + [False]
+    assert all(s.codes is None for s in journal.segments[:-1])
+
+
+def test_reopen_uses_sidecars_and_keeps_lookups(tmp_path, monkeypatch):
+    before = fill(tmp_path)
+    scanned = []
+    original = OpsJournal._scan
+
+    def scan(self, segment):
+        scanned.append(segment.path)
+        return original(self, segment)
+
+    # 記録を読み直すのは書き込み中だった最後のセグメントだけ
+    monkeypatch.setattr(OpsJournal, "_scan", scan)
+
+    reopened = OpsJournal(str(tmp_path))
+    assert scanned == [before.segments[-1].path]
+    assert reopened.stats()["records"] == 40
+    assert [r["qty"] for r in reopened.find_code("A1", limit=3)] == [37, 34, 31]
+    assert [r["qty"] for r in before.find_code("A1", limit=3)] == [37, 34, 31]
+    reopened.close()
+
+
+def test_export_gzip_streams_records(tmp_path):
+    journal = fill(tmp_path, count=10)
+    data, count = journal.export_gzip()
+    lines = gzip.decompress(data).decode("utf-8").splitlines()
+    assert count == 10
+    assert [json.loads(line)["qty"] for line in lines] == list(range(10))
@@ -0,0 +1,111 @@
+# test_nlquery.py - 自然文の問い合わせの構造化と実行
+import json
+
+import pandas as pd
+import pytest
+
+from warehouse.nlquery import (
+    answer_messages,
+    normalize_spec,
+    parse_question,
+    parse_rule_based,
+    run_query,
+)
+
+LOCATIONS = ["東京", "大阪", "名古屋"]
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "商品ID": ["A01", "A02", "B01", "B02", "C01"],
+        "商品名": ["ペン", "ノート", "箱", "テープ", "クリップ"],
+        "在庫数": [23, 5, 12, 3, 15],
+        "ロケーション": ["東京", "大阪", "東京", "大阪", "名古屋"],
+        "更新日": pd.to_datetime(["2025-06-01", "2025-06-01", "2025-06-02", "2025-06-02", "2025-06-03"]),
+    })
+
+
+def test_location_and_stock_condition():
+    spec = parse_rule_based("大阪で在庫10未満の品目は?", LOCATIONS)
+    assert spec["locations"] == ["大阪"]
+    assert spec["stock"] == {"op": "<", "value": 10.0}
+    assert spec["metric"] == "rows"
+
+
+@pytest.mark.parametrize("question, op, value", [
+    ("在庫が５個以下の商品", "<=", 5.0),
+    ("在庫数は100以上", ">=", 100.0),
+    ("在庫切れの品目は？", "<=", 0.0),
+])
+def test_stock_phrases(question, op, value):
+    assert parse_rule_based(question, LOCATIONS)["stock"] == {"op": op, "value": value}
+
+
+def test_grouping_metric_and_top_n():
+    spec = parse_rule_based("ロケーション別の在庫合計を多い順に上位2件", LOCATIONS)
+    assert spec["group_by"] == "ロケーション"
+    assert spec["metric"] == "sum"
+    assert spec["sort"] == "desc"
+    assert spec["limit"] == 2
+
+
+def test_run_query_filters_rows(df):
+    result = run_query(df, parse_rule_based("大阪で在庫10未満の品目は?", LOCATIONS))
+    assert result.table["商品ID"].tolist() == ["B02", "A02"]
+    assert (result.matched_rows, result.matched_stock) == (2, 8)
+
+
+def test_run_query_groups(df):
+    result = run_query(df, parse_rule_based("ロケーション別の在庫合計を多い順に上位2件", LOCATIONS))
+    assert result.table["ロケーション"].tolist() == ["東京", "名古屋"]
+    assert result.table.iloc[:, 1].tolist() == [35, 15]
+    assert result.total_groups == 3
+
+
+def test_count_metric(df):
+    result = run_query(df, parse_rule_based("東京の在庫は何件?", LOCATIONS))
+    assert result.table["値"].tolist() == [2]
+
+
+def test_normalize_spec_drops_unknown_values():
+    spec = normalize_spec({
+        "locations": ["ＯＳＡＫＡ", "大阪", "札幌"],
+        "stock": {"op": "LIKE", "value": 1},
+        "group_by": "価格",
+        "metric": "median",
+        "limit": 1000,
+        "date_from": "不明",
+        "extra": "ignored",
+    }, LOCATIONS)
+    assert spec["locations"] == ["大阪"]
+    assert spec["stock"] is None
+    assert spec["group_by"] is None
+    assert spec["metric"] == "rows"
+    assert spec["limit"] == 20
+    assert spec["date_from"] is None
+    assert "extra" not in spec
+
+
+def test_llm_output_is_used_and_falls_back_on_error(df):
+    def llm(messages):
+        return "結果:\n" + json.dumps({"locations": ["名古屋"], "metric": "sum"})
+
+    spec, method = parse_question("名古屋の合計", df, complete=llm, locations=LOCATIONS)
+    assert method == "llm"
+    assert (spec["locations"], spec["metric"]) == (["名古屋"], "sum")
+
+    def broken(messages):
+        return "わかりません"
+
+    spec, method = parse_question("大阪で在庫10未満", df, complete=broken, locations=LOCATIONS)
+    assert method == "rule"
+    assert spec["locations"] == ["大阪"]
+
+
+def test_answer_messages_carry_only_the_result(df):
+    result = run_query(df, parse_rule_based("大阪で在庫10未満の品目は?", LOCATIONS))
+    content = answer_messages("大阪で在庫10未満の品目は?", result)[-1]["content"]
+    assert "テープ" in content
+    # 条件に合わない行は LLM に渡さない
+    assert "ペン" not in content
@@ -0,0 +1,35 @@
+# test_pipeline.py - 一括レポート生成の出力先
+import os
+
+import pandas as pd
+
+from warehouse.pipeline import main, output_stems, report_names
+
+CSV = "商品ID,商品名,在庫数,ロケーション,更新日\n{id},ペン,{stock},東京,2025-06-01\n"
+
+
+def write(path, item_id, stock):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(CSV.format(id=item_id, stock=stock), encoding="utf-8")
+
+
+def test_same_file_names_in_different_folders(tmp_path):
+    write(tmp_path / "ex" / "a" / "inv.csv", "A01", 3)
+    write(tmp_path / "ex" / "b" / "inv.csv", "B01", 5)
+    out = tmp_path / "rep"
+
+    assert main([str(tmp_path / "ex" / "**" / "*.csv"), "--out", str(out), "--workers", "2"]) == 0
+
+    low_a = pd.read_csv(out / "a" / "inv" / "low_stock.csv", encoding="utf-8-sig")
+    low_b = pd.read_csv(out / "b" / "inv" / "low_stock.csv", encoding="utf-8-sig")
+    assert list(low_a["商品ID"]) == ["A01"]
+    assert list(low_b["商品ID"]) == ["B01"]
+    summary = pd.read_csv(out / "kpi_summary.csv", encoding="utf-8-sig")
+    assert list(summary["ファイル"]) == ["a/inv.csv", "b/inv.csv"]
+    assert not [name for _, _, files in os.walk(out) for name in files if name.endswith(".tmp")]
+
+
+def test_output_stems_keep_extension_for_clashes(tmp_path):
+    names = report_names([str(tmp_path / "inv.csv"), str(tmp_path / "inv.xlsx")])
+    assert sorted(names.values()) == ["inv.csv", "inv.xlsx"]
+    assert output_stems(names.values()) == {"inv.csv": "inv_csv", "inv.xlsx": "inv_xlsx"}
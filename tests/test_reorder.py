@@ -0,0 +1,101 @@
+# test_reorder.py - 消費ペースの推定と発注点の判定
+import numpy as np
+import pandas as pd
+import pytest
+
+from warehouse.reorder import (
+    NO_HISTORY,
+    STATUS_LABELS,
+    ReorderModel,
+    Thresholds,
+    rolling_consumption,
+)
+
+
+def _history(rows):
+    df = pd.DataFrame(rows, columns=["商品ID", "ロケーション", "更新日", "在庫数"])
+    df["更新日"] = pd.to_datetime(df["更新日"])
+    return df
+
+
+def _days(*dates):
+    return [f"2025-06-{d:02d}" for d in dates]
+
+
+def _row(summary, sku, location="東京"):
+    return summary[(summary["商品ID"] == sku) & (summary["ロケーション"] == location)].iloc[0]
+
+
+def test_zero_consumption_sku_is_ok():
+    df = _history([("A", "東京", day, 10) for day in _days(1, 2, 3, 4)])
+    result = ReorderModel(df).evaluate()
+    row = _row(result, "A")
+
+    assert row["日次消費"] == 0
+    assert np.isinf(row["在庫日数"])
+    assert row["発注点"] == 0
+    assert row["状態"] == "OK"
+
+
+def test_restock_is_not_counted_as_consumption():
+    df = _history([("A", "東京", day, stock) for day, stock in zip(_days(1, 2, 3, 4), [10, 5, 20, 15])])
+    summary = ReorderModel(df).summary
+    # 減少分 5 + 5 を観測日数 3日で割る（入荷の +15 は数えない）
+    assert _row(summary, "A")["日次消費"] == pytest.approx(10 / 3)
+    assert _row(summary, "A")["観測日数"] == 3
+
+
+def test_gap_in_window_counts_days_from_previous_observation():
+    df = _history([("A", "東京", day, stock) for day, stock in zip(_days(1, 4, 11), [100, 90, 80])])
+    summary = ReorderModel(df, window=7).summary
+    row = _row(summary, "A")
+    # 窓（6/5〜6/11）内の観測は 6/11 だけだが、減少は前回の観測（6/4）からの 7日分とみなす
+    assert row["日次消費"] == pytest.approx(10 / 7)
+    assert row["観測日数"] == 10
+
+
+def test_single_observation_has_no_history():
+    df = _history([("A", "東京", "2025-06-01", 5)])
+    result = ReorderModel(df).evaluate()
+    assert np.isnan(result.loc[0, "日次消費"])
+    assert result.loc[0, "状態"] == STATUS_LABELS[NO_HISTORY]
+
+
+def test_consumption_does_not_cross_groups():
+    group = np.array([0, 0, 1, 1])
+    day = np.array([0, 1, 0, 1])
+    stock = np.array([10.0, 8.0, 50.0, 49.0])
+    # グループ 1 の最初の行は前のグループの在庫（8 -> 50）と比べない
+    np.testing.assert_array_equal(rolling_consumption(group, day, stock, 14), [np.nan, 2.0, np.nan, 1.0])
+
+
+@pytest.fixture
+def steady():
+    # いずれも 1日1個ずつ減り、在庫 10 = 10日分
+    rows = []
+    for sku, location in [("A", "東京"), ("B", "東京"), ("A", "大阪")]:
+        rows += [(sku, location, day, stock) for day, stock in zip(_days(1, 2, 3), [12, 11, 10])]
+    return ReorderModel(_history(rows))
+
+
+def test_threshold_overrides(steady):
+    default = steady.evaluate()
+    assert set(default["状態"]) == {"注意"}
+
+    by_location = steady.evaluate(Thresholds(by_location={"東京": 12}))
+    assert _row(by_location, "B")["状態"] == "要発注"
+    assert _row(by_location, "B")["発注点"] == 12
+    assert _row(by_location, "A", "大阪")["状態"] == "注意"
+
+    # 商品IDの指定はロケーションの指定より優先する
+    both = steady.evaluate(Thresholds(by_location={"東京": 12}, by_sku={"A": 5}))
+    assert _row(both, "A")["状態"] == "OK"
+    assert _row(both, "A")["しきい値日数"] == 5
+    assert _row(both, "B")["しきい値日数"] == 12
+    assert _row(both, "A", "大阪")["しきい値日数"] == 5
+
+
+def test_unknown_override_keys_are_ignored(steady):
+    result = steady.evaluate(Thresholds(by_location={"札幌": 1}, by_sku={"Z": 1}))
+    assert set(result["しきい値日数"]) == {7}
+    assert len(steady.evaluate(locations=["大阪"])) == 1
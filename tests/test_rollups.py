@@ -0,0 +1,77 @@
+# test_rollups.py - 日次・週次・月次ロールアップの再集計
+import pandas as pd
+import pytest
+
+from warehouse.rollups import (
+    bucket_start,
+    choose_grain,
+    query_rollup,
+    rollup_locations,
+    rollup_range,
+    update_rollups,
+)
+from warehouse.store import InventoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InventoryStore(str(tmp_path / "warehouse.db"))
+
+
+def _daily(days, **locations):
+    return pd.DataFrame(locations, index=pd.to_datetime(days))
+
+
+def _by_bucket(frame, column="在庫数"):
+    return dict(zip(frame["更新日"].dt.strftime("%Y-%m-%d"), frame[column]))
+
+
+def test_bucket_start():
+    # 2025-06-04 は水曜日
+    assert bucket_start("2025-06-04", "week") == pd.Timestamp("2025-06-02")
+    assert bucket_start("2025-06-04", "month") == pd.Timestamp("2025-06-01")
+    assert bucket_start("2025-06-04 13:00", "day") == pd.Timestamp("2025-06-04")
+
+
+def test_week_and_month_buckets(store):
+    update_rollups(store, _daily(
+        ["2025-06-02", "2025-06-03", "2025-06-09"], 東京=[10, 20, 30], 大阪=[1, 2, 3],
+    ))
+
+    week = query_rollup(store, "week", "2025-06-01", "2025-06-30")
+    # 全ロケーション合計は日ごとに合算してから平均・最小・最大を求める
+    assert _by_bucket(week) == {"2025-06-02": 16.5, "2025-06-09": 33}
+    assert _by_bucket(week, "最小") == {"2025-06-02": 11, "2025-06-09": 33}
+    assert _by_bucket(week, "最大") == {"2025-06-02": 22, "2025-06-09": 33}
+
+    month = query_rollup(store, "month", "2025-06-01", "2025-06-30", locations=["東京"])
+    assert _by_bucket(month) == {"2025-06-01": 20}
+    assert rollup_range(store) == (pd.Timestamp("2025-06-02"), pd.Timestamp("2025-06-09"))
+    assert rollup_locations(store) == ["大阪", "東京"]
+
+
+def test_replacing_a_day_rebuckets_only_that_week(store):
+    update_rollups(store, _daily(["2025-06-02", "2025-06-03", "2025-06-09"], 東京=[10, 20, 30]))
+    # 同じ日・ロケーションは新しい値で置き換え、その週・月を集計し直す
+    update_rollups(store, _daily(["2025-06-03"], 東京=[40]))
+
+    week = query_rollup(store, "week", "2025-06-01", "2025-06-30")
+    assert _by_bucket(week) == {"2025-06-02": 25, "2025-06-09": 30}
+    assert _by_bucket(week, "最大") == {"2025-06-02": 40, "2025-06-09": 30}
+    month = query_rollup(store, "month", "2025-06-01", "2025-06-30")
+    assert _by_bucket(month) == {"2025-06-01": pytest.approx(80 / 3)}
+    day = query_rollup(store, "day", "2025-06-01", "2025-06-30")
+    assert _by_bucket(day) == {"2025-06-02": 10, "2025-06-03": 40, "2025-06-09": 30}
+
+
+def test_same_day_rows_are_summed_before_storing(store):
+    # 時刻付きの更新日は日ごとにまとめる
+    update_rollups(store, _daily(["2025-06-02 09:00", "2025-06-02 18:00"], 東京=[5, 7]))
+    day = query_rollup(store, "day", "2025-06-02", "2025-06-02")
+    assert _by_bucket(day) == {"2025-06-02": 12}
+
+
+def test_choose_grain():
+    assert choose_grain("2025-01-01", "2025-01-31", max_points=400) == "day"
+    assert choose_grain("2020-01-01", "2025-01-01", max_points=400) == "week"
+    assert choose_grain("2000-01-01", "2025-01-01", max_points=400) == "month"
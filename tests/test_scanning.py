@@ -0,0 +1,118 @@
+# test_scanning.py - 記録済みの画像によるデコード・照合と在庫調整の書き込み
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from warehouse import delta
+from warehouse.scanning import (
+    AdjustmentBuffer,
+    SkuIndex,
+    apply_adjustments,
+    current_stock,
+    decode_many,
+)
+from warehouse.store import InventoryStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "scans")
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.fixture
+def inventory():
+    return pd.DataFrame({
+        "商品ID": ["A01", "B02", "B02"],
+        "商品名": ["ペン", "ノート", "ノート"],
+        "在庫数": [10, 5, 7],
+        "ロケーション": ["東京", "大阪", "東京"],
+        "更新日": ["2025-06-01"] * 3,
+    })
+
+
+@pytest.fixture
+def store(tmp_path, inventory):
+    store = InventoryStore(str(tmp_path / "warehouse.db"))
+    delta.sync_inventory(store, inventory, "k1", "test")
+    return store
+
+
+def test_decode_recorded_images():
+    pytest.importorskip("cv2")
+    pytest.importorskip("PIL")
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.png")))
+    results = dict(zip(map(os.path.basename, paths), decode_many(paths)))
+    assert results["qr_A01.png"] == ["A01"]
+    # 全角で記録されたコードも正規化して読み取る
+    assert results["qr_B02_fullwidth.png"] == ["B02"]
+    assert results["blank.png"] == []
+
+
+def test_decoded_codes_resolve_against_index(inventory):
+    pytest.importorskip("cv2")
+    pytest.importorskip("PIL")
+    index = SkuIndex(inventory)
+    (codes,) = decode_many([fixture("qr_B02_fullwidth.png")])
+    hit = index.lookup(codes[0])
+    assert hit.found
+    assert sorted(r["ロケーション"] for r in hit.rows) == ["大阪", "東京"]
+
+
+def test_lookup_normalizes_scanner_input(inventory):
+    index = SkuIndex(inventory)
+    assert index.lookup(" Ａ０１\n").rows[0]["商品名"] == "ペン"
+    assert not index.lookup("Z99").found
+
+
+def test_adjustments_update_inventory_and_totals(store):
+    buffer = AdjustmentBuffer(store, batch_size=2)
+    assert buffer.add("A01", "東京", 3) == 0
+    assert buffer.add("B02", "東京", -2) == 2
+    current = delta.load_current(store).set_index(["商品ID", "ロケーション"])["在庫数"]
+    assert current[("A01", "東京")] == 13
+    assert current[("B02", "東京")] == 5
+    totals = delta.current_location_totals(store).set_index("ロケーション")["在庫数"]
+    assert totals["東京"] == current.xs("東京", level="ロケーション").sum()
+
+
+def test_unknown_code_does_not_shift_totals(store):
+    apply_adjustments(store, [
+        {"time": "2025-06-02T00:00:00", "code": "Z99", "location": "東京", "delta": 5.0},
+    ])
+    totals = delta.current_location_totals(store).set_index("ロケーション")["在庫数"]
+    assert totals["東京"] == 17
+
+
+def test_resync_after_adjustment_restores_file_values(store, inventory):
+    apply_adjustments(store, [
+        {"time": "2025-06-02T00:00:00", "code": "A01", "location": "東京", "delta": 5.0},
+    ])
+    assert delta.load_current(store).set_index("商品ID").loc["A01", "在庫数"] == 15
+
+    # 調整後は同じファイルでも反映済み扱いにせず、ファイルとの差として検出する
+    result = delta.sync_inventory(store, inventory, "k1", "test")
+    assert len(result.updated) == 1
+    assert result.unchanged == 2
+    current = delta.load_current(store).set_index(["商品ID", "ロケーション"])["在庫数"]
+    assert current[("A01", "東京")] == 10
+    totals = delta.current_location_totals(store).set_index("ロケーション")["在庫数"]
+    assert totals["東京"] == 17
+
+
+def test_rehash_matches_synced_rows(store, inventory):
+    before = delta.load_current(store).set_index(["商品ID", "ロケーション"])["row_hash"]
+    conn = store.connection()
+    with conn:
+        delta.rehash_rows(conn, list(before.index))
+    after = delta.load_current(store).set_index(["商品ID", "ロケーション"])["row_hash"]
+    assert after.to_dict() == before.to_dict()
+
+
+def test_current_stock_includes_adjustments(store):
+    apply_adjustments(store, [
+        {"time": "2025-06-02T00:00:00", "code": "B02", "location": "大阪", "delta": -2.0},
+    ])
+    assert current_stock(store, "Ｂ０２") == {"大阪": 3, "東京": 7}
@@ -0,0 +1,61 @@
+# test_snapshots.py - スナップショットからの再読み込み
+import pytest
+
+from warehouse import loader, snapshots
+
+pytest.importorskip("pyarrow")
+
+DATA = "品番,品名,数量,場所,更新日,メモ\nA1,ペン,3,東京,2025-01-01,x\n".encode()
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", tmp_path)
+    loader._cache.clear()
+    yield tmp_path
+    loader._cache.clear()
+
+
+def test_reload_reads_snapshot_instead_of_parsing(monkeypatch):
+    result, _ = loader.load_inventory(DATA, "inv.csv")
+    snapshots.save_snapshot(
+        result.df, result.key, "inv.csv", renamed=result.renamed, notes=result.notes
+    )
+    loader._cache.clear()
+
+    def fail(*args):
+        raise AssertionError("スナップショットがあるのにファイルを解析した")
+
+    monkeypatch.setattr(loader, "read_inventory", fail)
+    reloaded, hit = loader.load_inventory(DATA, "inv.csv")
+    assert not hit
+    # 対応付けのない列も含めて全列を保持し、列名変換のメモも復元する
+    assert list(reloaded.df.columns) == list(result.df.columns)
+    assert reloaded.renamed == result.renamed
+    assert reloaded.notes["schema_fingerprint"] == result.notes["schema_fingerprint"]
+
+
+def test_snapshot_with_different_columns_is_replaced():
+    result, _ = loader.load_inventory(DATA, "inv.csv")
+    incomplete = result.df.drop(columns="メモ")
+    path = snapshots.save_snapshot(incomplete, result.key, "inv.csv")
+    snapshots.save_snapshot(result.df, result.key, "inv.csv")
+    assert list(snapshots.load_snapshot(path).columns) == list(result.df.columns)
+
+
+def test_picker_reads_only_requested_columns():
+    result, _ = loader.load_inventory(DATA, "inv.csv")
+    path = snapshots.save_snapshot(result.df, result.key, "inv.csv", renamed=result.renamed)
+
+    picked = loader.result_from_snapshot(path, columns=["商品ID", "商品名", "在庫数", "ロケーション", "ソース"])
+    assert list(picked.df.columns) == ["商品ID", "商品名", "在庫数", "ロケーション"]
+    assert picked.renamed == result.renamed
+
+
+def test_picker_reads_all_columns_when_mapping_is_incomplete():
+    result, _ = loader.load_inventory(DATA, "inv.csv")
+    unmapped = result.df.rename(columns={"在庫数": "数量"})
+    path = snapshots.save_snapshot(unmapped, result.key, "inv.csv")
+
+    picked = loader.result_from_snapshot(path, columns=["商品ID", "商品名", "在庫数", "ロケーション"])
+    assert list(picked.df.columns) == list(unmapped.columns)
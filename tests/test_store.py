@@ -0,0 +1,48 @@
+# test_store.py - 共有ストアの保持数・検索語のエスケープ・ロケーションの絞り込み
+import pandas as pd
+import pytest
+
+from warehouse import store as store_module
+from warehouse.store import InventoryStore
+
+
+def _frame(names, locations=None):
+    return pd.DataFrame({
+        "商品ID": [f"P{i:05d}" for i in range(len(names))],
+        "商品名": names,
+        "在庫数": [1] * len(names),
+        "ロケーション": locations or ["A"] * len(names),
+        "更新日": pd.to_datetime(["2024-01-01"] * len(names)),
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InventoryStore(str(tmp_path / "warehouse.db"), max_datasets=2)
+
+
+def test_old_datasets_are_evicted(store):
+    for key in ["k1", "k2", "k3"]:
+        assert store.ingest(_frame(["りんご"]), key, key)
+
+    assert [d["key"] for d in store.datasets()] == ["k3", "k2"]
+    assert store.count_rows("k1") == 0
+    assert store.count_rows("k3") == 1
+
+
+def test_like_wildcards_are_literal(store):
+    store.ingest(_frame(["100%果汁", "1000果汁", "a_b", "axb"]), "k", "k")
+
+    assert store.count_rows("k", query="100%") == 1
+    assert store.count_rows("k", query="a_b") == 1
+    assert store.count_rows("k", query="果汁") == 2
+
+
+def test_large_location_filter_uses_temp_table(store, monkeypatch):
+    monkeypatch.setattr(store_module, "LOCATION_PARAM_LIMIT", 3)
+    locations = [f"L{i}" for i in range(10)]
+    store.ingest(_frame(["x"] * 10, locations), "k", "k")
+
+    assert store.count_rows("k", locations[:2]) == 2
+    assert store.count_rows("k", locations[:8]) == 8
+    assert store.location_totals("k", locations[2:])["ロケーション"].tolist() == locations[2:]
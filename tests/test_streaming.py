@@ -0,0 +1,61 @@
+# test_streaming.py - ローカルのモックサーバーに対するストリーミング応答
+import pytest
+
+pytest.importorskip("openai")
+
+from tests.mock_openai import DEFAULT_REPLY, MockOpenAI  # noqa: E402
+from zen_chat import client as chat_client  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "こんにちは"}]
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    """モックサーバーに接続する共有クライアントを作り直す"""
+    clients = []
+
+    def connect(mock):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("OPENAI_BASE_URL", mock.base_url)
+        monkeypatch.setattr(chat_client, "BACKOFF_BASE", 0.01)
+        monkeypatch.setattr(chat_client, "_client", None)
+        clients.append(chat_client.get_client())
+
+    yield connect
+    for client in clients:
+        client.loop.call_soon_threadsafe(client.loop.stop)
+
+
+def test_stream_chat_yields_tokens_in_order(connect):
+    with MockOpenAI(delay=0.01) as mock:
+        connect(mock)
+        stats = chat_client.StreamStats()
+        tokens = list(chat_client.stream_chat(MESSAGES, stats=stats))
+
+    assert tokens == DEFAULT_REPLY
+    assert mock.requests[0]["body"]["stream"] is True
+    assert stats.chunks == len(DEFAULT_REPLY)
+    assert 0 <= stats.ttft <= stats.total
+    assert "最初の応答まで" in stats.describe()
+
+
+def test_empty_stream_has_no_ttft(connect):
+    with MockOpenAI(reply=[]) as mock:
+        connect(mock)
+        stats = chat_client.StreamStats()
+        assert list(chat_client.stream_chat(MESSAGES, stats=stats)) == []
+
+    assert stats.ttft is None
+    assert stats.to_dict()["ttft_ms"] is None
+    assert stats.describe().startswith("応答本文なし / 完了まで")
+
+
+def test_server_errors_are_retried(connect):
+    with MockOpenAI(failures=2) as mock:
+        connect(mock)
+        stats = chat_client.StreamStats()
+        assert "".join(chat_client.stream_chat(MESSAGES, stats=stats)) == "".join(DEFAULT_REPLY)
+        assert chat_client.complete_chat(MESSAGES) == "".join(DEFAULT_REPLY)
+
+    assert stats.attempts == 3
+    assert "再試行 2回" in stats.describe()
@@ -0,0 +1,2 @@
+# warehouse - 倉庫分析アプリのデータ処理ライブラリ
+# Streamlit に依存しない処理をここにまとめる（app.py から利用）
@@ -0,0 +1,125 @@
+# auth.py - ログインユーザー設定の読み込みとログイン処理時間の計測
+import copy
+import os
+import sys
+import threading
+
+import bcrypt
+import yaml
+from yaml import SafeLoader
+
+# ユーザー設定ファイルの場所（環境変数で変更可能）
+USERS_PATH = os.getenv("WAREHOUSE_USERS", "users.yaml")
+
+
+def hash_password(password):
+    """パスワードを bcrypt でハッシュ化"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def _is_hashed(password):
+    return isinstance(password, str) and password.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+def load_user_config(path=USERS_PATH):
+    """ユーザー設定を読み込む
+
+    平文のパスワードが残っていればここで一度だけハッシュ化する
+    （呼び出し側でプロセス単位にキャッシュする前提）。
+    """
+    with open(path, encoding="utf-8") as f:
+        config = yaml.load(f, Loader=SafeLoader)
+
+    for user in config["credentials"]["usernames"].values():
+        if not _is_hashed(user["password"]):
+            user["password"] = hash_password(str(user["password"]))
+    return config
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def shared_user_config(path=USERS_PATH):
+    """ユーザー設定をプロセスで一度だけ読み込み・ハッシュ化し、全セッションで共有する"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load_user_config(path)
+        return _config
+
+
+def session_authenticator(session_state, path=USERS_PATH):
+    """認証オブジェクトをセッションごとに一度だけ生成する
+
+    Authenticate はログイン中のトークンや有効期限（token・exp_date）を属性に持つため、
+    セッション間で共有しない。設定の読み込みとハッシュ化はプロセスで一度だけ行い、
+    ログイン失敗回数などを書き込む資格情報はセッションごとの複製を渡す。
+    st.cache_resource 内で生成すると内部の Cookie 用コンポーネントが
+    キャッシュ内ウィジェットとして警告されるため、セッション状態に保持する。
+    """
+    authenticator = session_state.get("authenticator")
+    if authenticator is None:
+        import streamlit_authenticator as stauth
+
+        config = shared_user_config(path)
+        authenticator = session_state["authenticator"] = stauth.Authenticate(
+            copy.deepcopy(config["credentials"]),
+            cookie_name=config["cookie"]["name"],
+            cookie_key=config["cookie"]["key"],
+            cookie_expiry_days=config["cookie"]["expiry_days"],
+            auto_hash=False,
+        )
+    return authenticator
+
+
+def user_roles(username):
+    """ユーザー設定の roles（session_authenticator() の後で呼ぶ）"""
+    if _config is None or not username:
+        return []
+    user = _config["credentials"]["usernames"].get(username, {})
+    return list(user.get("roles") or [])
+
+
+def is_admin(username):
+    return "admin" in user_roles(username)
+
+
+class LatencyMetric:
+    """処理時間の記録（全セッション共有、直近の値のみ保持）"""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) > self.max_samples:
+                del self._samples[: len(self._samples) - self.max_samples]
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+# 認証オブジェクトの準備時間（セッション初回）とログイン処理時間
+auth_setup_latency = LatencyMetric()
+login_latency = LatencyMetric()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "hash":
+        print(hash_password(sys.argv[2]))
+    else:
+        print("使い方: python -m warehouse.auth hash <パスワード>")
+        sys.exit(1)
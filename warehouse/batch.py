@@ -0,0 +1,192 @@
+# batch.py - 複数ファイル・フォルダ一括取り込み（プロセスプールで並列解析）
+import glob
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from warehouse.loader import (
+    LoadResult,
+    content_hash,
+    convert_types,
+    get_or_load,
+    normalize_column_names,
+    optimize_dtypes,
+    read_inventory,
+)
+
+# 取り込み元ファイルを示す列
+SOURCE_COLUMN = "ソース"
+
+# フォルダ指定時に対象とする拡張子
+BATCH_EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+# サーバー上のファイルを読み込めるフォルダ（環境変数で変更可能。これより外のパスは読まない）
+DATA_ROOT = os.getenv("WAREHOUSE_DATA_ROOT", "data")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """プロセスプールを初回だけ起動し、以降は使い回す
+
+    Streamlit サーバーはマルチスレッドのため fork ではなく spawn で起動する。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parse_source(name, payload):
+    """1ファイル分の読み込み・列名正規化・型変換（ワーカープロセスで実行）
+
+    payload はファイル内容のバイト列またはサーバー上のパス。
+    """
+    start = time.perf_counter()
+    details = {}
+    df, renamed = normalize_column_names(read_inventory(payload, name), details)
+    notes = convert_types(df)
+    notes.update(details)
+    return df, renamed, notes, time.perf_counter() - start
+
+
+def _glob_root(pattern):
+    """glob パターンのうちワイルドカードを含まない先頭部分のフォルダ"""
+    parts = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    else:
+        # ワイルドカードが無い（ファイルそのものの指定）ならその親フォルダ
+        parts = parts[:-1]
+    return str(Path(*parts)) if parts else "."
+
+
+def _within(root, path):
+    """path の実体（シンボリックリンクを解決した先）が root の中にあるか"""
+    root = os.path.realpath(root)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def resolve_data_path(path, root=DATA_ROOT):
+    """データフォルダからの相対パスを実際のパスに解決する（外を指すパスは ValueError）"""
+    full = os.path.join(root, path)
+    if not _within(root, full):
+        raise ValueError(f"データフォルダの外のパスは指定できません: {path}")
+    return os.path.realpath(full)
+
+
+def expand_pattern(pattern, root=None):
+    """フォルダまたは glob パターンを (表示名, パス) のリストに展開
+
+    表示名はフォルダ・パターンの起点からの相対パスにする（別フォルダの同名ファイルを区別する）。
+    root を指定するとパターンを root からの相対パスとして扱い、root の外のファイルは除く。
+    """
+    if root is not None:
+        pattern = os.path.join(root, pattern)
+        return [
+            (name, path) for name, path in expand_pattern(pattern)
+            if _within(root, path)
+        ]
+    if os.path.isdir(pattern):
+        root = pattern
+        paths = [
+            str(p) for p in sorted(Path(pattern).iterdir())
+            if p.suffix.lower() in BATCH_EXTENSIONS
+        ]
+    else:
+        root = _glob_root(pattern)
+        paths = sorted(
+            p for p in glob.glob(pattern, recursive=True)
+            if p.lower().endswith(BATCH_EXTENSIONS)
+        )
+    return [(os.path.relpath(p, root).replace(os.sep, "/"), p) for p in paths]
+
+
+def source_key(sources):
+    """取り込み元一式を表すキャッシュキー（パスは更新時刻とサイズも含める）"""
+    parts = []
+    for name, payload in sources:
+        if isinstance(payload, bytes):
+            parts.append(f"{name}:{content_hash(payload)}")
+        else:
+            stat = os.stat(payload)
+            parts.append(f"{payload}:{stat.st_mtime_ns}:{stat.st_size}")
+    return "batch:" + content_hash("\n".join(parts).encode())
+
+
+def load_batch(sources, parallel=True):
+    """複数ファイルを並列に解析して1つの DataFrame に結合
+
+    各行には取り込み元の表示名（ソース列）を付与し、
+    ファイルごとの解析時間を notes["timings"] に記録する。
+    """
+    names = [name for name, _ in sources]
+    parsed = None
+    if parallel and len(sources) > 1:
+        try:
+            parsed = list(_get_pool().map(parse_source, names, [p for _, p in sources]))
+        except BrokenProcessPool:
+            # ワーカーが異常終了した場合はプールを作り直し、今回は逐次処理にする
+            _reset_pool()
+    if parsed is None:
+        parsed = [parse_source(name, payload) for name, payload in sources]
+
+    frames = [df for df, _, _, _ in parsed]
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    # ソース列はファイル番号から直接カテゴリ型で作る（文字列の複製を作らない）
+    categories = pd.Index(names).unique()
+    codes = np.repeat(categories.get_indexer(names), [len(frame) for frame in frames])
+    df[SOURCE_COLUMN] = pd.Categorical.from_codes(codes, categories=categories)
+
+    renamed = {}
+    notes = {"timings": [], "stock_na_count": 0, "column_methods": {}}
+    fingerprints = set()
+    for name, (frame, file_renamed, file_notes, elapsed) in zip(names, parsed):
+        fingerprints.add(file_notes.get("schema_fingerprint"))
+        renamed.update(file_renamed)
+        notes["column_methods"].update(file_notes.get("column_methods", {}))
+        notes["timings"].append({"ファイル": name, "行数": len(frame), "秒": round(elapsed, 3)})
+        notes["stock_na_count"] += file_notes.get("stock_na_count", 0)
+        for flag in ("date_converted", "stock_converted"):
+            if file_notes.get(flag):
+                notes[flag] = True
+        for error in ("date_error", "stock_error"):
+            if error in file_notes:
+                notes[error] = f"{name}: {file_notes[error]}"
+
+    # 全ファイルが同じ列構成なら、手動の列マッピングを単一ファイルと同じく記録できる
+    if len(fingerprints) == 1 and None not in fingerprints:
+        notes["schema_fingerprint"] = fingerprints.pop()
+    notes.update(optimize_dtypes(df))
+    return LoadResult(df=df, renamed=renamed, notes=notes)
+
+
+def load_batch_cached(sources, parallel=True):
+    """取り込み元一式の内容をキーにキャッシュ付きで一括取り込み
+
+    同じキーのスナップショットがあれば解析せずにそれを読み込む。
+    戻り値は (LoadResult, キャッシュヒットしたか)。
+    """
+    return get_or_load(source_key(sources), lambda: load_batch(sources, parallel), snapshot=True)
@@ -0,0 +1,94 @@
+# chart_data.py - グラフ送信前の間引き・集約（ブラウザに送る点数を抑える）
+import numpy as np
+import pandas as pd
+
+# グラフ1本あたりの送信点数の既定上限
+DEFAULT_MAX_POINTS = 2000
+
+# ロケーション別グラフで個別に表示する上位件数の既定値
+DEFAULT_TOP_N = 20
+
+OTHER_LABEL = "その他"
+
+
+def _as_float(values):
+    """日付列も含めて数値配列に変換（LTTB の面積計算用）"""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").astype("int64").astype("float64")
+    return values.to_numpy(dtype="float64")
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets で残す点の位置を求める"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = _as_float(y)
+    # 先頭・末尾は必ず残し、残りを n_out - 2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 次のバケットの平均点（最後は末尾の点）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # 前の採用点・候補点・次バケット平均 の三角形の面積が最大の点を選ぶ
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """バケットごとの最小・最大の点を残す（スパイクを落とさない間引き）"""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    y = _as_float(y)
+    n_buckets = max(1, n_out // 2)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        chunk = y[start:end]
+        keep.extend([start + int(np.argmin(chunk)), start + int(np.argmax(chunk))])
+    return np.unique(keep)
+
+
+def downsample(df, x, y, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """時系列データを上限点数まで間引く（x で昇順になっている前提）"""
+    if max_points is None or len(df) <= max_points:
+        return df
+    if method == "minmax":
+        rows = minmax_indices(df[y], max_points)
+    else:
+        rows = lttb_indices(df[x], df[y], max_points)
+    return df.iloc[rows]
+
+
+def top_n_with_other(totals, label, value, top_n=DEFAULT_TOP_N):
+    """上位 N 件以外を「その他」1本にまとめる"""
+    if top_n is None or len(totals) <= top_n:
+        return totals
+    ordered = totals.sort_values(value, ascending=False)
+    head = ordered.iloc[:top_n]
+    other = pd.DataFrame({label: [OTHER_LABEL], value: [ordered[value].iloc[top_n:].sum()]})
+    return pd.concat([head.astype({label: "object"}), other], ignore_index=True)
+
+
+def figure_payload_bytes(fig):
+    """ブラウザに送られる図の JSON サイズ（バイト）"""
+    return len(fig.to_json().encode())
@@ -0,0 +1,351 @@
+# columns.py - 列名の自動認識（表記ゆれ吸収・別名トライ・n-gram 類似度・値からの型推定）
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import pandas as pd
+
+# 列名マッピング辞書
+COLUMN_MAPPING = {
+    # 商品ID の別名
+    "部番": "商品ID",
+    "部品番号": "商品ID",
+    "製品番号": "商品ID",
+    "品番": "商品ID",
+    "コード": "商品ID",
+    "ID": "商品ID",
+    "商品コード": "商品ID",
+
+    # 商品名 の別名
+    "部品名": "商品名",
+    "製品名": "商品名",
+    "品名": "商品名",
+    "名称": "商品名",
+    "商品": "商品名",
+    "アイテム名": "商品名",
+
+    # 在庫数 の別名
+    "数量": "在庫数",
+    "在庫": "在庫数",
+    "残数": "在庫数",
+    "保有数": "在庫数",
+    "現在庫": "在庫数",
+    "在庫量": "在庫数",
+    "QTY": "在庫数",
+    "qty": "在庫数",
+
+    # ロケーション の別名
+    "所在地": "ロケーション",
+    "棚番号": "ロケーション",
+    "棚番": "ロケーション",
+    "倉庫": "ロケーション",
+    "場所": "ロケーション",
+    "保管場所": "ロケーション",
+    "位置": "ロケーション",
+    "エリア": "ロケーション",
+    "拠点": "ロケーション",
+    "ゾーン": "ロケーション",
+}
+
+# 英語表記など、辞書に加えて認識する別名
+EXTRA_ALIASES = {
+    "商品ID": ["SKU", "品目コード", "アイテムコード", "item id", "item code", "part no", "part number", "product id"],
+    "商品名": ["品目名", "名前", "品目", "説明", "item name", "product name", "description", "name"],
+    "在庫数": ["在庫数量", "数", "quantity", "stock", "on hand", "count"],
+    "ロケーション": ["ロケ", "棚", "location", "loc", "warehouse", "bin", "zone"],
+    "更新日": ["日付", "更新日時", "最終更新日", "棚卸日", "date", "updated", "updated at", "last updated"],
+}
+
+STANDARD_COLUMNS = ["商品ID", "商品名", "在庫数", "ロケーション", "更新日"]
+
+# n-gram 類似度（Dice 係数）の採用しきい値
+NGRAM_THRESHOLD = 0.6
+
+# これより短い別名（ID・商品・在庫など）は、完全一致か後ろに数字だけが続く場合にのみ使う
+# （idx を商品ID、商品区分を商品名、在庫区分を在庫数と誤認しない）
+SHORT_ALIAS_LENGTH = 3
+
+# 値から型を推定するときのサンプル数と、数値・日付とみなす割合
+VALUE_SAMPLE_SIZE = 200
+VALUE_MIN_RATIO = 0.9
+
+# 在庫数の候補から外す列の条件（JAN・品番のような数字だけのID列を在庫数と誤認しない）
+# - この値以上を含む（JAN は13桁、社内コードも6桁以上が多い）
+# - サンプルがこの件数以上あり、桁数がすべて同じ（固定長）またはユニーク値の割合がこれを超える
+STOCK_MAX_VALUE = 1_000_000
+STOCK_MIN_SAMPLE = 20
+STOCK_MAX_UNIQUE_RATIO = 0.9
+
+# 値から推定する対象の列
+VALUE_TARGETS = {"在庫数", "更新日"}
+
+# 列構成ごとの対応を記録するファイル（同じ構成のファイルは判定を省略）
+MEMORY_PATH = os.getenv("WAREHOUSE_COLUMN_MEMORY", "column_mappings.json")
+
+# 判定方法（表示用）
+METHOD_LABELS = {
+    "memory": "記憶済み",
+    "exact": "完全一致",
+    "prefix": "前方一致",
+    "ngram": "類似",
+    "values": "値から推定",
+    "manual": "手動",
+}
+
+_SEPARATORS = re.compile(r"[\s_\-・.:/()（）\[\]【】]+")
+
+
+def fold(name):
+    """全角・半角、大文字・小文字、空白・記号の揺れを吸収した比較用の列名"""
+    text = unicodedata.normalize("NFKC", str(name)).lower()
+    return _SEPARATORS.sub("", text)
+
+
+def _ngrams(text, n=2):
+    if len(text) < n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class AliasIndex:
+    """別名のトライ（前方一致用）と n-gram 表をまとめて事前構築したもの"""
+
+    def __init__(self, aliases):
+        self.exact = {}
+        self.trie = {}
+        self.grams = []
+        for alias, target in aliases:
+            key = fold(alias)
+            if not key or key in self.exact:
+                continue
+            self.exact[key] = target
+            node = self.trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[None] = target
+            if len(key) >= SHORT_ALIAS_LENGTH:
+                self.grams.append((_ngrams(key), target))
+
+    def longest_prefix(self, key):
+        """key の先頭に一致する最長の別名 -> (対応列, 一致長)"""
+        node, best, length = self.trie, None, 0
+        for i, ch in enumerate(key, 1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                best, length = node[None], i
+        return best, length
+
+    def match(self, name):
+        """列名 -> (対応列, 判定方法, スコア)。該当なしは (None, None, 0)"""
+        key = fold(name)
+        if not key:
+            return None, None, 0.0
+        if key in self.exact:
+            return self.exact[key], "exact", 1.0
+
+        target, length = self.longest_prefix(key)
+        # 「在庫数量」「商品コード番号」のように別名の後ろに語が続くもの（短い別名は「場所2」のような連番のみ）
+        if (
+            target is not None
+            and length / len(key) >= 0.5
+            and (length >= SHORT_ALIAS_LENGTH or key[length:].isdigit())
+        ):
+            return target, "prefix", 0.9 * length / len(key) + 0.1
+
+        grams = _ngrams(key)
+        best, best_score = None, 0.0
+        for alias_grams, alias_target in self.grams:
+            score = 2 * len(grams & alias_grams) / (len(grams) + len(alias_grams))
+            if score > best_score:
+                best, best_score = alias_target, score
+        if best_score >= NGRAM_THRESHOLD:
+            return best, "ngram", best_score * 0.8
+        return None, None, 0.0
+
+
+def _all_aliases():
+    pairs = [(col, col) for col in STANDARD_COLUMNS]
+    pairs += list(COLUMN_MAPPING.items())
+    pairs += [(alias, target) for target, names in EXTRA_ALIASES.items() for alias in names]
+    return pairs
+
+
+ALIAS_INDEX = AliasIndex(_all_aliases())
+
+
+def schema_fingerprint(columns):
+    """列構成（並び順込み）のフィンガープリント"""
+    joined = "\x1f".join(str(c) for c in columns)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+class MappingMemory:
+    """列構成ごとの列名対応を記録する（プロセス内の辞書 + JSON ファイル）"""
+
+    def __init__(self, path=MEMORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, fingerprint):
+        with self._lock:
+            return self._load().get(fingerprint)
+
+    def put(self, fingerprint, mapping):
+        with self._lock:
+            if self._load().get(fingerprint) == mapping:
+                return
+            # 一括取り込みのワーカープロセスも書き込むため、保存前に読み直して合流する
+            self._data = None
+            data = self._load()
+            data[fingerprint] = mapping
+            self._save(data)
+
+    def forget(self, fingerprint):
+        """記録した対応を削除（次回は名前・値から判定し直す）"""
+        with self._lock:
+            self._data = None
+            data = self._load()
+            if data.pop(fingerprint, None) is not None:
+                self._save(data)
+
+    def _save(self, data):
+        try:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            # 保存できなくてもプロセス内の記憶は使える
+            pass
+
+
+_memory = MappingMemory()
+
+
+def _stock_score(numeric, text=None):
+    """数値列が在庫数らしいかのスコア（0 なら候補にしない）
+
+    0以上の整数であることを条件とし、ID らしい列（大きな値・固定長・先頭ゼロ・
+    ほぼすべて異なる値）は除く。値の種類が少ない列ほど在庫数らしいとみなす。
+    """
+    values = numeric.dropna()
+    if values.empty or (values < 0).any() or (values % 1 != 0).any():
+        return 0.0
+    if values.max() >= STOCK_MAX_VALUE:
+        return 0.0
+    if text is not None and (text.str.len().gt(1) & text.str.startswith("0")).any():
+        return 0.0
+    unique_ratio = values.nunique() / len(values)
+    if len(values) >= STOCK_MIN_SAMPLE:
+        widths = values.astype("int64").astype(str).str.len()
+        if widths.nunique() == 1 and widths.iloc[0] >= 4:
+            return 0.0
+        if unique_ratio > STOCK_MAX_UNIQUE_RATIO:
+            return 0.0
+    return 0.4 * (1 - unique_ratio / 2)
+
+
+def _infer_from_values(series):
+    """値の傾向から対応列を推定（0以上の整数 -> 在庫数、日付 -> 更新日）"""
+    sample = series.dropna()
+    if sample.empty:
+        return None, 0.0
+    sample = sample.head(VALUE_SAMPLE_SIZE)
+
+    if pd.api.types.is_datetime64_any_dtype(sample):
+        return "更新日", 0.5
+    if pd.api.types.is_bool_dtype(sample):
+        return None, 0.0
+    if pd.api.types.is_numeric_dtype(sample):
+        score = _stock_score(sample)
+        return ("在庫数", score) if score else (None, 0.0)
+
+    text = sample.astype(str).str.strip()
+    numeric = pd.to_numeric(text.str.replace(",", "", regex=False), errors="coerce")
+    if numeric.notna().mean() >= VALUE_MIN_RATIO:
+        score = _stock_score(numeric, text[numeric.notna()])
+        return ("在庫数", score) if score else (None, 0.0)
+    dates = pd.to_datetime(text, errors="coerce", format="mixed")
+    if dates.notna().mean() >= VALUE_MIN_RATIO:
+        return "更新日", 0.5
+    return None, 0.0
+
+
+def detect_columns(df, memory=_memory):
+    """列名の対応を判定する -> (対応 {元の列名: 標準列名}, 判定方法 {元の列名: 方法}, フィンガープリント)
+
+    同じ列構成を前に判定していれば記憶済みの対応を使い、名前の判定を省く。記録するのは
+    名前による判定と手動の対応だけで、値からの推定は記録しない（誤った推定を残さない）。
+    そのため在庫数・更新日が値から決まる列構成では、記憶済みでも値からの推定だけはやり直す。
+    """
+    columns = list(df.columns)
+    fingerprint = schema_fingerprint(columns)
+    remembered = memory.get(fingerprint) if memory is not None else None
+    mapping, methods = {}, {}
+    taken = {col for col in columns if col in STANDARD_COLUMNS}
+    if remembered is not None:
+        mapping = {col: target for col, target in remembered.items() if col in columns}
+        methods = {col: "memory" for col in mapping}
+        taken |= set(mapping.values())
+    else:
+        # すでに標準名の列はそのまま使う
+        candidates = []
+        for col in columns:
+            if col in taken:
+                continue
+            target, method, score = ALIAS_INDEX.match(col)
+            if target is not None:
+                candidates.append((score, col, target, method))
+
+        for score, col, target, method in sorted(candidates, key=lambda c: -c[0]):
+            if target in taken or col in mapping:
+                continue
+            mapping[col] = target
+            methods[col] = method
+            taken.add(target)
+
+        if memory is not None and len(df):
+            memory.put(fingerprint, dict(mapping))
+
+    # 名前で決まらなかった列は値の傾向から推定（0以上の整数 -> 在庫数、日付 -> 更新日）。
+    # 在庫数・更新日とも名前（記憶済みの対応を含む）で決まっていれば値は見ない
+    inferred = []
+    for col in columns if not VALUE_TARGETS <= taken else []:
+        if col in mapping or col in STANDARD_COLUMNS:
+            continue
+        target, score = _infer_from_values(df[col])
+        if target is not None and target not in taken:
+            inferred.append((score, col, target))
+    for score, col, target in sorted(inferred, key=lambda c: -c[0]):
+        if target in taken:
+            continue
+        mapping[col] = target
+        methods[col] = "values"
+        taken.add(target)
+
+    return mapping, methods, fingerprint
+
+
+def remember_mapping(fingerprint, mapping):
+    """手動で指定した対応を記録（次回から同じ列構成のファイルに自動適用）"""
+    _memory.put(fingerprint, mapping)
+
+
+def forget_mapping(fingerprint):
+    """記録した対応を削除（誤った対応を記録してしまったとき）"""
+    _memory.forget(fingerprint)
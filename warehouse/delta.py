@@ -0,0 +1,323 @@
+# delta.py - 前回取り込み分との差分だけを反映する増分取り込み
+#
+# 現在の在庫状態を (商品ID, ロケーション) をキーに共有DBへ保持し、
+# 新しいファイルとの差分（追加・更新・削除）だけを書き込む。
+# 差分の判定には現在の状態（キーと行ハッシュ）の読み込みと新しいファイル全体の
+# ハッシュ計算が必要なため、その部分は全件数に比例する。
+# 一方、DBへの書き込み・ロケーション別合計・推移ロールアップの更新は
+# 差分の範囲だけで済むため、変更件数に比例する。
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from warehouse.rollups import update_rollups
+
+KEY_COLUMNS = ["商品ID", "ロケーション"]
+VALUE_COLUMNS = ["商品名", "在庫数", "更新日"]
+
+# 変更内容の表示に使う件数の上限
+TOP_CHANGES = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS current_inventory (
+    "商品ID" TEXT NOT NULL,
+    "ロケーション" TEXT NOT NULL,
+    "商品名" TEXT,
+    "在庫数" REAL,
+    "更新日" TEXT,
+    row_hash INTEGER NOT NULL,
+    PRIMARY KEY ("商品ID", "ロケーション")
+);
+CREATE INDEX IF NOT EXISTS idx_current_date
+    ON current_inventory ("更新日", "ロケーション");
+CREATE TABLE IF NOT EXISTS current_location_totals (
+    location TEXT PRIMARY KEY,
+    items INTEGER NOT NULL,
+    stock REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS delta_log (
+    dataset TEXT NOT NULL,
+    source TEXT,
+    applied_at TEXT,
+    inserted INTEGER,
+    updated INTEGER,
+    deleted INTEGER,
+    unchanged INTEGER
+);
+"""
+
+
+@dataclass
+class Delta:
+    """新旧の差分（各表は KEY_COLUMNS + 値の列）"""
+    inserted: pd.DataFrame
+    updated: pd.DataFrame
+    deleted: pd.DataFrame
+    unchanged: int
+    duplicates: int = 0
+
+    @property
+    def changed(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+def ensure_schema(store):
+    store.connection().executescript(_SCHEMA)
+
+
+def _normalized(df):
+    """比較用に型を揃えたキー・値の表（キー重複は後勝ち）"""
+    rows = pd.DataFrame(index=df.index)
+    for col in KEY_COLUMNS + ["商品名"]:
+        rows[col] = (
+            df[col].astype("string").fillna("") if col in df.columns else ""
+        )
+    rows["在庫数"] = (
+        pd.to_numeric(df["在庫数"], errors="coerce").astype("float64")
+        if "在庫数" in df.columns else np.nan
+    )
+    if "更新日" in df.columns:
+        dates = pd.to_datetime(df["更新日"], errors="coerce")
+        rows["更新日"] = dates.dt.strftime("%Y-%m-%d %H:%M:%S").astype("string")
+    else:
+        rows["更新日"] = pd.Series(pd.NA, index=df.index, dtype="string")
+    return rows.reset_index(drop=True)
+
+
+def row_hashes(rows):
+    """値の列から行ハッシュを求める（SQLite の INTEGER に収まる符号付き64bit）"""
+    hashes = pd.util.hash_pandas_object(rows[VALUE_COLUMNS], index=False)
+    return hashes.to_numpy().view(np.int64)
+
+
+def diff_inventory(previous, new_df):
+    """前回の状態と新しいデータの差分を求める
+
+    previous は load_current() の戻り値（KEY_COLUMNS + 在庫数 + 更新日 + row_hash）。
+    キーと行ハッシュの突き合わせだけで判定するため、値の列を1つずつ比較しない。
+    """
+    rows = _normalized(new_df)
+    before = len(rows)
+    rows = rows.drop_duplicates(KEY_COLUMNS, keep="last")
+    rows["row_hash"] = row_hashes(rows)
+
+    merged = rows.merge(
+        previous[KEY_COLUMNS + ["在庫数", "更新日", "row_hash"]],
+        on=KEY_COLUMNS,
+        how="outer",
+        suffixes=("", "_前回"),
+        indicator=True,
+    )
+    both = merged["_merge"] == "both"
+    changed = both & (merged["row_hash"] != merged["row_hash_前回"])
+
+    inserted = merged.loc[merged["_merge"] == "left_only", rows.columns]
+    updated = merged.loc[changed, list(rows.columns) + ["在庫数_前回", "更新日_前回"]]
+    deleted = merged.loc[
+        merged["_merge"] == "right_only", KEY_COLUMNS + ["在庫数_前回", "更新日_前回"]
+    ]
+    return Delta(
+        inserted=inserted.reset_index(drop=True),
+        updated=updated.reset_index(drop=True),
+        deleted=deleted.reset_index(drop=True),
+        unchanged=int((both & ~changed).sum()),
+        duplicates=before - len(rows),
+    )
+
+
+def load_current(store):
+    """現在の在庫状態（差分判定に必要な列のみ。全件を読み込む）"""
+    ensure_schema(store)
+    return _load_current(store.connection())
+
+
+def _load_current(conn):
+    previous = pd.read_sql_query(
+        'SELECT "商品ID", "ロケーション", "在庫数", "更新日", row_hash FROM current_inventory',
+        conn,
+    )
+    for col in KEY_COLUMNS + ["更新日"]:
+        previous[col] = previous[col].astype("string")
+    previous["在庫数"] = previous["在庫数"].astype("float64")
+    previous["row_hash"] = previous["row_hash"].astype("int64")
+    return previous
+
+
+def last_applied(store):
+    """最後に反映したデータセットのキー"""
+    ensure_schema(store)
+    return _last_applied(store.connection())
+
+
+def _last_applied(conn):
+    row = conn.execute("SELECT dataset FROM delta_log ORDER BY rowid DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def rehash_rows(conn, keys):
+    """指定キーの行ハッシュを現在の値から求め直し、対象行の日付（YYYY-MM-DD）を返す
+
+    差分取り込み以外で値を変えた行（スキャンによる在庫調整など）に使う。
+    行ハッシュが古いままだと、同じファイルを取り込み直しても「変更なし」と判定される。
+    呼び出し側でトランザクションと書き込みロックを持つ。
+    """
+    fetched = [
+        row for key in dict.fromkeys(keys)
+        for row in conn.execute(
+            'SELECT "商品ID", "ロケーション", "商品名", "在庫数", "更新日" FROM current_inventory '
+            'WHERE "商品ID" = ? AND "ロケーション" = ?',
+            key,
+        )
+    ]
+    if not fetched:
+        return []
+    rows = _normalized(pd.DataFrame(fetched, columns=KEY_COLUMNS + VALUE_COLUMNS))
+    conn.executemany(
+        'UPDATE current_inventory SET row_hash = ? WHERE "商品ID" = ? AND "ロケーション" = ?',
+        zip(row_hashes(rows).tolist(), rows["商品ID"], rows["ロケーション"]),
+    )
+    return sorted(set(rows["更新日"].dropna().str[:10]))
+
+
+def _records(frame, columns):
+    values = frame[columns].astype(object).where(frame[columns].notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def location_changes(delta):
+    """ロケーション別の件数・在庫数の増減"""
+    parts = [
+        pd.DataFrame({
+            "ロケーション": delta.inserted["ロケーション"],
+            "件数": 1,
+            "在庫数": delta.inserted["在庫数"].fillna(0),
+        }),
+        pd.DataFrame({
+            "ロケーション": delta.updated["ロケーション"],
+            "件数": 0,
+            "在庫数": delta.updated["在庫数"].fillna(0) - delta.updated["在庫数_前回"].fillna(0),
+        }),
+        pd.DataFrame({
+            "ロケーション": delta.deleted["ロケーション"],
+            "件数": -1,
+            "在庫数": -delta.deleted["在庫数_前回"].fillna(0),
+        }),
+    ]
+    changes = pd.concat(parts, ignore_index=True)
+    if changes.empty:
+        return pd.DataFrame(columns=["ロケーション", "件数", "在庫数"])
+    return changes.groupby("ロケーション", as_index=False)[["件数", "在庫数"]].sum()
+
+
+def _affected_days(delta):
+    days = pd.concat([
+        delta.inserted["更新日"],
+        delta.updated["更新日"],
+        delta.updated["更新日_前回"],
+        delta.deleted["更新日_前回"],
+    ]).dropna()
+    return sorted(set(pd.to_datetime(days).dt.strftime("%Y-%m-%d")))
+
+
+def refresh_rollups(store, days):
+    """差分に関係する日だけ現在の状態から日別合計を作り直してロールアップへ反映"""
+    if not days:
+        return 0
+    conn = store.connection()
+    placeholders = ",".join("?" * len(days))
+    daily = pd.read_sql_query(
+        'SELECT substr("更新日", 1, 10) AS day, "ロケーション" AS location, '
+        'SUM("在庫数") AS total FROM current_inventory '
+        f'WHERE substr("更新日", 1, 10) IN ({placeholders}) GROUP BY day, location',
+        conn,
+        params=days,
+    )
+    # 差分で行が無くなったロケーションも 0 として上書きする
+    locations = [loc for (loc,) in conn.execute(
+        f"SELECT DISTINCT location FROM rollup_daily WHERE day IN ({placeholders})", days
+    ).fetchall()] if _has_table(conn, "rollup_daily") else []
+    wide = daily.pivot_table(index="day", columns="location", values="total", aggfunc="sum")
+    wide = wide.reindex(index=days, columns=sorted(set(wide.columns) | set(locations)))
+    wide.index = pd.to_datetime(wide.index)
+    return update_rollups(store, wide.fillna(0))
+
+
+def _has_table(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _write_delta(conn, delta, key, source):
+    """差分を書き込む（呼び出し側でトランザクションと書き込みロックを持つ）"""
+    columns = KEY_COLUMNS + VALUE_COLUMNS + ["row_hash"]
+    upserts = pd.concat([delta.inserted[columns], delta.updated[columns]], ignore_index=True)
+    loc_changes = location_changes(delta)
+    conn.executemany(
+        'INSERT OR REPLACE INTO current_inventory '
+        '("商品ID", "ロケーション", "商品名", "在庫数", "更新日", row_hash) '
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        _records(upserts, columns),
+    )
+    conn.executemany(
+        'DELETE FROM current_inventory WHERE "商品ID" = ? AND "ロケーション" = ?',
+        _records(delta.deleted, KEY_COLUMNS),
+    )
+    conn.executemany(
+        "INSERT INTO current_location_totals (location, items, stock) VALUES (?, ?, ?) "
+        "ON CONFLICT(location) DO UPDATE SET "
+        "items = items + excluded.items, stock = stock + excluded.stock",
+        _records(loc_changes, ["ロケーション", "件数", "在庫数"]),
+    )
+    conn.execute("DELETE FROM current_location_totals WHERE items <= 0")
+    conn.execute(
+        "INSERT INTO delta_log VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            key, source, datetime.now().isoformat(timespec="seconds"),
+            len(delta.inserted), len(delta.updated), len(delta.deleted),
+            delta.unchanged,
+        ),
+    )
+    return loc_changes
+
+
+def sync_inventory(store, new_df, key, source):
+    """現在の状態を読み込み、差分を求めて反映する（反映済みのキーなら None）
+
+    読み込み・差分判定・反映を書き込みロックと1つのトランザクション内で行うため、
+    同じデータを複数のセッションが同時に反映しても差分が二重に加算されない。
+    """
+    ensure_schema(store)
+    with store.write_lock():
+        conn = store.connection()
+        # 他プロセスの書き込みとも直列化するため、読み込みの前に書き込みロックを取る
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            # ensure_schema() の executescript は暗黙に COMMIT するため、ここでは接続を直接使う
+            if _last_applied(conn) == key:
+                return None
+            delta = diff_inventory(_load_current(conn), new_df)
+            _write_delta(conn, delta, key, source)
+    refresh_rollups(store, _affected_days(delta))
+    return delta
+
+
+def current_location_totals(store):
+    """差分反映後のロケーション別合計（件数・在庫数）"""
+    ensure_schema(store)
+    return pd.read_sql_query(
+        "SELECT location AS ロケーション, items AS 件数, stock AS 在庫数 "
+        "FROM current_location_totals ORDER BY location",
+        store.connection(),
+    )
+
+
+def top_changes(delta, n=TOP_CHANGES):
+    """在庫数の増減が大きい更新行"""
+    updated = delta.updated.assign(
+        増減=delta.updated["在庫数"].fillna(0) - delta.updated["在庫数_前回"].fillna(0)
+    )
+    order = updated["増減"].abs().sort_values(ascending=False, kind="stable").index[:n]
+    return updated.loc[order, KEY_COLUMNS + ["商品名", "在庫数_前回", "在庫数", "増減"]]
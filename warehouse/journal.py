@@ -0,0 +1,374 @@
+# journal.py - 操作履歴の追記専用ジャーナル（JSON Lines のセグメントファイル）
+#
+# - 書き込みは専用スレッドがまとめて行い、fsync も件数・間隔ごとにまとめる
+# - セグメントは一定サイズか日付が変わると切り替え、切り替えた後は変更しない
+# - 時刻（セグメント内の疎なオフセット表）と コード（コードごとに直近の記録のオフセット）の
+#   索引をメモリに持つ。切り替えたセグメントの索引はサイドカー（.idx）に保存し、
+#   起動時はそれを読むため、全セグメントの記録を読み直さない
+# - エクスポートは期間内のセグメントだけを行単位で読み、全件をメモリに載せない
+#
+# 書き込むプロセスは1つ（Streamlit サーバー）を前提とする。
+import atexit
+import bisect
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+# ジャーナルの置き場所（環境変数で変更可能）
+JOURNAL_DIR = os.getenv("WAREHOUSE_JOURNAL_DIR", "ops_journal")
+
+# セグメントを切り替えるサイズ
+SEGMENT_BYTES = 16 * 1024 * 1024
+
+# fsync をまとめる件数と最大待ち時間（秒）
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 0.5
+
+# 時刻索引に記録する間隔（件数）
+INDEX_STRIDE = 256
+
+# コード索引にコードごとに保持する記録数（find_code で返せる上限）
+CODE_INDEX_LIMIT = 50
+
+# 切り替え済みセグメントの索引ファイルの拡張子
+INDEX_SUFFIX = ".idx"
+
+_STOP = object()
+
+
+@dataclass
+class Segment:
+    """1ファイル分のメタ情報と索引"""
+    path: str
+    first_time: str = None
+    last_time: str = None
+    count: int = 0
+    size: int = 0
+    # (時刻, オフセット) を INDEX_STRIDE 件ごとに記録した疎な索引
+    sparse: list = field(default_factory=list)
+    # コード -> セグメント内の直近の記録のオフセット（サイドカー保存用。保存後は None）
+    codes: dict = field(default_factory=dict)
+
+    def note(self, record_time, offset, length):
+        if self.first_time is None:
+            self.first_time = record_time
+        if self.count % INDEX_STRIDE == 0:
+            self.sparse.append((record_time, offset))
+        self.last_time = record_time
+        self.count += 1
+        self.size = offset + length
+
+    def note_code(self, code, offset):
+        offsets = self.codes.setdefault(code, [])
+        offsets.append(offset)
+        del offsets[:-CODE_INDEX_LIMIT]
+
+    @property
+    def index_path(self):
+        return self.path + INDEX_SUFFIX
+
+    def save_index(self):
+        """切り替え済みセグメントの索引をサイドカーに保存し、コード一覧をメモリから外す"""
+        data = {
+            "size": self.size,
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "count": self.count,
+            "sparse": self.sparse,
+            "codes": self.codes,
+        }
+        tmp = f"{self.index_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            # 保存できなくても次回の起動時にセグメントを読んで作り直せる
+            pass
+        self.codes = None
+
+    def load_index(self):
+        """サイドカーの索引を読み込む（無い・セグメントと大きさが合わない場合は False）"""
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("size") != os.path.getsize(self.path):
+            return False
+        self.size = data["size"]
+        self.first_time = data["first_time"]
+        self.last_time = data["last_time"]
+        self.count = data["count"]
+        self.sparse = [tuple(entry) for entry in data["sparse"]]
+        self.codes = data["codes"]
+        return True
+
+    def start_offset(self, start):
+        """start 以降の記録を含む最初のオフセット"""
+        if start is None or not self.sparse:
+            return 0
+        i = bisect.bisect_left(self.sparse, (start,)) - 1
+        return self.sparse[max(i, 0)][1]
+
+
+class OpsJournal:
+    """追記専用の操作履歴（全セッション共有）"""
+
+    def __init__(self, directory=JOURNAL_DIR, segment_bytes=SEGMENT_BYTES,
+                 fsync_batch=FSYNC_BATCH, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = []
+        self.by_code = {}
+        self._lock = threading.Lock()
+        self._last_time = ""
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._drained = threading.Condition(self._lock)
+        self._file = None
+        # 切り替え済みでサイドカーの保存待ちのセグメント
+        self._sealed = []
+        self._load_index()
+
+        self._writer = threading.Thread(target=self._run, name="ops-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # --- 起動時の索引作成 ----------------------------------------------------
+
+    def _load_index(self):
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("ops-") and name.endswith(".jsonl")
+        )
+        for i, name in enumerate(names):
+            segment = Segment(os.path.join(self.directory, name))
+            sealed = i < len(names) - 1
+            # 切り替え済みのセグメントはサイドカーの索引を使い、無ければ読んで作る
+            loaded = sealed and segment.load_index()
+            if not loaded:
+                self._scan(segment)
+            for code, offsets in segment.codes.items():
+                for offset in offsets:
+                    self._index_code(code, segment, offset)
+            if loaded:
+                segment.codes = None
+            elif sealed:
+                segment.save_index()
+            self.segments.append(segment)
+            self._last_time = segment.last_time or self._last_time
+
+    def _scan(self, segment):
+        """セグメントの全行を読んで索引を作る（書き込み途中で止まった末尾は切り捨てる）"""
+        offset = 0
+        with open(segment.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 書き込み途中で止まった末尾の行は無視する
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                segment.note(record["time"], offset, len(line))
+                if record.get("code"):
+                    segment.note_code(record["code"], offset)
+                offset += len(line)
+        if offset != os.path.getsize(segment.path):
+            with open(segment.path, "r+b") as f:
+                f.truncate(offset)
+        segment.size = offset
+
+    def _index_code(self, code, segment, offset):
+        entries = self.by_code.setdefault(code, [])
+        entries.append((segment, offset))
+        del entries[:-CODE_INDEX_LIMIT]
+
+    def _index(self, segment, record, offset, length):
+        segment.note(record["time"], offset, length)
+        code = record.get("code")
+        if code:
+            segment.note_code(code, offset)
+            self._index_code(code, segment, offset)
+
+    # --- 書き込み -----------------------------------------------------------
+
+    def append(self, record):
+        """記録を追加する（時刻はジャーナル側で付けるため、並び順と時刻順が一致する）"""
+        with self._lock:
+            now = datetime.now().isoformat(timespec="milliseconds")
+            # 時計が戻っても時刻が逆転しないようにする
+            self._last_time = max(now, self._last_time)
+            entry = {"time": self._last_time, **{k: v for k, v in record.items() if k != "time"}}
+            self._pending += 1
+        self._queue.put(entry)
+        return entry
+
+    def flush(self, timeout=None):
+        """追加済みの記録がディスクに書かれる（fsync される）まで待つ"""
+        with self._drained:
+            return self._drained.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=5)
+
+    def _segment_for(self, record_time):
+        current = self.segments[-1] if self.segments else None
+        day = record_time[:10].replace("-", "")
+        if (
+            current is None
+            or current.size >= self.segment_bytes
+            or os.path.basename(current.path)[4:12] != day
+        ):
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            if current is not None:
+                # このセグメントにはもう書かないため、書き込み分を索引に反映した後でサイドカーに保存する
+                self._sealed.append(current)
+            name = f"ops-{day}-{len(self.segments):06d}.jsonl"
+            current = Segment(os.path.join(self.directory, name))
+            with self._lock:
+                self.segments.append(current)
+        if self._file is None:
+            self._file = open(current.path, "ab")
+        return current
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.fsync_interval
+            # 件数か待ち時間の上限まで集めてから書き込み・fsync する
+            while len(batch) < self.fsync_batch:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                batch.append(item)
+            self._write(batch)
+        if self._file is not None:
+            self._file.close()
+
+    def _write(self, batch):
+        written = []
+        for record in batch:
+            segment = self._segment_for(record["time"])
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            offset = segment.size
+            self._file.write(line)
+            segment.size += len(line)
+            written.append((segment, record, offset, len(line)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with self._drained:
+            for segment, record, offset, length in written:
+                self._index(segment, record, offset, length)
+            sealed, self._sealed = self._sealed, []
+            for segment in sealed:
+                segment.save_index()
+            self._pending -= len(batch)
+            self._drained.notify_all()
+
+    # --- 読み出し -----------------------------------------------------------
+
+    def _segments_in(self, start, end):
+        with self._lock:
+            segments = list(self.segments)
+        return [
+            s for s in segments
+            if s.count
+            and (start is None or s.last_time >= start)
+            and (end is None or s.first_time <= end)
+        ]
+
+    def iter_lines(self, start=None, end=None):
+        """期間内の記録を JSON 行のまま順に返す（start/end は ISO 形式の文字列）"""
+        for segment in self._segments_in(start, end):
+            with open(segment.path, "rb") as f:
+                f.seek(segment.start_offset(start))
+                limit = segment.size
+                while f.tell() < limit:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    record_time = json.loads(line)["time"]
+                    if start is not None and record_time < start:
+                        continue
+                    if end is not None and record_time > end:
+                        return
+                    yield line
+
+    def export(self, out, start=None, end=None):
+        """期間内の記録を JSON Lines でファイルに書き出す（書き出した件数を返す）"""
+        count = 0
+        for line in self.iter_lines(start, end):
+            out.write(line)
+            count += 1
+        return count
+
+    def export_gzip(self, start=None, end=None):
+        """期間内の記録を gzip 圧縮した JSON Lines で返す -> (バイト列, 件数)
+
+        行単位で読みながら圧縮するため、圧縮前の全件はメモリに載せない。
+        """
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as out:
+            count = self.export(out, start, end)
+        return buffer.getvalue(), count
+
+    def find_code(self, code, limit=20):
+        """コードの記録を新しい順に返す（最大 CODE_INDEX_LIMIT 件）"""
+        with self._lock:
+            entries = list(self.by_code.get(code, [])[-limit:])
+        records = []
+        for segment, offset in reversed(entries):
+            with open(segment.path, "rb") as f:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+    def stats(self):
+        with self._lock:
+            return {
+                "records": sum(s.count for s in self.segments),
+                "segments": len(self.segments),
+                "bytes": sum(s.size for s in self.segments),
+                "pending": self._pending,
+                "first_time": next((s.first_time for s in self.segments if s.count), None),
+                "last_time": self._last_time or None,
+            }
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal(directory=JOURNAL_DIR):
+    """プロセス内で共有するジャーナル"""
+    global _journal
+    with _journal_lock:
+        if _journal is None or _journal.directory != directory:
+            _journal = OpsJournal(directory)
+        return _journal
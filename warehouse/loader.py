@@ -0,0 +1,284 @@
+# loader.py - 在庫データの取り込み（読み込み・列名正規化・型変換）
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from warehouse.columns import detect_columns
+from warehouse.snapshots import find_snapshot, load_snapshot, snapshot_meta
+
+# 集計・一覧に必須の列（揃っていなければ画面で手動で対応付ける）
+REQUIRED_COLUMNS = ["商品ID", "商品名", "在庫数", "ロケーション"]
+
+# キャッシュに保持するデータセット数の上限
+CACHE_MAX_ENTRIES = 8
+
+# ユニーク値の割合がこれ以下の文字列列はカテゴリ型にする
+CATEGORY_MAX_RATIO = 0.5
+
+# カテゴリ化せず Arrow 文字列型で持つ列（高カーディナリティのID類）
+ARROW_STRING_COLUMNS = ["商品ID", "商品名"]
+
+
+@dataclass
+class LoadResult:
+    """取り込み済みデータと変換結果のメモ"""
+    df: pd.DataFrame
+    renamed: dict = field(default_factory=dict)
+    notes: dict = field(default_factory=dict)
+    key: str = ""
+    # データセット単位の派生データ（インデックス等）の置き場
+    extras: dict = field(default_factory=dict)
+
+
+class LRUCache:
+    """スレッドセーフな件数上限付きLRUキャッシュ（全セッションで共有）"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_cache = LRUCache()
+
+
+def content_hash(data):
+    """ファイル内容のSHA-256ハッシュ"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_column_names(df, details=None, remember=True):
+    """列名を標準形式にマッピング
+
+    表記ゆれ（全角・空白・大文字小文字）や辞書にない近い名前も認識し、
+    名前で決まらない列は値の傾向から推定する（warehouse.columns）。
+    details に辞書を渡すと判定方法と列構成のフィンガープリントを書き込む。
+    remember=False なら列構成ごとの記録を読み書きせず、毎回判定する（計測用）。
+    """
+    if remember:
+        renamed_columns, methods, fingerprint = detect_columns(df)
+    else:
+        renamed_columns, methods, fingerprint = detect_columns(df, memory=None)
+    if renamed_columns:
+        df = df.rename(columns=renamed_columns)
+    if details is not None:
+        details["column_methods"] = methods
+        details["schema_fingerprint"] = fingerprint
+    return df, renamed_columns
+
+
+def convert_types(df):
+    """更新日を日付型、在庫数を数値型に変換（結果メモを返す）"""
+    notes = {}
+
+    # 日付型変換
+    if "更新日" in df.columns:
+        try:
+            if pd.api.types.is_object_dtype(df["更新日"]) or pd.api.types.is_string_dtype(df["更新日"]):
+                df["更新日"] = pd.to_datetime(df["更新日"])
+            notes["date_converted"] = True
+        except Exception as e:
+            notes["date_error"] = str(e)
+
+    # 数値型変換（在庫数）
+    if "在庫数" in df.columns:
+        try:
+            df["在庫数"] = pd.to_numeric(df["在庫数"], errors="coerce")
+            # NaNの処理
+            na_count = int(df["在庫数"].isna().sum())
+            if na_count:
+                df["在庫数"] = df["在庫数"].fillna(0)
+            notes["stock_na_count"] = na_count
+            notes["stock_converted"] = True
+        except Exception as e:
+            notes["stock_error"] = str(e)
+
+    return notes
+
+
+def _arrow_string_dtype():
+    """pyarrow があれば Arrow 文字列型、なければ None"""
+    try:
+        import pyarrow  # noqa: F401
+    except ModuleNotFoundError:
+        return None
+    return pd.StringDtype("pyarrow")
+
+
+def optimize_dtypes(df):
+    """メモリ効率の良い型に変換（変換前後のメモリ使用量を返す）
+
+    - 在庫数: 整数値のみなら収まる最小の整数型に縮小
+    - 低カーディナリティの文字列列（ロケーション等）: category
+    - 商品ID・商品名: Arrow 文字列型
+    """
+    memory_before = int(df.memory_usage(deep=True).sum())
+
+    if "在庫数" in df.columns and pd.api.types.is_float_dtype(df["在庫数"]):
+        stock = df["在庫数"]
+        if stock.notna().all() and (stock % 1 == 0).all():
+            df["在庫数"] = pd.to_numeric(stock.astype("int64"), downcast="integer")
+        else:
+            df["在庫数"] = pd.to_numeric(stock, downcast="float")
+    elif "在庫数" in df.columns and pd.api.types.is_integer_dtype(df["在庫数"]):
+        df["在庫数"] = pd.to_numeric(df["在庫数"], downcast="integer")
+
+    arrow_string = _arrow_string_dtype()
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        if col in ARROW_STRING_COLUMNS:
+            if arrow_string is not None:
+                df[col] = series.astype(arrow_string)
+        elif len(series) and series.nunique() / len(series) <= CATEGORY_MAX_RATIO:
+            df[col] = series.astype("category")
+
+    memory_after = int(df.memory_usage(deep=True).sum())
+    return {"memory_before": memory_before, "memory_after": memory_after}
+
+
+def read_inventory(data, filename):
+    """CSV/Excel（バイト列またはファイルパス）を DataFrame に読み込む"""
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    if filename.lower().endswith(".csv"):
+        return pd.read_csv(source)
+    return pd.read_excel(source, engine="openpyxl")
+
+
+def prepare_inventory(df):
+    """列名正規化・型変換・メモリ最適化をまとめて実行"""
+    stages = {}
+    start = time.perf_counter()
+    details = {}
+    df, renamed = normalize_column_names(df, details)
+    stages["列名正規化"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    notes = convert_types(df)
+    stages["型変換"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    notes.update(optimize_dtypes(df))
+    stages["型最適化"] = time.perf_counter() - start
+
+    notes.update(details)
+    notes["stage_seconds"] = stages
+    return LoadResult(df=df, renamed=renamed, notes=notes)
+
+
+def result_from_snapshot(path, columns=None):
+    """スナップショットを LoadResult として読み込む（保存時の列名変換・メモも復元）
+
+    columns を指定するとその列だけを読む。必須列が揃っていないスナップショットは
+    画面で列を対応付けられるよう全列を読む。
+    """
+    start = time.perf_counter()
+    meta = snapshot_meta(path)
+    df = load_snapshot(path, columns)
+    if columns is not None and not set(REQUIRED_COLUMNS) <= set(df.columns):
+        df = load_snapshot(path)
+    notes = dict(meta.get("notes", {}))
+    notes["stage_seconds"] = {"スナップショット読み込み": time.perf_counter() - start}
+    notes["snapshot"] = str(path)
+    return LoadResult(df=df, renamed=meta.get("renamed", {}), notes=notes)
+
+
+def _from_snapshot(key):
+    """内容キーのスナップショットがあれば読み込む（無い・読めない場合は None）"""
+    path = find_snapshot(key)
+    if path is None:
+        return None
+    try:
+        return result_from_snapshot(path)
+    except Exception:
+        # pyarrow が無い・ファイルが壊れている場合は元ファイルから読み直す
+        return None
+
+
+def load_inventory(data, filename):
+    """ファイル内容のハッシュをキーにキャッシュ付きで取り込む
+
+    戻り値は (LoadResult, キャッシュヒットしたか)。
+    キャッシュに無くても同じ内容のスナップショットがあれば、
+    ファイルを解析せずにスナップショットを読み込む。
+    キャッシュ上の DataFrame は全セッションで共有されるため、
+    呼び出し側でインプレース変更しないこと。
+    """
+    def load():
+        start = time.perf_counter()
+        raw = read_inventory(data, filename)
+        parse_sec = time.perf_counter() - start
+        result = prepare_inventory(raw)
+        result.notes["stage_seconds"] = {"ファイル解析": parse_sec, **result.notes["stage_seconds"]}
+        return result
+
+    return get_or_load(content_hash(data), load, snapshot=True)
+
+
+def get_or_load(key, load, snapshot=False):
+    """キャッシュにあれば再利用し、なければ load() の結果を登録する
+
+    snapshot=True ならキャッシュに無いとき先に同じキーのスナップショットを探す。
+    戻り値は (LoadResult, キャッシュヒットしたか)。
+    """
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached, True
+
+    result = (_from_snapshot(key) if snapshot else None) or load()
+    result.key = key
+    _cache.put(key, result)
+    return result, False
+
+
+def forget(key):
+    """キャッシュから1件削除（列名の対応を変えて読み直すとき）"""
+    _cache.discard(key)
+
+
+def cache_stats():
+    """取り込みキャッシュの統計情報"""
+    return _cache.stats()
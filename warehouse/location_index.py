@@ -0,0 +1,73 @@
+# location_index.py - ロケーション別の行位置インデックスと事前集計
+import numpy as np
+import pandas as pd
+
+
+class LocationIndex:
+    """ロケーション -> 行位置 の対応と、ロケーション単位の部分集計を保持
+
+    フィルターは事前に分割した行位置から組み立てたマスク、グラフは部分集計の合算で
+    求めるため、フィルター変更のたびにロケーション列を比較し直さない。
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.locations = []
+        self.positions = {}
+        self.stock_sum = pd.Series(dtype="float64")
+        self.daily = None
+
+        if "ロケーション" not in df.columns:
+            return
+
+        groups = df.groupby("ロケーション", observed=True, sort=True)
+        self.positions = {loc: pos for loc, pos in groups.indices.items()}
+        self.locations = sorted(self.positions)
+
+        if "在庫数" in df.columns:
+            self.stock_sum = groups["在庫数"].sum()
+            if "更新日" in df.columns:
+                # 日付 × ロケーション の在庫合計（列ごとに日別系列）
+                self.daily = (
+                    df.groupby(["更新日", "ロケーション"], observed=True)["在庫数"]
+                    .sum()
+                    .unstack(fill_value=0)
+                    .sort_index()
+                )
+
+    def _selected(self, locations):
+        if locations is None:
+            return self.locations
+        return [loc for loc in locations if loc in self.positions]
+
+    def mask(self, locations):
+        """選択ロケーションの行を示す真偽値配列"""
+        mask = np.zeros(len(self.df), dtype=bool)
+        for loc in self._selected(locations):
+            mask[self.positions[loc]] = True
+        return mask
+
+    def location_totals(self, locations=None):
+        """ロケーション別在庫合計（グラフ用）"""
+        selected = self._selected(locations)
+        totals = self.stock_sum[self.stock_sum.index.isin(selected)]
+        return totals.rename("在庫数").rename_axis("ロケーション").reset_index()
+
+    def daily_totals(self, locations=None):
+        """日別在庫推移（グラフ用）"""
+        if self.daily is None:
+            return pd.DataFrame(columns=["更新日", "在庫数"])
+        selected = [loc for loc in self._selected(locations) if loc in self.daily.columns]
+        return (
+            self.daily[selected].sum(axis=1)
+            .rename("在庫数").rename_axis("更新日").reset_index()
+        )
+
+
+def location_index_for(result):
+    """データセットごとにインデックスを一度だけ構築して使い回す"""
+    index = result.extras.get("location_index")
+    if index is None:
+        index = LocationIndex(result.df)
+        result.extras["location_index"] = index
+    return index
@@ -0,0 +1,321 @@
+# nlquery.py - 自然文の在庫問い合わせを構造化クエリに変換してローカルで実行
+#
+# LLM に渡すのは列の説明と集計済みの小さな結果だけで、元データは送らない。
+# そのためプロンプトの大きさと応答時間はデータ件数に依存しない。
+import json
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+GROUP_COLUMNS = ["ロケーション", "商品ID", "商品名", "更新日"]
+METRICS = ["rows", "count", "sum", "mean", "min", "max"]
+STOCK_OPS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+}
+
+# 結果として返す・LLM に渡す行数の上限
+MAX_RESULT_ROWS = 20
+
+# スキーマ説明に列挙するロケーション数の上限（プロンプトを一定の大きさに保つ）
+MAX_SCHEMA_VALUES = 50
+
+_PARSE_PROMPT = (
+    "あなたは倉庫在庫データの問い合わせを JSON に変換するアシスタントです。"
+    "次のキーだけを持つ JSON オブジェクトを1つだけ出力してください（説明文は不要）。\n"
+    '{"locations": [ロケーション名], "stock": {"op": "<|<=|>|>=|==", "value": 数値} または null, '
+    '"name_contains": 文字列 または null, "product_ids": [商品ID], '
+    '"date_from": "YYYY-MM-DD" または null, "date_to": "YYYY-MM-DD" または null, '
+    '"group_by": "ロケーション|商品ID|商品名|更新日" または null, '
+    '"metric": "rows|count|sum|mean|min|max", "sort": "asc|desc", "limit": 整数}\n'
+    "rows は該当行の一覧、count は件数、sum/mean/min/max は在庫数の集計です。"
+)
+
+_ANSWER_PROMPT = (
+    "あなたは倉庫の在庫データについて答えるアシスタントです。"
+    "与えられた集計結果だけを根拠に、質問に日本語で簡潔に答えてください。"
+    "結果に無い数値は推測しないでください。"
+)
+
+
+@dataclass
+class QueryResult:
+    """問い合わせの実行結果（表示用の表と件数の要約）"""
+    spec: dict
+    table: pd.DataFrame
+    matched_rows: int
+    matched_stock: int
+    total_groups: int = 0
+    notes: list = field(default_factory=list)
+
+
+def _fold(text):
+    """全角・半角と大文字・小文字の揺れを吸収"""
+    return unicodedata.normalize("NFKC", str(text)).strip().lower()
+
+
+def empty_spec():
+    return {
+        "locations": [],
+        "stock": None,
+        "name_contains": None,
+        "product_ids": [],
+        "date_from": None,
+        "date_to": None,
+        "group_by": None,
+        "metric": "rows",
+        "sort": "asc",
+        "limit": MAX_RESULT_ROWS,
+    }
+
+
+def normalize_spec(raw, locations=()):
+    """LLM・ルールどちらの出力も検証して既定値で補完する（不明なキーは捨てる）"""
+    spec = empty_spec()
+    if not isinstance(raw, dict):
+        return spec
+
+    known = {_fold(loc): loc for loc in locations}
+    for loc in raw.get("locations") or []:
+        match = known.get(_fold(loc))
+        if match is not None and match not in spec["locations"]:
+            spec["locations"].append(match)
+
+    stock = raw.get("stock")
+    if isinstance(stock, dict) and stock.get("op") in STOCK_OPS:
+        try:
+            spec["stock"] = {"op": stock["op"], "value": float(stock["value"])}
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    if raw.get("name_contains"):
+        spec["name_contains"] = str(raw["name_contains"])
+    spec["product_ids"] = [str(p) for p in raw.get("product_ids") or []]
+
+    for key in ("date_from", "date_to"):
+        if raw.get(key):
+            value = pd.to_datetime(raw[key], errors="coerce")
+            if not pd.isna(value):
+                spec[key] = value.strftime("%Y-%m-%d")
+
+    if raw.get("group_by") in GROUP_COLUMNS:
+        spec["group_by"] = raw["group_by"]
+    if raw.get("metric") in METRICS:
+        spec["metric"] = raw["metric"]
+    if raw.get("sort") in ("asc", "desc"):
+        spec["sort"] = raw["sort"]
+    try:
+        spec["limit"] = max(1, min(int(raw.get("limit") or MAX_RESULT_ROWS), MAX_RESULT_ROWS))
+    except (TypeError, ValueError):
+        pass
+    return spec
+
+
+_STOCK_PATTERN = re.compile(
+    r"在庫(?:数)?(?:が|は)?\s*(\d+(?:\.\d+)?)\s*(?:個|点)?\s*(未満|以下|以上|超|より多い|より少ない|ちょうど)"
+)
+_STOCK_WORDS = {
+    "未満": "<",
+    "より少ない": "<",
+    "以下": "<=",
+    "以上": ">=",
+    "超": ">",
+    "より多い": ">",
+    "ちょうど": "==",
+}
+
+
+def parse_rule_based(question, locations=()):
+    """よくある言い回しを正規表現で構造化する（LLM が使えないときの代替）"""
+    text = unicodedata.normalize("NFKC", question)
+    raw = {"locations": [loc for loc in locations if _fold(loc) in _fold(text)]}
+
+    m = _STOCK_PATTERN.search(text)
+    if m:
+        raw["stock"] = {"op": _STOCK_WORDS[m.group(2)], "value": m.group(1)}
+    elif "在庫切れ" in text or "欠品" in text:
+        raw["stock"] = {"op": "<=", "value": 0}
+
+    m = re.search(r"[「『\"](.+?)[」』\"]", text)
+    if m:
+        raw["name_contains"] = m.group(1)
+
+    if re.search(r"(ロケーション|場所|拠点)(別|ごと)", text):
+        raw["group_by"] = "ロケーション"
+    elif re.search(r"(商品|品目)(別|ごと)", text):
+        raw["group_by"] = "商品名"
+    elif re.search(r"(日別|日ごと|推移)", text):
+        raw["group_by"] = "更新日"
+
+    if re.search(r"(何件|件数|何品目|いくつ|数は)", text):
+        raw["metric"] = "count"
+    elif re.search(r"(平均)", text):
+        raw["metric"] = "mean"
+    elif re.search(r"(合計|総数|トータル)", text):
+        raw["metric"] = "sum"
+    elif re.search(r"(最小|最も少ない|一番少ない)", text):
+        raw["metric"] = "min"
+    elif re.search(r"(最大|最も多い|一番多い)", text):
+        raw["metric"] = "max"
+
+    if re.search(r"(多い順|降順|上位|トップ)", text):
+        raw["sort"] = "desc"
+    m = re.search(r"(?:上位|トップ)\s*(\d+)", text)
+    if m:
+        raw["limit"] = m.group(1)
+    return normalize_spec(raw, locations)
+
+
+def schema_prompt(df, max_values=MAX_SCHEMA_VALUES):
+    """列とロケーションの説明（データ件数に関わらず一定の大きさ）"""
+    lines = [f"列: {', '.join(map(str, df.columns))}"]
+    if "ロケーション" in df.columns:
+        locs = sorted(map(str, df["ロケーション"].dropna().unique()))
+        more = f" ほか{len(locs) - max_values}件" if len(locs) > max_values else ""
+        lines.append(f"ロケーション: {', '.join(locs[:max_values])}{more}")
+    if "更新日" in df.columns and df["更新日"].notna().any():
+        dates = pd.to_datetime(df["更新日"], errors="coerce")
+        lines.append(f"更新日の範囲: {dates.min():%Y-%m-%d} 〜 {dates.max():%Y-%m-%d}")
+    return "\n".join(lines)
+
+
+def _extract_json(text):
+    m = re.search(r"\{.*\}", text or "", re.S)
+    if not m:
+        raise ValueError("JSON が見つかりません")
+    return json.loads(m.group(0))
+
+
+def parse_question(question, df, complete=None, locations=()):
+    """質問をクエリ仕様に変換する -> (spec, 方式)
+
+    complete（メッセージ列を受け取り応答文を返す関数）があれば LLM で変換し、
+    失敗したときや未指定のときは正規表現による変換にフォールバックする。
+    """
+    if complete is not None:
+        try:
+            content = complete([
+                {"role": "system", "content": _PARSE_PROMPT + "\n" + schema_prompt(df)},
+                {"role": "user", "content": question},
+            ])
+            return normalize_spec(_extract_json(content), locations), "llm"
+        except Exception:
+            pass
+    return parse_rule_based(question, locations), "rule"
+
+
+def query_mask(df, spec, location_mask=None):
+    """条件に合う行の真偽値配列（全件に対するベクトル演算のみ）"""
+    mask = np.ones(len(df), dtype=bool)
+    if spec["locations"]:
+        if location_mask is not None:
+            mask &= location_mask(spec["locations"])
+        else:
+            mask &= df["ロケーション"].isin(spec["locations"]).to_numpy()
+    if spec["stock"] and "在庫数" in df.columns:
+        stock = df["在庫数"].to_numpy(dtype="float64", na_value=np.nan)
+        mask &= STOCK_OPS[spec["stock"]["op"]](stock, spec["stock"]["value"])
+    if spec["name_contains"] and "商品名" in df.columns:
+        mask &= (
+            df["商品名"].astype("string")
+            .str.contains(spec["name_contains"], case=False, regex=False, na=False)
+            .to_numpy(dtype=bool)
+        )
+    if spec["product_ids"] and "商品ID" in df.columns:
+        mask &= df["商品ID"].astype("string").isin(spec["product_ids"]).to_numpy(dtype=bool)
+    if (spec["date_from"] or spec["date_to"]) and "更新日" in df.columns:
+        dates = pd.to_datetime(df["更新日"], errors="coerce")
+        if spec["date_from"]:
+            mask &= (dates >= spec["date_from"]).to_numpy(dtype=bool)
+        if spec["date_to"]:
+            mask &= (dates <= spec["date_to"]).to_numpy(dtype=bool)
+    return mask
+
+
+def run_query(df, spec, location_mask=None):
+    """クエリ仕様を DataFrame に対して実行する
+
+    location_mask に LocationIndex.mask を渡すと、ロケーション条件は事前計算済みの
+    行位置から組み立てる。
+    """
+    mask = query_mask(df, spec, location_mask)
+    matched = df[mask]
+    stock_total = int(matched["在庫数"].sum()) if "在庫数" in matched.columns else 0
+    ascending = spec["sort"] == "asc"
+    limit = spec["limit"]
+    metric = spec["metric"]
+    group = spec["group_by"] if spec["group_by"] in matched.columns else None
+
+    if group:
+        grouped = matched.groupby(group, observed=True)
+        if metric in ("rows", "count"):
+            table = grouped.size().rename("件数")
+        else:
+            table = grouped["在庫数"].agg(metric).rename(f"在庫数（{metric}）")
+        table = table.sort_values(ascending=ascending).reset_index()
+        return QueryResult(spec, table.head(limit), len(matched), stock_total, len(table))
+
+    if metric == "rows":
+        if "在庫数" in matched.columns:
+            matched = matched.sort_values("在庫数", ascending=ascending, kind="stable")
+        return QueryResult(spec, matched.head(limit), len(matched), stock_total)
+
+    if metric == "count":
+        value = len(matched)
+    elif "在庫数" in matched.columns and len(matched):
+        value = float(matched["在庫数"].agg(metric))
+    else:
+        value = None
+    table = pd.DataFrame({"集計": [metric], "値": [value]})
+    return QueryResult(spec, table, len(matched), stock_total)
+
+
+def describe_spec(spec):
+    """クエリ仕様を日本語で表示"""
+    parts = []
+    if spec["locations"]:
+        parts.append("ロケーション: " + "・".join(spec["locations"]))
+    if spec["stock"]:
+        parts.append(f"在庫数 {spec['stock']['op']} {spec['stock']['value']:g}")
+    if spec["name_contains"]:
+        parts.append(f"商品名に「{spec['name_contains']}」を含む")
+    if spec["product_ids"]:
+        parts.append("商品ID: " + "・".join(spec["product_ids"]))
+    if spec["date_from"] or spec["date_to"]:
+        parts.append(f"更新日: {spec['date_from'] or ''}〜{spec['date_to'] or ''}")
+    if spec["group_by"]:
+        parts.append(f"{spec['group_by']}別")
+    parts.append(f"集計: {spec['metric']}")
+    return " / ".join(parts)
+
+
+def compact_result(result, max_rows=MAX_RESULT_ROWS):
+    """LLM に渡す結果の要約（行数の上限つき CSV）"""
+    table = result.table.head(max_rows).copy()
+    for col in table.columns:
+        if pd.api.types.is_datetime64_any_dtype(table[col]):
+            table[col] = table[col].dt.strftime("%Y-%m-%d")
+    lines = [
+        f"条件: {describe_spec(result.spec)}",
+        f"該当行数: {result.matched_rows} / 該当在庫合計: {result.matched_stock}",
+    ]
+    if result.total_groups:
+        lines.append(f"グループ数: {result.total_groups}（上位{len(table)}件を表示）")
+    elif result.spec["metric"] == "rows" and result.matched_rows > len(table):
+        lines.append(f"（先頭{len(table)}行のみ）")
+    lines.append(table.to_csv(index=False).strip())
+    return "\n".join(lines)
+
+
+def answer_messages(question, result):
+    """回答文を作るためのメッセージ（元データではなく集計結果だけを含む）"""
+    return [
+        {"role": "system", "content": _ANSWER_PROMPT},
+        {"role": "user", "content": f"質問: {question}\n\n集計結果:\n{compact_result(result)}"},
+    ]
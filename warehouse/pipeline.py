@@ -0,0 +1,258 @@
+# pipeline.py - 在庫分析パイプライン（Streamlit なしで実行できる部分）
+#
+# app.py と同じ処理（読み込み・列名正規化・型変換・KPI・ロケーション別/日別集計）を
+# 関数として提供し、夜間エクスポートのフォルダを cron から処理する CLI も持つ。
+#
+#   python -m warehouse.pipeline /exports/nightly --out reports
+#   python -m warehouse.pipeline "/exports/**/*.csv" --out reports --format parquet --threshold 5
+#
+# Streamlit・Plotly は読み込まない。openpyxl は Excel ファイルを読むときだけ pandas が読み込む。
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from warehouse.batch import expand_pattern
+from warehouse.loader import prepare_inventory, read_inventory
+from warehouse.location_index import LocationIndex
+from warehouse.table_view import low_stock_mask
+
+# 在庫不足判定のしきい値（app.py の初期値と同じ）
+LOW_STOCK_THRESHOLD = 10
+
+OUTPUT_FORMATS = ("csv", "parquet")
+
+# 在庫不足レポートに含める列
+LOW_STOCK_COLUMNS = ["商品ID", "商品名", "ロケーション", "在庫数", "更新日"]
+
+
+def compute_kpis(df, threshold):
+    """総商品数・総在庫数・在庫不足品目（在庫数列がなければ在庫は 0 扱い）"""
+    if "在庫数" not in df.columns:
+        return len(df), 0, 0
+    return len(df), int(df["在庫数"].sum()), int(low_stock_mask(df, threshold).sum())
+
+
+def low_stock_report(df, threshold):
+    """在庫数がしきい値未満の行（在庫の少ない順）"""
+    columns = [c for c in LOW_STOCK_COLUMNS if c in df.columns]
+    rows = np.flatnonzero(low_stock_mask(df, threshold))
+    report = df.iloc[rows][columns]
+    if "在庫数" in columns:
+        report = report.sort_values("在庫数", kind="stable")
+    return report.reset_index(drop=True)
+
+
+@dataclass
+class Report:
+    """1データセット分の分析結果"""
+    name: str
+    kpis: dict
+    low_stock: pd.DataFrame
+    location_totals: pd.DataFrame
+    daily_totals: pd.DataFrame
+    notes: dict = field(default_factory=dict)
+
+    def tables(self):
+        """書き出す表（ファイル名の接尾辞 -> DataFrame）"""
+        return {
+            "low_stock": self.low_stock,
+            "location_totals": self.location_totals,
+            "daily_totals": self.daily_totals,
+        }
+
+
+def analyze(result, threshold=LOW_STOCK_THRESHOLD, name=""):
+    """取り込み済みデータ（LoadResult）から KPI・在庫不足・集計表を作る"""
+    df = result.df
+    index = result.extras.get("location_index") or LocationIndex(df)
+    total_products, total_stock, low_stock_items = compute_kpis(df, threshold)
+    kpis = {
+        "ファイル": name,
+        "総商品数": total_products,
+        "総在庫数": total_stock,
+        "在庫不足品目": low_stock_items,
+        "ロケーション数": len(index.locations),
+        "しきい値": threshold,
+    }
+    return Report(
+        name=name,
+        kpis=kpis,
+        low_stock=low_stock_report(df, threshold),
+        location_totals=index.location_totals(),
+        daily_totals=index.daily_totals(),
+        notes=result.notes,
+    )
+
+
+def run_file(path, threshold=LOW_STOCK_THRESHOLD, name=None):
+    """1ファイルを読み込んで分析する（name はレポート上のファイル名。既定はファイル名）"""
+    return analyze(
+        prepare_inventory(read_inventory(path, os.path.basename(path))),
+        threshold,
+        name or os.path.basename(path),
+    )
+
+
+def report_names(paths):
+    """入力パス -> レポート上の名前（入力全体の共通フォルダからの相対パス）
+
+    別のフォルダにある同名ファイルを区別するため、ファイル名ではなく相対パスを使う。
+    """
+    if not paths:
+        return {}
+    absolute = {path: os.path.abspath(path) for path in paths}
+    root = os.path.commonpath([os.path.dirname(a) for a in absolute.values()])
+    return {
+        path: os.path.relpath(a, root).replace(os.sep, "/") for path, a in absolute.items()
+    }
+
+
+def output_stems(names):
+    """レポート上の名前 -> 出力フォルダ名（拡張子を除き、拡張子違いの同名は拡張子を残す）"""
+    stems = {name: os.path.splitext(name)[0] or "inventory" for name in names}
+    counts = Counter(stems.values())
+    return {
+        name: stem if counts[stem] == 1 else f"{stem}_{os.path.splitext(name)[1].lstrip('.')}"
+        for name, stem in stems.items()
+    }
+
+
+def write_table(df, path, fmt):
+    """表を CSV（Excel で開けるよう BOM 付き UTF-8）または Parquet で書き出す"""
+    # 並列のワーカーが同じ一時ファイルを使わないようプロセスIDを付ける
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if fmt == "csv":
+        df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    elif fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    os.replace(tmp, path)
+    return path
+
+
+def write_report(report, out_dir, fmt="csv", stem=None):
+    """ファイルごとの表を out_dir/<stem>/ に書き出し、書いたパスを返す
+
+    stem の既定はレポート上の名前から拡張子を除いたもの（相対パスならフォルダ構成を保つ）。
+    """
+    stem = stem or os.path.splitext(report.name)[0] or "inventory"
+    target = os.path.join(out_dir, *stem.split("/"))
+    os.makedirs(target, exist_ok=True)
+    return [
+        write_table(table, os.path.join(target, f"{suffix}.{fmt}"), fmt)
+        for suffix, table in report.tables().items()
+    ]
+
+
+def process_file(path, out_dir, fmt="csv", threshold=LOW_STOCK_THRESHOLD, name=None, stem=None):
+    """1ファイル分の処理と書き出し（ワーカープロセスで実行し、KPI の行を返す）"""
+    start = time.perf_counter()
+    report = run_file(path, threshold, name)
+    write_report(report, out_dir, fmt, stem)
+    return dict(report.kpis, 秒=round(time.perf_counter() - start, 3))
+
+
+def process_files(paths, out_dir, fmt="csv", threshold=LOW_STOCK_THRESHOLD, workers=None,
+                  progress=None):
+    """複数ファイルを並列に処理し、KPI サマリーとエラーの一覧を返す
+
+    出力は out_dir/<共通フォルダからの相対パス>/ に書き、サマリーのファイル列も相対パスにする。
+
+    progress を渡すと1ファイル終わるごとに progress(パス, KPI の行またはNone, 例外またはNone) を呼ぶ。
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    names = report_names(paths)
+    stems = output_stems(names.values())
+    rows, errors = {}, {}
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+
+    def done(path, row, error):
+        if error is None:
+            rows[path] = row
+        else:
+            errors[path] = f"{type(error).__name__}: {error}"
+        if progress is not None:
+            progress(path, row, error)
+
+    if workers == 1:
+        for path in paths:
+            try:
+                done(path, process_file(
+                    path, out_dir, fmt, threshold, names[path], stems[names[path]]
+                ), None)
+            except Exception as e:
+                done(path, None, e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    process_file, path, out_dir, fmt, threshold, names[path], stems[names[path]]
+                ): path
+                for path in paths
+            }
+            for future in as_completed(futures):
+                error = future.exception()
+                done(futures[future], None if error else future.result(), error)
+
+    # サマリーは入力順に並べる
+    summary = pd.DataFrame([rows[p] for p in paths if p in rows])
+    return summary, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="在庫ファイルを一括で分析し、KPI・在庫不足・集計表を書き出す"
+    )
+    parser.add_argument("inputs", nargs="+", help="ファイル・フォルダ・glob パターン")
+    parser.add_argument("--out", default="reports", help="出力先フォルダ")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument("--threshold", type=int, default=LOW_STOCK_THRESHOLD,
+                        help="在庫不足判定しきい値")
+    parser.add_argument("--workers", type=int, help="並列数（既定は CPU 数）")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.inputs:
+        if os.path.isfile(pattern):
+            paths.append(pattern)
+        else:
+            paths.extend(path for _, path in expand_pattern(pattern))
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        print("対象のファイルがありません", file=sys.stderr)
+        return 2
+
+    def progress(path, row, error):
+        if error is None:
+            print(f"✅ {path}: {row['総商品数']:,}行 / 在庫不足 {row['在庫不足品目']:,}件 ({row['秒']:.2f}秒)",
+                  file=sys.stderr)
+        else:
+            print(f"❌ {path}: {error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    summary, errors = process_files(
+        paths, args.out, args.format, args.threshold, args.workers, progress
+    )
+    if len(summary):
+        summary.insert(0, "作成日時", datetime.now().isoformat(timespec="seconds"))
+        summary_path = write_table(
+            summary, os.path.join(args.out, f"kpi_summary.{args.format}"), args.format
+        )
+        print(summary_path)
+    print(f"{len(summary)}/{len(paths)}ファイル / {time.perf_counter() - start:.2f}秒", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# profiling.py - 処理段階ごとの時間・メモリ・スループットの計測
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+# セッションごとに保持する実行回数
+MAX_RUNS = 20
+
+
+@dataclass
+class Span:
+    """1段階分の計測結果"""
+    name: str
+    start: float
+    seconds: float
+    rows: int = None
+    peak_bytes: int = None
+
+    @property
+    def rows_per_sec(self):
+        if not self.rows or self.seconds <= 0:
+            return None
+        return self.rows / self.seconds
+
+
+class Profiler:
+    """1回のスクリプト実行（再実行1回分）の計測
+
+    enabled=False のときは span() が何もしないため、計測コードを残したままでよい。
+    trace_memory=True なら tracemalloc で段階ごとのピークメモリも記録する
+    （tracemalloc はプロセス全体に効くため、他のセッションも遅くなる）。
+    """
+
+    def __init__(self, enabled=True, trace_memory=False, label=""):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.label = label
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.origin = time.perf_counter()
+        self.spans = []
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name, rows=None):
+        """with 文で囲んだ区間を計測する"""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, rows)
+
+    @contextmanager
+    def _span(self, name, rows):
+        base = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        span = Span(name, start - self.origin, 0.0, rows)
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            if base is not None:
+                span.peak_bytes = tracemalloc.get_traced_memory()[1] - base
+            self.spans.append(span)
+
+    def add(self, name, seconds, rows=None):
+        """別の場所で計測済みの区間を追加（取り込み処理の内訳など）"""
+        if self.enabled:
+            self.spans.append(
+                Span(name, time.perf_counter() - self.origin - seconds, seconds, rows)
+            )
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "total_sec": round(time.perf_counter() - self.origin, 6),
+            "spans": [
+                dict(asdict(span), rows_per_sec=span.rows_per_sec)
+                for span in self.spans
+            ],
+        }
+
+
+def stop_memory_tracing():
+    """tracemalloc を止める（計測をやめたとき用）"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def runs_to_json(runs):
+    """計測結果（Profiler.to_dict() のリスト）を JSON 文字列に"""
+    return json.dumps(runs, ensure_ascii=False, indent=2)
+
+
+def runs_to_chrome_trace(runs):
+    """Chrome のトレースビューア（chrome://tracing / Perfetto）で開ける形式に変換
+
+    実行ごとに tid を分け、開始時刻は実行の開始時刻を基準に並べる。
+    """
+    events = []
+    offset = 0.0
+    pid = os.getpid()
+    for tid, run in enumerate(runs, 1):
+        events.append({
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+            "args": {"name": f"{run['started_at']} {run.get('label', '')}".strip()},
+        })
+        for span in run["spans"]:
+            events.append({
+                "name": span["name"],
+                "ph": "X",
+                "pid": pid,
+                "tid": tid,
+                "ts": round((offset + span["start"]) * 1e6),
+                "dur": round(span["seconds"] * 1e6),
+                "args": {
+                    key: span[key]
+                    for key in ("rows", "rows_per_sec", "peak_bytes")
+                    if span.get(key) is not None
+                },
+            })
+        offset += run["total_sec"]
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+
+class ProfileStore:
+    """直近の計測結果（セッション単位で st.session_state に置く）"""
+
+    def __init__(self, max_runs=MAX_RUNS):
+        self.max_runs = max_runs
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler):
+        if not profiler.enabled:
+            return
+        with self._lock:
+            self.runs.append(profiler.to_dict())
+            del self.runs[: -self.max_runs]
+
+    def clear(self):
+        with self._lock:
+            self.runs.clear()
@@ -0,0 +1,179 @@
+# reorder.py - 更新日の履歴からの消費ペース推定と発注点判定
+#
+# 商品ID × ロケーション ごとに在庫数の履歴を並べ、在庫が減った量を消費とみなして
+# 直近 window 日の消費ペース（1日あたり）を求める。並べ替え・差分・累積和・二分探索だけで
+# 計算するため、Python のループなしで数百万行を処理できる。
+# 消費ペースはデータセットごとに一度だけ計算し（LoadResult.extras）、しきい値の変更では再計算しない。
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# 消費ペースを求める期間（日）
+DEFAULT_WINDOW_DAYS = 14
+
+# 在庫が何日分を切ったら発注するか（ロケーション・商品IDごとに上書きできる）
+DEFAULT_THRESHOLD_DAYS = 7
+
+# しきい値の何倍までを「注意」とするか
+WATCH_FACTOR = 1.5
+
+STATUS_LABELS = ["欠品", "要発注", "注意", "OK", "履歴不足"]
+STOCKOUT, REORDER, WATCH, OK, NO_HISTORY = range(len(STATUS_LABELS))
+
+
+def rolling_consumption(group, day, stock, window):
+    """グループ・日付順に並んだ在庫履歴から、各行時点の直近 window 日の消費ペースを求める
+
+    group・day（整数の日）・stock は group, day の順に並べ替え済みで、同じ日は1行にまとめてあること。
+    在庫の減少を消費とみなし（入荷による増加は数えない）、
+    消費量の合計を観測できた日数（最大 window 日）で割る。履歴が1日分しかない行は NaN。
+    """
+    n = len(group)
+    if n == 0:
+        return np.empty(0)
+    same = np.zeros(n, dtype=bool)
+    same[1:] = group[1:] == group[:-1]
+    drop = np.zeros(n)
+    drop[1:] = np.maximum(stock[:-1] - stock[1:], 0)
+    drop[~same] = 0
+    cumulative = np.concatenate([[0.0], np.cumsum(drop)])
+
+    # グループと日付を1つの整数キーにして、窓の開始行を二分探索で求める
+    span = int(day.max() - day.min()) + window + 1
+    key = group.astype(np.int64) * span + (day - day.min())
+    start = np.searchsorted(key, key - window + 1, side="left")
+    first = np.searchsorted(group, group, side="left")
+    # 窓の最初の行の減少は窓の外の日からの変化を含むため、観測日数は窓の1つ前の行から数える
+    observed = day - day[np.maximum(start - 1, first)]
+    consumed = cumulative[1:] - cumulative[start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(observed > 0, consumed / np.maximum(observed, 1), np.nan)
+    return rate
+
+
+@dataclass
+class Thresholds:
+    """発注のしきい値（在庫日数）。商品IDの指定 > ロケーションの指定 > 既定値 の順に使う"""
+    default_days: float = DEFAULT_THRESHOLD_DAYS
+    by_location: dict = field(default_factory=dict)
+    by_sku: dict = field(default_factory=dict)
+
+    def resolve(self, sku_codes, skus, loc_codes, locs):
+        """行ごとのしきい値（日）を求める
+
+        指定は種類ごとの表（商品ID・ロケーションの番号 -> 日数）にしてから行の番号で引くため、
+        行数に比例する処理は配列の参照だけになる。
+        """
+        days = np.full(len(sku_codes), float(self.default_days))
+        for codes, values, overrides in ((loc_codes, locs, self.by_location), (sku_codes, skus, self.by_sku)):
+            if not overrides:
+                continue
+            table = np.full(len(values) + 1, np.nan)
+            positions = pd.Index(values).get_indexer(list(overrides))
+            found = positions >= 0
+            table[positions[found]] = np.asarray(list(overrides.values()), dtype="float64")[found]
+            mapped = table[codes]
+            days = np.where(np.isnan(mapped), days, mapped)
+        return days
+
+
+class ReorderModel:
+    """商品ID × ロケーション ごとの現在庫と消費ペース（データセットごとに一度だけ作る）"""
+
+    def __init__(self, df, window=DEFAULT_WINDOW_DAYS):
+        self.window = window
+        self.skus = self.locs = pd.Index([])
+        self.sku_codes = self.loc_codes = np.empty(0, dtype=np.int64)
+        self.summary = pd.DataFrame(
+            columns=["商品ID", "ロケーション", "在庫数", "最終更新日", "日次消費", "観測日数"]
+        )
+        required = {"商品ID", "ロケーション", "在庫数", "更新日"}
+        if not required <= set(df.columns) or not pd.api.types.is_datetime64_any_dtype(df["更新日"]):
+            return
+
+        # カテゴリ型・Arrow 文字列型のまま番号を振る（欠損は -1）
+        sku_codes, skus = pd.factorize(df["商品ID"])
+        loc_codes, locs = pd.factorize(df["ロケーション"])
+        dates = df["更新日"].to_numpy(dtype="datetime64[D]")
+        valid = ~np.isnat(dates) & (sku_codes >= 0) & (loc_codes >= 0)
+        if not valid.any():
+            return
+        sku_codes, loc_codes = sku_codes[valid], loc_codes[valid]
+        day = dates[valid].astype(np.int64)
+        stock = df["在庫数"].to_numpy(dtype="float64", na_value=0)[valid]
+
+        # 商品ID × ロケーション の番号を振り、グループ・日付順に並べる
+        pair = sku_codes.astype(np.int64) * max(len(locs), 1) + loc_codes
+        group, pairs = pd.factorize(pair)
+        order = np.lexsort((day, group))
+        group, day, stock = group[order], day[order], stock[order]
+
+        # 同じ日に複数行ある場合（複数ファイルの重複など）は後の行の在庫数を使う
+        ends = np.ones(len(day), dtype=bool)
+        ends[:-1] = (group[1:] != group[:-1]) | (day[1:] != day[:-1])
+        group, day, stock = group[ends], day[ends], stock[ends]
+
+        rate = rolling_consumption(group, day, stock, window)
+        last = np.flatnonzero(np.r_[group[1:] != group[:-1], True])
+        first = np.searchsorted(group, group[last], side="left")
+        pairs = np.asarray(pairs)[group[last]]
+        self.skus, self.locs = skus, locs
+        self.sku_codes = pairs // max(len(locs), 1)
+        self.loc_codes = pairs % max(len(locs), 1)
+        self.summary = pd.DataFrame({
+            "商品ID": skus.take(self.sku_codes),
+            "ロケーション": locs.take(self.loc_codes),
+            "在庫数": stock[last],
+            "最終更新日": day[last].astype("datetime64[D]"),
+            "日次消費": rate[last],
+            "観測日数": day[last] - day[first],
+        })
+
+    def __len__(self):
+        return len(self.summary)
+
+    def evaluate(self, thresholds=None, locations=None):
+        """しきい値で判定した一覧（在庫日数の短い順）
+
+        在庫日数 = 在庫数 / 日次消費、発注点 = 日次消費 × しきい値（日）。
+        """
+        thresholds = thresholds or Thresholds()
+        summary, sku_codes, loc_codes = self.summary, self.sku_codes, self.loc_codes
+        if locations is not None:
+            rows = np.isin(loc_codes, pd.Index(self.locs).get_indexer(list(locations)))
+            summary, sku_codes, loc_codes = summary[rows], sku_codes[rows], loc_codes[rows]
+
+        stock = summary["在庫数"].to_numpy(dtype="float64")
+        rate = summary["日次消費"].to_numpy(dtype="float64")
+        days = thresholds.resolve(sku_codes, self.skus, loc_codes, self.locs)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cover = np.where(rate > 0, stock / rate, np.where(np.isnan(rate), np.nan, np.inf))
+
+        status = np.select(
+            [stock <= 0, np.isnan(cover), cover <= days, cover <= days * WATCH_FACTOR],
+            [STOCKOUT, NO_HISTORY, REORDER, WATCH],
+            default=OK,
+        )
+        result = summary.assign(
+            在庫日数=np.round(cover, 1),
+            しきい値日数=days,
+            発注点=np.ceil(rate * days),
+            状態=pd.Categorical.from_codes(status, categories=STATUS_LABELS),
+        )
+        order = np.lexsort((cover, status))
+        return result.iloc[order].reset_index(drop=True)
+
+
+def status_counts(evaluated):
+    """状態ごとの件数（全ての状態を含む）"""
+    return evaluated["状態"].value_counts(sort=False).reindex(STATUS_LABELS, fill_value=0)
+
+
+def reorder_model_for(result, window=DEFAULT_WINDOW_DAYS):
+    """LoadResult に紐づく ReorderModel（期間ごとに初回だけ作成）"""
+    models = result.extras.setdefault("reorder_models", {})
+    model = models.get(window)
+    if model is None:
+        model = models[window] = ReorderModel(result.df, window)
+    return model
@@ -0,0 +1,180 @@
+# rollups.py - 日別在庫推移のロールアップ（日次・週次・月次の事前集計）
+import pandas as pd
+
+# 粒度ごとの表示名
+GRAINS = {"day": "日次", "week": "週次", "month": "月次"}
+
+# グラフに描く点数の上限（自動選択時はこれに収まる最も細かい粒度を選ぶ）
+MAX_POINTS = 400
+
+# ロケーション全体の集計行を表すロケーション値
+ALL_LOCATIONS = ""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    day TEXT NOT NULL,
+    location TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (day, location)
+);
+CREATE TABLE IF NOT EXISTS rollup_bucket (
+    grain TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    location TEXT NOT NULL,
+    avg REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    days INTEGER NOT NULL,
+    PRIMARY KEY (grain, bucket, location)
+);
+"""
+
+
+def bucket_start(day, grain):
+    """日付が属する週（月曜始まり）・月の開始日"""
+    day = pd.Timestamp(day).normalize()
+    if grain == "week":
+        return day - pd.Timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _bucket_end(start, grain):
+    if grain == "week":
+        return start + pd.Timedelta(days=7)
+    if grain == "month":
+        return start + pd.offsets.MonthBegin(1)
+    return start + pd.Timedelta(days=1)
+
+
+def _fmt(day):
+    return pd.Timestamp(day).strftime("%Y-%m-%d")
+
+
+def ensure_schema(store):
+    store.connection().executescript(_SCHEMA)
+
+
+def update_rollups(store, daily):
+    """日付 × ロケーションの在庫合計表を取り込み、影響する週・月だけ再集計する
+
+    daily は LocationIndex.daily と同じ形（行: 更新日, 列: ロケーション）。
+    同じ日・ロケーションの値は新しく取り込んだ側で置き換える。
+    """
+    if daily is None or daily.empty:
+        return 0
+
+    ensure_schema(store)
+    days = pd.to_datetime(daily.index).normalize()
+    daily = daily.groupby(days).sum()
+    rows = [
+        (_fmt(day), str(loc), float(total))
+        for loc in daily.columns
+        for day, total in daily[loc].items()
+    ]
+
+    affected = {
+        grain: sorted({bucket_start(day, grain) for day in daily.index})
+        for grain in ("week", "month")
+    }
+
+    with store.write_lock():
+        conn = store.connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rollup_daily (day, location, total) VALUES (?, ?, ?)",
+                rows,
+            )
+            for grain, starts in affected.items():
+                for start in starts:
+                    params = (grain, _fmt(start), _fmt(start), _fmt(_bucket_end(start, grain)))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO rollup_bucket "
+                        "SELECT ?, ?, location, AVG(total), MIN(total), MAX(total), COUNT(*) "
+                        "FROM rollup_daily WHERE day >= ? AND day < ? GROUP BY location",
+                        params,
+                    )
+                    # 全ロケーション合計は日ごとに合算してから集計（帯も正確）
+                    conn.execute(
+                        "INSERT OR REPLACE INTO rollup_bucket "
+                        f"SELECT ?, ?, '{ALL_LOCATIONS}', AVG(t), MIN(t), MAX(t), COUNT(*) "
+                        "FROM (SELECT day, SUM(total) AS t FROM rollup_daily "
+                        "WHERE day >= ? AND day < ? GROUP BY day)",
+                        params,
+                    )
+    return len(rows)
+
+
+def rollup_range(store):
+    """ロールアップに記録されている期間（最初の日, 最後の日）"""
+    ensure_schema(store)
+    first, last = store.connection().execute(
+        "SELECT MIN(day), MAX(day) FROM rollup_daily"
+    ).fetchone()
+    if first is None:
+        return None
+    return pd.Timestamp(first), pd.Timestamp(last)
+
+
+def rollup_locations(store):
+    ensure_schema(store)
+    rows = store.connection().execute(
+        "SELECT DISTINCT location FROM rollup_daily ORDER BY 1"
+    ).fetchall()
+    return [loc for (loc,) in rows]
+
+
+def choose_grain(start, end, max_points=MAX_POINTS):
+    """点数が上限に収まる最も細かい粒度"""
+    n_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    if n_days <= max_points:
+        return "day"
+    if n_days / 7 <= max_points:
+        return "week"
+    return "month"
+
+
+def query_rollup(store, grain, start, end, locations=None):
+    """期間・ロケーションを指定してロールアップを取得
+
+    戻り値の列: 更新日（バケット開始日）, 在庫数（平均）, 最小, 最大。
+    一部のロケーションだけを選んだ週次・月次の帯は、各ロケーションの
+    最小・最大の合計（実際の範囲を包む概算）になる。
+    """
+    ensure_schema(store)
+    conn = store.connection()
+    columns = ["更新日", "在庫数", "最小", "最大"]
+    all_locations = locations is None or set(rollup_locations(store)) <= set(locations)
+
+    if grain == "day":
+        params = [_fmt(start), _fmt(end)]
+        where = "day >= ? AND day <= ?"
+        if not all_locations:
+            clause, location_params = store.location_filter("location", locations)
+            where += f" AND {clause}"
+            params.extend(location_params)
+        rows = conn.execute(
+            f"SELECT day, SUM(total), SUM(total), SUM(total) FROM rollup_daily "
+            f"WHERE {where} GROUP BY day ORDER BY day",
+            params,
+        ).fetchall()
+    else:
+        params = [grain, _fmt(bucket_start(start, grain)), _fmt(end)]
+        where = "grain = ? AND bucket >= ? AND bucket <= ?"
+        if all_locations:
+            where += " AND location = ?"
+            params.append(ALL_LOCATIONS)
+        else:
+            clause, location_params = store.location_filter("location", locations)
+            where += f" AND {clause}"
+            params.extend(location_params)
+        rows = conn.execute(
+            f"SELECT bucket, SUM(avg), SUM(min), SUM(max) FROM rollup_bucket "
+            f"WHERE {where} GROUP BY bucket ORDER BY bucket",
+            params,
+        ).fetchall()
+
+    result = pd.DataFrame(rows, columns=columns)
+    result["更新日"] = pd.to_datetime(result["更新日"])
+    return result
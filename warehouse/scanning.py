@@ -0,0 +1,332 @@
+# scanning.py - バーコード/QR の読み取りと商品IDの照合・在庫調整の一括反映
+#
+# 画像のデコードはワーカースレッドで行い（OpenCV / zbar は処理中に GIL を解放する）、
+# 読み取ったコードはデータセットごとに一度だけ作るハッシュ索引で O(1) に照合する。
+# 在庫の増減はバッファにため、件数または経過時間でまとめて共有DBに書き込む。
+#
+# 記録済みの画像でデコードと照合を確認できる（tests/fixtures/scans にテスト用の画像がある）:
+#   python -m warehouse.scanning tests/fixtures/scans/*.png --inventory data.csv
+import argparse
+import atexit
+import io
+import os
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+
+from warehouse import delta
+
+# デコード用ワーカー数
+DECODE_WORKERS = int(os.getenv("WAREHOUSE_SCAN_WORKERS", "2"))
+
+# 在庫調整をまとめて書き込む件数・間隔（秒）
+FLUSH_BATCH_SIZE = 20
+FLUSH_INTERVAL = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_adjustments (
+    time TEXT NOT NULL,
+    code TEXT NOT NULL,
+    location TEXT,
+    delta REAL NOT NULL,
+    user TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_adjustments_code ON stock_adjustments (code, time);
+"""
+
+
+def normalize_code(code):
+    """スキャナーごとの揺れ（全角・前後の空白・改行）を吸収"""
+    return unicodedata.normalize("NFKC", str(code)).strip()
+
+
+# --- デコード ---------------------------------------------------------------
+
+def _to_gray(image):
+    """画像（バイト列・パス・配列）をグレースケールの numpy 配列に"""
+    if isinstance(image, np.ndarray):
+        array = image
+    else:
+        from PIL import Image
+
+        source = image if isinstance(image, str) else io.BytesIO(image)
+        with Image.open(source) as img:
+            array = np.asarray(img.convert("L"))
+    if array.ndim == 3:
+        array = array.mean(axis=2).astype(np.uint8)
+    return array
+
+
+def _decode_opencv(gray):
+    import cv2
+
+    codes = []
+    ok, texts, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(gray)
+    if ok:
+        codes.extend(t for t in texts if t)
+    if hasattr(cv2, "barcode"):
+        texts = cv2.barcode.BarcodeDetector().detectAndDecode(gray)[0]
+        if isinstance(texts, str):
+            texts = [texts]
+        codes.extend(t for t in texts if t)
+    return codes
+
+
+def _decode_zbar(gray):
+    from pyzbar.pyzbar import decode
+
+    return [symbol.data.decode("utf-8", "replace") for symbol in decode(gray)]
+
+
+def decode_image(image):
+    """画像に写っているバーコード/QR を読み取る（重複は除く）
+
+    OpenCV があれば OpenCV、なければ pyzbar を使う。どちらも無ければ ModuleNotFoundError。
+    """
+    gray = _to_gray(image)
+    try:
+        codes = _decode_opencv(gray)
+    except ModuleNotFoundError:
+        codes = _decode_zbar(gray)
+    return list(dict.fromkeys(normalize_code(c) for c in codes))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="scan-decode")
+        return _pool
+
+
+def submit_decode(image):
+    """デコードをワーカーに投げる（戻り値は Future）"""
+    return _get_pool().submit(decode_image, image)
+
+
+def decode_many(images):
+    """複数画像をワーカーで並列にデコード（入力順の結果リスト）"""
+    return list(_get_pool().map(decode_image, images))
+
+
+# --- 商品IDの索引 -----------------------------------------------------------
+
+@dataclass
+class ScanHit:
+    """照合結果（同じ商品IDが複数ロケーションにあれば行ごとに持つ）"""
+    code: str
+    rows: list
+
+    @property
+    def found(self):
+        return bool(self.rows)
+
+
+class SkuIndex:
+    """商品ID -> 行位置 のハッシュ索引（データセットごとに一度だけ作る）"""
+
+    def __init__(self, df):
+        self.df = df
+        self.positions = {}
+        if "商品ID" not in df.columns:
+            return
+        codes = df["商品ID"].astype("string").fillna("").map(normalize_code)
+        groups = codes.groupby(codes.to_numpy(), sort=False).indices
+        self.positions = {code: pos for code, pos in groups.items() if code}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def lookup(self, code):
+        """読み取ったコードを商品に照合する"""
+        code = normalize_code(code)
+        pos = self.positions.get(code)
+        if pos is None:
+            return ScanHit(code, [])
+        columns = [c for c in ("商品ID", "商品名", "ロケーション", "在庫数") if c in self.df.columns]
+        return ScanHit(code, self.df.iloc[pos][columns].to_dict("records"))
+
+
+def sku_index_for(result):
+    """LoadResult に紐づく SkuIndex（初回だけ作成）"""
+    index = result.extras.get("sku_index")
+    if index is None:
+        index = result.extras["sku_index"] = SkuIndex(result.df)
+    return index
+
+
+# --- 在庫調整の一括書き込み ---------------------------------------------------
+
+def ensure_schema(store):
+    delta.ensure_schema(store)
+    store.connection().executescript(_SCHEMA)
+
+
+def apply_adjustments(store, adjustments):
+    """在庫調整をまとめて書き込む
+
+    調整履歴に追加し、差分取り込みの現在庫（current_inventory）と
+    ロケーション別合計にも同じ増減を反映する。ロケーション別合計は
+    current_inventory の行を実際に更新できた調整の分だけ増減させる
+    （未登録のコードで合計だけがずれないように）。
+    更新した行は行ハッシュを求め直し、差分の反映履歴にも記録するため、
+    同じファイルを取り込み直すとファイルの値に戻る。推移ロールアップも該当日だけ作り直す。
+    """
+    if not adjustments:
+        return 0
+    ensure_schema(store)
+    rows = [(a["time"], a["code"], a["location"], a["delta"], a.get("user")) for a in adjustments]
+
+    with store.write_lock():
+        conn = store.connection()
+        with conn:
+            conn.executemany("INSERT INTO stock_adjustments VALUES (?, ?, ?, ?, ?)", rows)
+            totals = {}
+            keys = []
+            for a in adjustments:
+                changed = conn.execute(
+                    'UPDATE current_inventory SET "在庫数" = COALESCE("在庫数", 0) + ? '
+                    'WHERE "商品ID" = ? AND "ロケーション" = ?',
+                    (a["delta"], a["code"], a["location"]),
+                ).rowcount
+                if changed:
+                    totals[a["location"]] = totals.get(a["location"], 0) + a["delta"] * changed
+                    keys.append((a["code"], a["location"]))
+            conn.executemany(
+                "UPDATE current_location_totals SET stock = stock + ? WHERE location = ?",
+                [(total, loc) for loc, total in totals.items()],
+            )
+            days = delta.rehash_rows(conn, keys)
+            if keys:
+                # 最後に反映したデータセットを調整に置き換え、同じファイルの再取り込みを止めない
+                conn.execute(
+                    "INSERT INTO delta_log VALUES (?, ?, ?, 0, ?, 0, 0)",
+                    (f"scan:{adjustments[-1]['time']}", "スキャン調整",
+                     datetime.now().isoformat(timespec="seconds"), len(set(keys))),
+                )
+    delta.refresh_rollups(store, days)
+    return len(rows)
+
+
+def current_stock(store, code):
+    """共有DBの現在庫（差分取り込みの状態にスキャンの調整を反映したもの） -> {ロケーション: 在庫数}"""
+    ensure_schema(store)
+    return dict(store.connection().execute(
+        'SELECT "ロケーション", "在庫数" FROM current_inventory WHERE "商品ID" = ?',
+        (normalize_code(code),),
+    ).fetchall())
+
+
+class AdjustmentBuffer:
+    """在庫調整のバッファ（連続スキャンでも1件ずつ書き込まない）"""
+
+    def __init__(self, store, batch_size=FLUSH_BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.flushed = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, code, location, amount, user=None):
+        """調整を追加し、件数か経過時間が上限に達していれば書き込む（書き込んだ件数を返す）"""
+        with self._lock:
+            self.pending.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "code": normalize_code(code),
+                "location": location,
+                "delta": float(amount),
+                "user": user,
+            })
+        return self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = self.pending and (
+                len(self.pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.interval
+            )
+        return self.flush() if due else 0
+
+    def flush(self):
+        with self._lock:
+            batch, self.pending = self.pending, []
+            self._last_flush = time.monotonic()
+        try:
+            written = apply_adjustments(self.store, batch)
+        except Exception:
+            # 書き込めなかった分は次回に持ち越す
+            with self._lock:
+                self.pending[:0] = batch
+            raise
+        self.flushed += written
+        return written
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _flush_at_exit(buffer):
+    """終了時に未反映の調整を書き込む（書き込めなくても終了処理は止めない）"""
+    try:
+        buffer.flush()
+    except Exception:
+        pass
+
+
+def get_adjustment_buffer(store):
+    """プロセス内で共有する在庫調整バッファ（終了時に残りを書き込む）"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.store is not store:
+            _buffer = AdjustmentBuffer(store)
+            atexit.register(_flush_at_exit, _buffer)
+        return _buffer
+
+
+# --- 記録済み画像での確認用 CLI ------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="画像のバーコード/QRを読み取り、在庫データと照合する")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--inventory", help="照合する在庫データ（CSV/Excel）")
+    args = parser.parse_args(argv)
+
+    index = None
+    if args.inventory:
+        from warehouse.loader import prepare_inventory, read_inventory
+
+        df = prepare_inventory(read_inventory(args.inventory, args.inventory)).df
+        index = SkuIndex(df)
+
+    start = time.perf_counter()
+    results = decode_many(args.images)
+    elapsed = time.perf_counter() - start
+    for path, codes in zip(args.images, results):
+        if not codes:
+            print(f"{path}\t(読み取れません)")
+        for code in codes:
+            line = f"{path}\t{code}"
+            if index is not None:
+                hit = index.lookup(code)
+                line += "\t" + (
+                    ", ".join(f"{r.get('商品名')}@{r.get('ロケーション')}" for r in hit.rows)
+                    if hit.found else "(該当なし)"
+                )
+            print(line)
+    print(f"{len(args.images)}枚 / {elapsed:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# snapshots.py - 取り込み済み在庫データの列指向スナップショット（Parquet）
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+# スナップショットの保存先（環境変数で変更可能）
+SNAPSHOT_DIR = Path(os.getenv("WAREHOUSE_SNAPSHOT_DIR", "snapshots"))
+
+# Parquet のスキーマメタデータに格納するキー
+_META_KEY = b"warehouse_snapshot"
+
+
+def _snapshot_path(key, base_dir=None):
+    # キーにはファイル名に使えない文字（"batch:" 等）が含まれうる
+    name = re.sub(r"[^0-9A-Za-z_-]", "_", key)[:24]
+    return Path(base_dir or SNAPSHOT_DIR) / f"{name}.parquet"
+
+
+def find_snapshot(key, base_dir=None):
+    """内容キーに対応するスナップショットのパス（なければ None）"""
+    path = _snapshot_path(key, base_dir)
+    return path if path.exists() else None
+
+
+def discard_snapshot(key, base_dir=None):
+    """内容キーのスナップショットを削除（列の対応をやり直すとき）"""
+    _snapshot_path(key, base_dir).unlink(missing_ok=True)
+
+
+def save_snapshot(df, key, source_name, base_dir=None, renamed=None, notes=None):
+    """列名の対応付け・型変換済みの DataFrame をスナップショットとして保存
+
+    同じ内容（ハッシュ）で同じ列構成のスナップショットが既にあれば書き込まない。
+    列構成が違う場合（以前の保存後に列の対応付けが変わった等）は置き換える。
+    renamed・notes は読み込み時に LoadResult へ復元する。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = _snapshot_path(key, base_dir)
+    if path.exists() and pq.read_schema(path).names == [str(c) for c in df.columns]:
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {
+        "key": key,
+        "source": source_name,
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": len(df),
+        "renamed": renamed or {},
+        "notes": notes or {},
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _META_KEY: json.dumps(meta, ensure_ascii=False, default=str).encode(),
+    })
+    # 書き込み途中のファイルを一覧に出さないよう一時ファイル経由で置き換える
+    tmp_path = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def snapshot_meta(path):
+    """スナップショットのメタデータ（フッターのスキーマのみ読む）"""
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(_META_KEY, b"{}"))
+
+
+def list_snapshots(base_dir=None):
+    """保存済みスナップショットの一覧（新しい順）"""
+    # pyarrow が無い場合は個々のファイルの読み込み失敗ではなく ModuleNotFoundError にする
+    import pyarrow.parquet  # noqa: F401
+
+    base = Path(base_dir or SNAPSHOT_DIR)
+    if not base.exists():
+        return []
+
+    snapshots = []
+    for path in base.glob("*.parquet"):
+        try:
+            # フッターのスキーマのみ読むのでデータ本体には触れない
+            meta = snapshot_meta(path)
+        except Exception:
+            continue
+        meta["path"] = str(path)
+        snapshots.append(meta)
+    snapshots.sort(key=lambda m: m.get("saved_at", ""), reverse=True)
+    return snapshots
+
+
+def load_snapshot(path, columns=None):
+    """スナップショットをメモリマップで読み込む（columns を指定すればその列だけ）"""
+    import pyarrow.parquet as pq
+
+    available = pq.read_schema(path).names
+    selected = [c for c in columns if c in available] if columns else None
+    table = pq.read_table(path, columns=selected, memory_map=True)
+    return table.to_pandas()
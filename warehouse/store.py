@@ -0,0 +1,262 @@
+# store.py - 全セッション共有の在庫データストア（SQLite）
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+# データベースファイルの場所（環境変数で変更可能）
+DB_PATH = os.getenv("WAREHOUSE_DB", "warehouse.db")
+
+# 保持するデータセットの数（超えた分は古いものから削除する。0 なら削除しない）
+MAX_DATASETS = int(os.getenv("WAREHOUSE_DB_MAX_DATASETS", "20"))
+
+# ロケーションの絞り込みをプレースホルダーで渡す上限
+# （超える場合は一時テーブルに入れて SQLite の変数の上限を避ける）
+LOCATION_PARAM_LIMIT = 500
+
+# ストアに保持する列
+STORE_COLUMNS = ["商品ID", "商品名", "在庫数", "ロケーション", "更新日"]
+
+# 一覧の並べ替えに使える列
+SORTABLE_COLUMNS = STORE_COLUMNS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    key TEXT PRIMARY KEY,
+    source TEXT,
+    loaded_at TEXT,
+    rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    dataset TEXT NOT NULL,
+    "商品ID" TEXT,
+    "商品名" TEXT,
+    "在庫数" REAL,
+    "ロケーション" TEXT,
+    "更新日" TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_id
+    ON inventory (dataset, "商品ID");
+CREATE INDEX IF NOT EXISTS idx_inventory_location
+    ON inventory (dataset, "ロケーション", "在庫数");
+CREATE INDEX IF NOT EXISTS idx_inventory_date
+    ON inventory (dataset, "更新日", "ロケーション", "在庫数");
+"""
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _like_pattern(query):
+    """部分一致用の LIKE パターン（% と _ は文字そのものとして扱う。エスケープ文字は !）"""
+    escaped = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+class InventoryStore:
+    """取り込み済みデータセットを保持し、集計をSQLで実行するストア
+
+    接続はスレッドごとに持つ（Streamlit のセッションは別スレッドで動くため）。
+    """
+
+    def __init__(self, path=DB_PATH, max_datasets=MAX_DATASETS):
+        self.path = path
+        self.max_datasets = max_datasets
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def connection(self):
+        """このスレッド用の接続"""
+        return self._connect()
+
+    def write_lock(self):
+        """書き込みを直列化するロック"""
+        return self._write_lock
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, params=()):
+        return self._connect().execute(sql, params).fetchall()
+
+    # --- 取り込み -------------------------------------------------------
+
+    def has_dataset(self, key):
+        return bool(self._query("SELECT 1 FROM datasets WHERE key = ?", (key,)))
+
+    def ingest(self, df, key, source):
+        """データセットを一度だけ取り込む（既にあれば何もしない）
+
+        戻り値は新規に取り込んだかどうか。
+        """
+        if self.has_dataset(key):
+            return False
+
+        rows = pd.DataFrame(
+            {col: df[col] if col in df.columns else None for col in STORE_COLUMNS}
+        )
+        rows["商品ID"] = rows["商品ID"].astype("string")
+        rows["商品名"] = rows["商品名"].astype("string")
+        rows["ロケーション"] = rows["ロケーション"].astype("string")
+        if pd.api.types.is_datetime64_any_dtype(rows["更新日"]):
+            rows["更新日"] = rows["更新日"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        rows.insert(0, "dataset", key)
+
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                if self.has_dataset(key):
+                    return False
+                rows.to_sql("inventory", conn, if_exists="append", index=False, chunksize=50_000)
+                conn.execute(
+                    "INSERT INTO datasets (key, source, loaded_at, rows) VALUES (?, ?, ?, ?)",
+                    (key, source, datetime.now().isoformat(timespec="seconds"), len(rows)),
+                )
+                self._evict(conn, key)
+        return True
+
+    def _evict(self, conn, keep):
+        """保持数を超えた古いデータセットを削除する（取り込んだばかりのものは残す）"""
+        if not self.max_datasets or self.max_datasets < 0:
+            return []
+        stale = [
+            key for (key,) in conn.execute(
+                "SELECT key FROM datasets WHERE key != ? "
+                "ORDER BY loaded_at DESC, rowid DESC LIMIT -1 OFFSET ?",
+                (keep, self.max_datasets - 1),
+            )
+        ]
+        for key in stale:
+            conn.execute("DELETE FROM inventory WHERE dataset = ?", (key,))
+            conn.execute("DELETE FROM datasets WHERE key = ?", (key,))
+        return stale
+
+    def datasets(self):
+        """取り込み済みデータセットの一覧（新しい順）"""
+        return [
+            {"key": key, "source": source, "loaded_at": loaded_at, "rows": rows}
+            for key, source, loaded_at, rows in self._query(
+                "SELECT key, source, loaded_at, rows FROM datasets ORDER BY loaded_at DESC, rowid DESC"
+            )
+        ]
+
+    # --- 集計クエリ -----------------------------------------------------
+
+    def location_filter(self, column, locations):
+        """column がロケーション一覧に含まれる条件 -> (SQL, パラメーター)
+
+        件数が多い場合はこのスレッドの接続の一時テーブルに入れて副問い合わせにする。
+        """
+        locations = list(locations)
+        if len(locations) <= LOCATION_PARAM_LIMIT:
+            return f'{column} IN ({",".join("?" * len(locations))})', locations
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS selected_locations (location TEXT PRIMARY KEY)"
+            )
+            conn.execute("DELETE FROM temp.selected_locations")
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.selected_locations (location) VALUES (?)",
+                ((loc,) for loc in locations),
+            )
+        return f"{column} IN (SELECT location FROM temp.selected_locations)", []
+
+    def _where(self, key, locations=None, query=""):
+        clauses = ["dataset = ?"]
+        params = [key]
+        if locations is not None:
+            clause, location_params = self.location_filter('"ロケーション"', locations)
+            clauses.append(clause)
+            params.extend(location_params)
+        if query:
+            clauses.append('("商品ID" LIKE ? ESCAPE \'!\' OR "商品名" LIKE ? ESCAPE \'!\')')
+            params.extend([_like_pattern(query)] * 2)
+        return " AND ".join(clauses), params
+
+    def locations(self, key):
+        rows = self._query(
+            'SELECT DISTINCT "ロケーション" FROM inventory '
+            'WHERE dataset = ? AND "ロケーション" IS NOT NULL ORDER BY 1',
+            (key,),
+        )
+        return [loc for (loc,) in rows]
+
+    def kpis(self, key, threshold):
+        """総商品数・総在庫数・在庫不足品目"""
+        total, stock, low = self._query(
+            'SELECT COUNT(*), COALESCE(SUM("在庫数"), 0), '
+            'COALESCE(SUM("在庫数" < ?), 0) FROM inventory WHERE dataset = ?',
+            (threshold, key),
+        )[0]
+        return int(total), int(stock), int(low)
+
+    def location_totals(self, key, locations=None):
+        where, params = self._where(key, locations)
+        return pd.DataFrame(
+            self._query(
+                f'SELECT "ロケーション", SUM("在庫数") FROM inventory WHERE {where} '
+                'GROUP BY "ロケーション" ORDER BY "ロケーション"',
+                params,
+            ),
+            columns=["ロケーション", "在庫数"],
+        )
+
+    def daily_totals(self, key, locations=None):
+        where, params = self._where(key, locations)
+        daily = pd.DataFrame(
+            self._query(
+                f'SELECT "更新日", SUM("在庫数") FROM inventory WHERE {where} '
+                'AND "更新日" IS NOT NULL GROUP BY "更新日" ORDER BY "更新日"',
+                params,
+            ),
+            columns=["更新日", "在庫数"],
+        )
+        daily["更新日"] = pd.to_datetime(daily["更新日"])
+        return daily
+
+    def count_rows(self, key, locations=None, query=""):
+        where, params = self._where(key, locations, query)
+        return self._query(f"SELECT COUNT(*) FROM inventory WHERE {where}", params)[0][0]
+
+    def page(self, key, locations=None, query="", sort_by=None, ascending=True,
+             limit=100, offset=0):
+        """一覧表示用に1ページ分だけを取得"""
+        where, params = self._where(key, locations, query)
+        order = "ORDER BY rowid"
+        if sort_by in SORTABLE_COLUMNS:
+            order = f"ORDER BY {_quote(sort_by)} {'ASC' if ascending else 'DESC'}"
+        columns = ", ".join(_quote(c) for c in STORE_COLUMNS)
+        page_df = pd.DataFrame(
+            self._query(
+                f"SELECT {columns} FROM inventory WHERE {where} {order} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ),
+            columns=STORE_COLUMNS,
+        )
+        page_df["更新日"] = pd.to_datetime(page_df["更新日"])
+        return page_df
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=DB_PATH):
+    """プロセス内で共有するストア"""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = InventoryStore(path)
+        return _store
@@ -0,0 +1,148 @@
+# streaming.py - 大容量CSVのチャンク読み込みとKPIの逐次集計
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from warehouse.loader import LRUCache, normalize_column_names
+
+# 1チャンクあたりの行数（ピークメモリはおおよそこの行数分に抑えられる）
+DEFAULT_CHUNKSIZE = 200_000
+
+# 集計に必要な列（商品ID・商品名は件数のみ使うので読み込まない）
+STREAM_COLUMNS = ["在庫数", "ロケーション", "更新日"]
+
+
+@dataclass
+class StreamSummary:
+    """チャンク集計の結果"""
+    total_rows: int = 0
+    total_stock: float = 0.0
+    na_count: int = 0
+    elapsed: float = 0.0
+    renamed: dict = field(default_factory=dict)
+    # 在庫数の値ごとの件数（しきい値が変わっても再スキャン不要にする）
+    stock_counts: pd.Series = field(default_factory=lambda: pd.Series(dtype="float64"))
+    # ロケーション別の在庫合計・件数
+    by_location: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=["在庫数", "件数"], dtype="float64")
+    )
+    # (更新日, ロケーション) 別の在庫合計
+    by_day_location: pd.Series = field(default_factory=lambda: pd.Series(dtype="float64"))
+
+    @property
+    def rows_per_sec(self):
+        return self.total_rows / self.elapsed if self.elapsed else 0.0
+
+    def low_stock_items(self, threshold):
+        """在庫数がしきい値未満の件数"""
+        counts = self.stock_counts
+        return int(counts[counts.index < threshold].sum())
+
+    def location_totals(self, locations=None):
+        """ロケーション別在庫（グラフ用）"""
+        totals = self.by_location["在庫数"]
+        if locations is not None:
+            totals = totals[totals.index.isin(locations)]
+        return totals.rename_axis("ロケーション").reset_index()
+
+    def daily_totals(self, locations=None):
+        """日別在庫推移（グラフ用）"""
+        series = self.by_day_location
+        if series.empty:
+            return pd.DataFrame(columns=["更新日", "在庫数"])
+        if locations is not None:
+            series = series[series.index.get_level_values("ロケーション").isin(locations)]
+        return (
+            series.groupby(level="更新日").sum()
+            .rename("在庫数").sort_index().reset_index()
+        )
+
+
+def _resolve_columns(header):
+    """ヘッダーから 標準列名 -> 元の列名 の対応を作る"""
+    _, renamed = normalize_column_names(pd.DataFrame(columns=header))
+    resolved = {col: col for col in header if col in STREAM_COLUMNS}
+    for raw, std in renamed.items():
+        if std in STREAM_COLUMNS:
+            resolved[std] = raw
+    return resolved, renamed
+
+
+def _accumulate(total, part):
+    """部分集計を累積（初回はそのまま採用してインデックス名を引き継ぐ）"""
+    if total.empty:
+        return part.astype("float64")
+    return total.add(part, fill_value=0)
+
+
+def _fold_chunk(summary, chunk):
+    """1チャンク分の集計値を累積"""
+    stock = pd.to_numeric(chunk["在庫数"], errors="coerce")
+    summary.na_count += int(stock.isna().sum())
+    stock = stock.fillna(0)
+
+    summary.total_rows += len(chunk)
+    summary.total_stock += float(stock.sum())
+    summary.stock_counts = _accumulate(summary.stock_counts, stock.value_counts())
+
+    if "ロケーション" in chunk.columns:
+        loc_agg = stock.groupby(chunk["ロケーション"]).agg(["sum", "count"])
+        loc_agg.columns = ["在庫数", "件数"]
+        summary.by_location = _accumulate(summary.by_location, loc_agg)
+
+        if "更新日" in chunk.columns:
+            day = pd.to_datetime(chunk["更新日"], errors="coerce").dt.normalize()
+            day_agg = stock.groupby([day.rename("更新日"), chunk["ロケーション"]]).sum()
+            summary.by_day_location = _accumulate(summary.by_day_location, day_agg)
+
+
+def stream_csv_summary(source, chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    """CSVをチャンク単位で読み込み、KPIと集計表を逐次計算する
+
+    source はファイルパスまたはファイルオブジェクト。
+    progress を渡すと各チャンク処理後に progress(処理行数, 経過秒) を呼ぶ。
+    """
+    header = pd.read_csv(source, nrows=0).columns.tolist()
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    resolved, renamed = _resolve_columns(header)
+    if "在庫数" not in resolved:
+        raise ValueError("'在庫数'列が見つかりません")
+
+    # 必要な列だけを明示的な型で読み込む（数値変換はチャンクごとに実施）
+    raw_columns = list(resolved.values())
+    to_standard = {raw: std for std, raw in resolved.items()}
+    summary = StreamSummary(renamed=renamed)
+
+    start = time.perf_counter()
+    reader = pd.read_csv(
+        source,
+        usecols=raw_columns,
+        dtype={raw: "string" for raw in raw_columns},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        _fold_chunk(summary, chunk.rename(columns=to_standard))
+        summary.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(summary.total_rows, summary.elapsed)
+
+    return summary
+
+
+_cache = LRUCache(max_entries=4)
+
+
+def stream_csv_summary_cached(key, source, chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    """キー（内容ハッシュやパス+更新時刻）単位で集計結果をキャッシュ
+
+    戻り値は (StreamSummary, キャッシュヒットしたか)。
+    """
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached, True
+    summary = stream_csv_summary(source, chunksize=chunksize, progress=progress)
+    _cache.put(key, summary)
+    return summary, False
@@ -0,0 +1,90 @@
+# table_view.py - 在庫一覧テーブルのページ分割・並べ替え・検索（サーバー側で実施）
+import math
+
+import numpy as np
+import pandas as pd
+
+# 検索対象の列
+SEARCH_COLUMNS = ["商品ID", "商品名"]
+
+LOW_STOCK_STYLE = "background-color:#FFCDD2"
+
+
+def low_stock_mask(df, threshold):
+    """在庫数がしきい値未満の行をベクトル演算で判定"""
+    if "在庫数" not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return (df["在庫数"] < threshold).to_numpy(dtype=bool, na_value=False)
+
+
+def style_low_stock(page_df, mask):
+    """表示ページ分だけ Styler を作り、事前計算したマスクで色付け"""
+    def highlight(frame):
+        styles = pd.DataFrame("", index=frame.index, columns=frame.columns)
+        styles.loc[mask, "在庫数"] = LOW_STOCK_STYLE
+        return styles
+
+    if "在庫数" not in page_df.columns:
+        return page_df.style
+    return page_df.style.apply(highlight, axis=None)
+
+
+class TableView:
+    """データセット全体に対する並べ替え順を保持し、表示ページだけを切り出す"""
+
+    def __init__(self, df):
+        self.df = df
+        self._orders = {}
+
+    def sort_order(self, column, ascending=True):
+        """列ごとの並べ替え順（行位置）をキャッシュして返す"""
+        key = (column, ascending)
+        if key not in self._orders:
+            self._orders[key] = (
+                self.df[column].reset_index(drop=True)
+                .sort_values(ascending=ascending, kind="stable", na_position="last")
+                .index.to_numpy()
+            )
+        return self._orders[key]
+
+    def search_mask(self, query):
+        """商品ID・商品名の部分一致（大文字小文字を区別しない）"""
+        mask = np.zeros(len(self.df), dtype=bool)
+        for col in SEARCH_COLUMNS:
+            if col in self.df.columns:
+                mask |= (
+                    self.df[col].astype("string")
+                    .str.contains(query, case=False, regex=False)
+                    .to_numpy(dtype=bool, na_value=False)
+                )
+        return mask
+
+    def rows(self, row_mask=None, query="", sort_by=None, ascending=True):
+        """条件に合う行の位置を表示順で返す"""
+        mask = np.ones(len(self.df), dtype=bool) if row_mask is None else row_mask
+        if query:
+            mask = mask & self.search_mask(query)
+        if sort_by:
+            order = self.sort_order(sort_by, ascending)
+            return order[mask[order]]
+        return np.flatnonzero(mask)
+
+
+def page_count(total, page_size):
+    """総ページ数（0件でも1ページ）"""
+    return max(1, math.ceil(total / page_size))
+
+
+def page_slice(rows, page, page_size):
+    """指定ページ分の行位置を切り出す"""
+    start = (page - 1) * page_size
+    return rows[start:start + page_size]
+
+
+def table_view_for(result):
+    """データセットごとに TableView を一度だけ作って使い回す"""
+    view = result.extras.get("table_view")
+    if view is None:
+        view = TableView(result.df)
+        result.extras["table_view"] = view
+    return view
@@ -1,10 +1,14 @@
 # zen_ai_web.py - zenさん専用AI Web版（セキュア版）
 import streamlit as st
-import openai
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import json
+import sys
+from pathlib import Path
+
+# リポジトリ直下の共通モジュール（zen_chat）を読み込めるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 # 環境変数を読み込み
 load_dotenv()
@@ -17,8 +21,15 @@ if not OPENAI_API_KEY:
     st.info("💡 .envファイルにOPENAI_API_KEYを設定してください")
     st.stop()
 
-# OpenAI API設定
-openai.api_key = OPENAI_API_KEY
+# APIキーを確認してから読み込む（.env の ZEN_AI_* 設定もここで反映される）
+from zen_chat.cache import get_cache
+from zen_chat.history import HISTORY_TOKEN_BUDGET, ChatHistory
+from zen_chat.client import (
+    MODEL, SYSTEM_PROMPT, TEMPERATURE, StreamStats, complete_chat, embed_text, stream_chat,
+)
+
+# 応答キャッシュ（CLI版と共有）
+response_cache = get_cache(embed=embed_text)
 
 # ページ設定
 st.set_page_config(
@@ -38,6 +49,15 @@ if "messages" not in st.session_state:
         "content": "こんにちは！zenさん専用AIです。Java学習や業務について何でも聞いてください！"
     })
 
+# 応答時間の記録（メッセージごと）
+if "latencies" not in st.session_state:
+    st.session_state.latencies = []
+
+# 送信履歴のトークン管理（直近の会話＋古い会話の要約）
+if "history" not in st.session_state:
+    st.session_state.history = ChatHistory(SYSTEM_PROMPT)
+    st.session_state.prompt_tokens = []
+
 # チャット履歴の表示
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -52,31 +72,43 @@ if prompt := st.chat_input("何か質問してください..."):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # AI応答を生成
+    # 会話の文脈に依存しない最初の質問だけキャッシュを使う
+    standalone = sum(m["role"] == "user" for m in st.session_state.messages) == 1
+
+    # AI応答を生成（届いたトークンから順に表示）
     with st.chat_message("assistant"):
         try:
-            with st.spinner("考え中..."):
-                response = openai.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "あなたはzenさん専用のAIアシスタントです。zenさんは39歳、倉庫業勤務、Java初心者です。親しみやすく、わかりやすく回答してください。"
-                        }
-                    ] + st.session_state.messages,
-                    max_tokens=500,
-                    temperature=0.7
-                )
-                
-                ai_response = response.choices[0].message.content
+            cached, cache_tier = (None, None)
+            if standalone:
+                cached, cache_tier = response_cache.get(prompt, MODEL, TEMPERATURE, SYSTEM_PROMPT)
+
+            if cached is not None:
+                ai_response = cached
                 st.markdown(ai_response)
-                
-                # AI応答をセッションに追加
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": ai_response
-                })
-                
+                st.caption(f"⚡ キャッシュから応答しました（{'完全一致' if cache_tier == 'exact' else '類似質問'}）")
+            else:
+                request, sent_tokens, full_tokens = st.session_state.history.prepare(
+                    st.session_state.messages, complete_chat
+                )
+                st.session_state.prompt_tokens.append({"送信": sent_tokens, "全履歴": full_tokens})
+
+                stats = StreamStats()
+                ai_response = st.write_stream(
+                    stream_chat(request, stats=stats, model=MODEL, temperature=TEMPERATURE)
+                )
+                st.session_state.latencies.append(stats.to_dict())
+                st.caption(f"⏱️ {stats.describe()}")
+                if standalone:
+                    response_cache.put(
+                        prompt, ai_response, MODEL, TEMPERATURE, stats.total, SYSTEM_PROMPT
+                    )
+
+            # AI応答をセッションに追加
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": ai_response
+            })
+
         except Exception as e:
             st.error(f"❌ エラーが発生しました: {e}")
             st.info("APIキーやネット接続を確認してください")
@@ -92,13 +124,17 @@ with st.sidebar:
             "role": "assistant",
             "content": "チャット履歴をクリアしました。新しい会話を始めましょう！"
         })
+        st.session_state.latencies = []
+        st.session_state.history = ChatHistory(SYSTEM_PROMPT)
+        st.session_state.prompt_tokens = []
         st.experimental_rerun()
     
     # チャット履歴のダウンロード
     if len(st.session_state.messages) > 1:
         chat_history = {
             "timestamp": datetime.now().isoformat(),
-            "messages": st.session_state.messages
+            "messages": st.session_state.messages,
+            "latencies": st.session_state.latencies,
         }
         chat_json = json.dumps(chat_history, ensure_ascii=False, indent=2)
         
@@ -109,6 +145,43 @@ with st.sidebar:
             mime="application/json"
         )
     
+    # 応答時間
+    if st.session_state.latencies:
+        last = st.session_state.latencies[-1]
+        st.markdown("**⏱️ 応答時間（直近）**")
+        ttft = "—" if last["ttft_ms"] is None else f"{last['ttft_ms']}ms"
+        st.caption(f"最初の応答まで {ttft} / 完了まで {last['total_ms']}ms")
+
+    # 送信トークン数（履歴の要約・切り詰めによる削減量）
+    st.session_state.history.budget = st.number_input(
+        "履歴のトークン上限",
+        min_value=500,
+        max_value=16000,
+        value=HISTORY_TOKEN_BUDGET,
+        step=500,
+    )
+    if st.session_state.prompt_tokens:
+        last = st.session_state.prompt_tokens[-1]
+        st.metric(
+            "送信トークン（直近）",
+            last["送信"],
+            delta=last["送信"] - last["全履歴"],
+            delta_color="inverse",
+            help="全履歴をそのまま送った場合との差",
+        )
+        st.line_chart(st.session_state.prompt_tokens)
+    if st.session_state.history.summary:
+        with st.expander("📝 これまでの会話の要約"):
+            st.write(st.session_state.history.summary)
+
+    # 応答キャッシュの統計
+    cache_stats = response_cache.stats()
+    st.markdown("**⚡ 応答キャッシュ**")
+    st.caption(
+        f"ヒット率 {cache_stats['hit_rate']:.0%}（完全一致 {cache_stats['hits_exact']}件・"
+        f"類似 {cache_stats['hits_semantic']}件）/ 節約 {cache_stats['latency_saved_sec']}秒"
+    )
+
     st.markdown("---")
     st.markdown("**💡 使い方**")
     st.markdown("- Java学習について質問")
@@ -1,10 +1,14 @@
 # zen_ai_web.py - zenさん専用AI Web版（セキュア版）
 import streamlit as st
-import openai
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import json
+import sys
+from pathlib import Path
+
+# リポジトリ直下の共通モジュール（zen_chat）を読み込めるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 # 環境変数を読み込み
 load_dotenv()
@@ -17,8 +21,8 @@ if not OPENAI_API_KEY:
     st.info("💡 .envファイルにOPENAI_API_KEYを設定してください")
     st.stop()
 
-# OpenAI API設定
-openai.api_key = OPENAI_API_KEY
+# APIキーを確認してから読み込む（.env の ZEN_AI_* 設定もここで反映される）
+from zen_chat.client import SYSTEM_PROMPT, complete_chat
 
 # ページ設定
 st.set_page_config(
@@ -56,19 +60,9 @@ if prompt := st.chat_input("何か質問してください..."):
     with st.chat_message("assistant"):
         try:
             with st.spinner("考え中..."):
-                response = openai.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "あなたはzenさん専用のAIアシスタントです。zenさんは39歳、倉庫業勤務、Java初心者です。親しみやすく、わかりやすく回答してください。"
-                        }
-                    ] + st.session_state.messages,
-                    max_tokens=500,
-                    temperature=0.7
+                ai_response = complete_chat(
+                    [{"role": "system", "content": SYSTEM_PROMPT}] + st.session_state.messages
                 )
-                
-                ai_response = response.choices[0].message.content
                 st.markdown(ai_response)
                 
                 # AI応答をセッションに追加
@@ -1,6 +1,6 @@
 # zen_ai.py - zenさん専用AIチャットボット（セキュア版）
-import openai
 import os
+import time
 from dotenv import load_dotenv
 
 # 環境変数を読み込み（.envファイルがある場合）
@@ -16,8 +16,12 @@ if not OPENAI_API_KEY:
     print("   2. .envファイルに OPENAI_API_KEY=your-key-here を記載")
     exit(1)
 
-# APIキーを設定
-openai.api_key = OPENAI_API_KEY
+# APIキーを確認してから読み込む（.env の ZEN_AI_* 設定もここで反映される）
+from zen_chat.cache import get_cache
+from zen_chat.client import MODEL, SYSTEM_PROMPT, TEMPERATURE, complete_chat, embed_text
+
+# 応答キャッシュ（Web版と共有）
+response_cache = get_cache(embed=embed_text)
 
 def zen_ai_chat():
     print("🤖 zenさん専用AI起動！")
@@ -33,6 +37,8 @@ def zen_ai_chat():
             
             # 終了判定
             if user_input.lower() in ['quit', 'exit', 'bye', 'q']:
+                stats = response_cache.stats()
+                print(f"⚡ キャッシュ: ヒット率 {stats['hit_rate']:.0%} / 節約 {stats['latency_saved_sec']}秒")
                 print("👋 また後で！頑張って！")
                 print("🎉 今日もお疲れ様でした！")
                 break
@@ -42,25 +48,25 @@ def zen_ai_chat():
                 print("🤔 何か質問してくださいね！")
                 continue
             
-            # OpenAI APIに質問を送信
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "あなたはzenさん専用のAIアシスタントです。zenさんは39歳、倉庫業勤務、Java初心者です。親しみやすく、わかりやすく回答してください。"
-                    },
-                    {
-                        "role": "user", 
-                        "content": user_input
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
+            # 同じ質問の回答が残っていればキャッシュから表示
+            cached, cache_tier = response_cache.get(user_input, MODEL, TEMPERATURE, SYSTEM_PROMPT)
+            if cached is not None:
+                print(f"🤖 AI（⚡キャッシュ）: {cached}")
+                print("-" * 50)
+                continue
+
+            # OpenAI APIに質問を送信（混雑時は共通クライアントが自動で再試行）
+            start = time.perf_counter()
+            ai_response = complete_chat([
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_input},
+            ])
             
             # AIの回答を表示
-            ai_response = response.choices[0].message.content
+            response_cache.put(
+                user_input, ai_response, MODEL, TEMPERATURE,
+                time.perf_counter() - start, SYSTEM_PROMPT,
+            )
             print(f"🤖 AI: {ai_response}")
             print("-" * 50)
             
@@ -0,0 +1 @@
+# zen_chat - zenさん専用AIチャットの共通処理（CLI版・Web版から利用）
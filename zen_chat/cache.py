@@ -0,0 +1,223 @@
+# cache.py - 繰り返しの質問に対する応答キャッシュ（CLI版・Web版で共有、SQLiteに保存）
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# キャッシュファイルの場所・有効期限・最大件数（環境変数で変更可能）
+CACHE_PATH = os.getenv("ZEN_AI_CACHE_PATH", "zen_ai_cache.db")
+CACHE_TTL = float(os.getenv("ZEN_AI_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("ZEN_AI_CACHE_MAX_ENTRIES", "1000"))
+
+# 類似度キャッシュ（埋め込みベクトルの近さで判定）を使うか
+SEMANTIC_ENABLED = os.getenv("ZEN_AI_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("ZEN_AI_SEMANTIC_THRESHOLD", "0.92"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    embedding BLOB,
+    latency REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope, created_at);
+CREATE INDEX IF NOT EXISTS idx_responses_last_hit ON responses (last_hit);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def normalize_prompt(prompt):
+    """全角・半角、大文字・小文字、空白の違いを吸収"""
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    return " ".join(text.split()).rstrip("?？。.!！ ")
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """完全一致（正規化後）と、任意で埋め込み類似度による2段階の応答キャッシュ
+
+    scope はモデル・温度・システムプロンプトの組み合わせで、
+    同じ scope の中でだけ応答を使い回す。
+    接続はスレッドごとに1つ持ち、呼び出しのたびに開き直さない。
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 embed=None, threshold=SEMANTIC_THRESHOLD):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 類似度検索用のベクトル（scope ごと）。他プロセスの追加は件数の変化で検知する
+        self._vectors = {}
+        self._vectors_version = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """このスレッド用の接続（with で使うとトランザクションの確定・取り消しだけを行う）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def scope(model, temperature, system=""):
+        return _digest(model, f"{temperature:.3f}", system)
+
+    def _bump(self, conn, **values):
+        conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(values.items()),
+        )
+
+    def get(self, prompt, model, temperature, system=""):
+        """キャッシュ済みの応答を探す
+
+        戻り値は (応答, "exact" / "semantic") 。見つからなければ (None, None)。
+        """
+        scope = self.scope(model, temperature, system)
+        key = _digest(scope, normalize_prompt(prompt))
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT key, response, latency FROM responses "
+                "WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            tier = "exact"
+            if row is None and self.embed is not None:
+                row = self._semantic_lookup(conn, scope, prompt, now)
+                tier = "semantic"
+            if row is None:
+                self._bump(conn, misses=1)
+                return None, None
+
+            hit_key, response, latency = row
+            conn.execute(
+                "UPDATE responses SET last_hit = ?, hits = hits + 1 WHERE key = ?",
+                (now, hit_key),
+            )
+            self._bump(conn, **{f"hits_{tier}": 1, "latency_saved": latency})
+        return response, tier
+
+    def _semantic_lookup(self, conn, scope, prompt, now):
+        # numpy は類似度キャッシュを使うときだけ読み込む（起動時間短縮）
+        import numpy as np
+
+        try:
+            query = np.asarray(self.embed(normalize_prompt(prompt)), dtype="float32")
+        except Exception:
+            return None
+        keys, matrix = self._scope_vectors(conn, scope)
+        if not keys:
+            return None
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return conn.execute(
+            "SELECT key, response, latency FROM responses WHERE key = ? AND created_at >= ?",
+            (keys[best], now - self.ttl),
+        ).fetchone()
+
+    def _scope_vectors(self, conn, scope):
+        """scope 内の埋め込みを正規化済み行列として返す（変更があれば読み直す）"""
+        version = conn.execute(
+            "SELECT COUNT(*), MAX(created_at) FROM responses WHERE embedding IS NOT NULL"
+        ).fetchone()
+        with self._lock:
+            if version != self._vectors_version:
+                self._vectors = {}
+                self._vectors_version = version
+            if scope not in self._vectors:
+                rows = conn.execute(
+                    "SELECT key, embedding FROM responses "
+                    "WHERE scope = ? AND embedding IS NOT NULL",
+                    (scope,),
+                ).fetchall()
+                keys = [key for key, _ in rows]
+                matrix = None
+                if rows:
+                    import numpy as np
+
+                    matrix = np.stack([np.frombuffer(blob, dtype="float32") for _, blob in rows])
+                    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+                self._vectors[scope] = (keys, matrix)
+            return self._vectors[scope]
+
+    def put(self, prompt, response, model, temperature, latency, system=""):
+        """応答を登録し、期限切れ・上限超過分を削除"""
+        scope = self.scope(model, temperature, system)
+        normalized = normalize_prompt(prompt)
+        embedding = None
+        if self.embed is not None:
+            import numpy as np
+
+            try:
+                embedding = np.asarray(self.embed(normalized), dtype="float32").tobytes()
+            except Exception:
+                embedding = None
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, scope, prompt, response, embedding, latency, created_at, last_hit, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (_digest(scope, normalized), scope, normalized, response, embedding,
+                 latency, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            # 上限を超えた分は最後に使われたのが古いものから削除
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_hit DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        """ヒット率と節約できた待ち時間"""
+        with self._connect() as conn:
+            values = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        hits = values.get("hits_exact", 0) + values.get("hits_semantic", 0)
+        lookups = hits + values.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits_exact": int(values.get("hits_exact", 0)),
+            "hits_semantic": int(values.get("hits_semantic", 0)),
+            "misses": int(values.get("misses", 0)),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "latency_saved_sec": round(values.get("latency_saved", 0.0), 1),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(embed=None):
+    """プロセス内で共有するキャッシュ（類似度キャッシュは有効時のみ embed を使う）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(embed=embed if SEMANTIC_ENABLED else None)
+        return _cache
@@ -0,0 +1,318 @@
+# client.py - OpenAI 呼び出しの共通クライアント（CLI版・Web版で共有）
+#
+# - 非同期クライアント（接続プール）をプロセスで一つだけ持ち、専用のイベントループで動かす
+# - 429 / 5xx / 接続エラーは指数バックオフ（ジッター付き）で再試行
+# - トークンバケットと同時実行数の上限で、全セッション合計のリクエスト量を抑える
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+SYSTEM_PROMPT = "あなたはzenさん専用のAIアシスタントです。zenさんは39歳、倉庫業勤務、Java初心者です。親しみやすく、わかりやすく回答してください。"
+MODEL = "gpt-3.5-turbo"
+MAX_TOKENS = 500
+TEMPERATURE = 0.7
+
+# リクエストのタイムアウト（秒）と再試行回数
+REQUEST_TIMEOUT = float(os.getenv("ZEN_AI_TIMEOUT", "60"))
+MAX_ATTEMPTS = int(os.getenv("ZEN_AI_MAX_ATTEMPTS", "5"))
+
+# バックオフの初期値・上限（秒）
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+# 全セッション合計の送信レート（1分あたり）と同時実行数
+RATE_PER_MINUTE = float(os.getenv("ZEN_AI_RATE_PER_MINUTE", "60"))
+MAX_CONCURRENCY = int(os.getenv("ZEN_AI_MAX_CONCURRENCY", "8"))
+
+_DONE = object()
+
+
+@dataclass
+class StreamStats:
+    """1メッセージ分の応答時間"""
+    started_at: float = 0.0
+    first_token_at: float = None
+    finished_at: float = None
+    chunks: int = 0
+    attempts: int = 0
+
+    @property
+    def ttft(self):
+        """最初のトークンが届くまでの秒数"""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total(self):
+        """応答完了までの秒数"""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def describe(self):
+        """表示用の要約（本文が1チャンクも届かなかった場合は最初の応答時間を省く）"""
+        parts = []
+        if self.ttft is not None:
+            parts.append(f"最初の応答まで {self.ttft:.2f}秒")
+        elif self.total is not None:
+            parts.append("応答本文なし")
+        if self.total is not None:
+            parts.append(f"完了まで {self.total:.2f}秒")
+        if self.attempts > 1:
+            parts.append(f"再試行 {self.attempts - 1}回")
+        return " / ".join(parts)
+
+    def to_dict(self):
+        return {
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1000),
+            "total_ms": None if self.total is None else round(self.total * 1000),
+            "chunks": self.chunks,
+            "attempts": self.attempts,
+        }
+
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（イベントループ上で共有）
+
+    429 を受けたときは penalize() で残量を空にし、全セッションの送信を一時的に遅らせる。
+    """
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds):
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _is_rate_limited(error):
+    import openai
+
+    return isinstance(error, openai.RateLimitError)
+
+
+def _retry_after(error):
+    """Retry-After ヘッダーの秒数（無ければ None）"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """再試行までの待ち時間（フルジッター付き指数バックオフ）"""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class ChatClient:
+    """専用イベントループ上で動く共有クライアント"""
+
+    def __init__(self):
+        from openai import AsyncOpenAI
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="zen-chat-loop", daemon=True
+        )
+        self._thread.start()
+        # OPENAI_BASE_URL を設定するとローカルの互換サーバー（モック等）に接続できる
+        # 再試行はこのクラスで行うため SDK 側の再試行は無効にする
+        self.client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=REQUEST_TIMEOUT,
+            max_retries=0,
+        )
+        self.bucket = self._run(self._make_bucket())
+        self.semaphore = self._run(self._make_semaphore())
+
+    async def _make_bucket(self):
+        return TokenBucket()
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(MAX_CONCURRENCY)
+
+    def _run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def call(self, make_request, stats=None, hold=False):
+        """レート制限・同時実行数の範囲で呼び出し、失敗時は再試行する
+
+        hold=True なら成功時に同時実行の枠を解放せずに返す（ストリームを読み終えるまで
+        枠を持ち続けるため。呼び出し側で self.semaphore.release() すること）。
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            if stats is not None:
+                stats.attempts = attempt + 1
+            await self.bucket.acquire()
+            await self.semaphore.acquire()
+            try:
+                result = await make_request()
+            except BaseException as e:
+                self.semaphore.release()
+                if not isinstance(e, Exception) or attempt == MAX_ATTEMPTS - 1 or not _is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, _retry_after(e))
+                if _is_rate_limited(e):
+                    # 他のセッションも含めて送信を止め、制限が解けるのを待つ
+                    self.bucket.penalize(delay)
+                await asyncio.sleep(delay)
+                continue
+            if not hold:
+                self.semaphore.release()
+            return result
+
+    async def _pump(self, request, out, stats):
+        """ストリームの差分をキューに流す（例外もキュー経由で呼び出し側に渡す）
+
+        最初のトークンを受け取る前の失敗だけを再試行する（途中からの再送は重複するため）。
+        同時実行の枠はストリームを読み終えるか中断されるまで持ち続ける。
+        """
+        async def open_and_read_first():
+            stream = await self.client.chat.completions.create(stream=True, **request)
+            iterator = stream.__aiter__()
+            first = []
+            try:
+                async for chunk in iterator:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        first.append(chunk.choices[0].delta.content)
+                        break
+            except BaseException:
+                await stream.close()
+                raise
+            return stream, iterator, first
+
+        stream = None
+        try:
+            stream, iterator, first = await self.call(open_and_read_first, stats, hold=True)
+            for text in first:
+                out.put(text)
+            async for chunk in iterator:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    out.put(chunk.choices[0].delta.content)
+        except Exception as e:
+            out.put(e)
+        finally:
+            if stream is not None:
+                self.semaphore.release()
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+            out.put(_DONE)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """プロセス内で共有するクライアント"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ChatClient()
+        return _client
+
+
+def _request(messages, model, max_tokens, temperature):
+    return {
+        "model": model,
+        # 表示用の付加情報は送らない
+        "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+
+def _deadline():
+    # 再試行とバックオフを含めた待ち時間の上限
+    return MAX_ATTEMPTS * (REQUEST_TIMEOUT + BACKOFF_MAX)
+
+
+def stream_chat(messages, stats=None, model=MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+    """応答テキストを届いた順に返すジェネレーター
+
+    stats に StreamStats を渡すと最初のトークンまでの時間と合計時間を記録する。
+    st.write_stream にそのまま渡せる。
+    """
+    stats = stats if stats is not None else StreamStats()
+    client = get_client()
+    out = queue.Queue()
+    stats.started_at = time.perf_counter()
+    future = client.submit(client._pump(_request(messages, model, max_tokens, temperature), out, stats))
+    try:
+        while True:
+            item = out.get(timeout=_deadline())
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            stats.chunks += 1
+            yield item
+    finally:
+        stats.finished_at = time.perf_counter()
+        future.cancel()
+
+
+def complete_chat(messages, model=MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+    """応答全文を一度に受け取る"""
+    client = get_client()
+    request = _request(messages, model, max_tokens, temperature)
+    response = client.submit(
+        client.call(lambda: client.client.chat.completions.create(**request))
+    ).result(timeout=_deadline())
+    return response.choices[0].message.content
+
+
+def embed_text(text, model="text-embedding-3-small"):
+    """テキストの埋め込みベクトル（応答キャッシュの類似度判定用）"""
+    client = get_client()
+    response = client.submit(
+        client.call(lambda: client.client.embeddings.create(model=model, input=text))
+    ).result(timeout=_deadline())
+    return response.data[0].embedding
@@ -0,0 +1,143 @@
+# history.py - チャット履歴のトークン予算管理（直近の会話＋古い会話の要約）
+import os
+import re
+
+# 1リクエストで送るプロンプトのトークン上限（システムプロンプト込み）
+HISTORY_TOKEN_BUDGET = int(os.getenv("ZEN_AI_HISTORY_BUDGET", "2000"))
+
+# 要約のために確保しておくトークン数
+SUMMARY_MAX_TOKENS = 300
+
+# 1メッセージあたりの書式上のオーバーヘッド（role 等）
+MESSAGE_OVERHEAD = 4
+
+_ASCII_RUN = re.compile(r"[\x00-\x7f]+")
+
+_SUMMARY_PROMPT = (
+    "以下はzenさんとAIアシスタントの過去の会話です。"
+    "今後の会話で参照できるよう、重要な事実・質問・回答の要点を"
+    "日本語の箇条書きで簡潔に要約してください。"
+)
+
+
+_enc = None
+_enc_loaded = False
+
+
+def _encoder():
+    """tiktoken のエンコーダー（最初にトークン数を数えるときに読み込む）"""
+    global _enc, _enc_loaded
+    if not _enc_loaded:
+        try:
+            import tiktoken
+        except ModuleNotFoundError:
+            _enc = None
+        else:
+            _enc = tiktoken.get_encoding("cl100k_base")
+        _enc_loaded = True
+    return _enc
+
+
+def count_tokens(text):
+    """テキストのトークン数（tiktoken が無い環境では概算）"""
+    if not text:
+        return 0
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    # 概算: 英数字は約4文字で1トークン、日本語などはほぼ1文字1トークン
+    ascii_chars = sum(len(run) for run in _ASCII_RUN.findall(text))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def window_start(messages, budget):
+    """予算内に収まる直近メッセージの開始位置（最新の1件は必ず含める）"""
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        tokens = message_tokens(messages[i])
+        if used + tokens > budget and start < len(messages):
+            break
+        used += tokens
+        start = i
+    return start
+
+
+def history_budget(system_prompt, budget=HISTORY_TOKEN_BUDGET):
+    """会話履歴に使えるトークン数（システムプロンプトと要約の分を除く）"""
+    return max(0, budget - count_tokens(system_prompt) - SUMMARY_MAX_TOKENS - MESSAGE_OVERHEAD)
+
+
+def build_messages(system_prompt, messages, summary="", start=0):
+    """送信するメッセージ列（要約はシステムプロンプトに添える）"""
+    system = system_prompt
+    if summary:
+        system += f"\n\nこれまでの会話の要約:\n{summary}"
+    return [{"role": "system", "content": system}] + [
+        {"role": m["role"], "content": m["content"]} for m in messages[start:]
+    ]
+
+
+def summarize(previous_summary, messages, complete):
+    """古い会話を既存の要約に畳み込む
+
+    complete は messages を受け取り応答テキストを返す関数。
+    失敗した場合は各発言の冒頭を並べた簡易要約で代用する。
+    """
+    transcript = "\n".join(
+        f"{'zen' if m['role'] == 'user' else 'AI'}: {m['content']}" for m in messages
+    )
+    if previous_summary:
+        transcript = f"（これまでの要約）\n{previous_summary}\n\n（続きの会話）\n{transcript}"
+    try:
+        return complete(
+            [
+                {"role": "system", "content": _SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=SUMMARY_MAX_TOKENS,
+        ).strip()
+    except Exception:
+        lines = [previous_summary] if previous_summary else []
+        lines += [
+            f"- {'zen' if m['role'] == 'user' else 'AI'}: {m['content'][:60]}"
+            for m in messages
+        ]
+        return "\n".join(lines)[-SUMMARY_MAX_TOKENS * 2:]
+
+
+class ChatHistory:
+    """セッションごとの履歴ウィンドウと要約の状態"""
+
+    def __init__(self, system_prompt, budget=HISTORY_TOKEN_BUDGET):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.summary = ""
+        # 要約に畳み込み済みのメッセージ数
+        self.summarized_upto = 0
+
+    def prepare(self, messages, complete):
+        """予算内の送信メッセージを作る（はみ出した分は要約に追加）
+
+        戻り値は (送信メッセージ, 送信トークン数, 全履歴を送った場合のトークン数)。
+        """
+        budget = history_budget(self.system_prompt, self.budget)
+        start = max(window_start(messages, budget), self.summarized_upto)
+        if start > self.summarized_upto:
+            # 毎ターン要約し直さないよう、予算の半分まで空けてからまとめて畳み込む
+            start = max(window_start(messages, budget // 2), start)
+            self.summary = summarize(
+                self.summary, messages[self.summarized_upto:start], complete
+            )
+            self.summarized_upto = start
+
+        request = build_messages(self.system_prompt, messages, self.summary, start)
+        sent_tokens = sum(message_tokens(m) for m in request)
+        full_tokens = sum(
+            message_tokens(m) for m in build_messages(self.system_prompt, messages)
+        )
+        return request, sent_tokens, full_tokens